@@ -0,0 +1,80 @@
+# app/core/clients.py
+import aiohttp
+import httpx
+import openai
+from typing import Optional
+from app.core.config import settings
+
+class ClientRegistry:
+    """Process-wide LLM and HTTP clients, created once and shared by every request"""
+
+    def __init__(self):
+        self.llm: Optional[openai.AsyncOpenAI] = None
+        self.http: Optional[aiohttp.ClientSession] = None
+
+    def get_llm(self) -> openai.AsyncOpenAI:
+        """Return the shared OpenAI client, creating its keep-alive pool on first use"""
+        if self.llm is None:
+            if not settings.OPENAI_API_KEY:
+                raise RuntimeError("OPENAI_API_KEY is not set")
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY_SECONDS
+                ),
+                timeout=httpx.Timeout(settings.LLM_TIMEOUT_SECONDS, connect=5.0)
+            )
+            self.llm = openai.AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                http_client=http_client,
+                max_retries=settings.LLM_MAX_RETRIES
+            )
+        return self.llm
+
+    def get_http(self) -> aiohttp.ClientSession:
+        """Return the shared aiohttp session used for outbound API calls"""
+        if self.http is None or self.http.closed:
+            connector = aiohttp.TCPConnector(
+                limit=settings.HTTP_POOL_SIZE,
+                limit_per_host=settings.HTTP_POOL_SIZE_PER_HOST,
+                keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT_SECONDS,
+                ttl_dns_cache=300
+            )
+            self.http = aiohttp.ClientSession(connector=connector)
+        return self.http
+
+    async def startup(self):
+        """Create the shared HTTP session when the application starts"""
+        self.get_http()
+
+    async def warm_up(self):
+        """Create the LLM client, failing if it can't be configured (reported by /ready)"""
+        self.get_llm()
+
+    async def shutdown(self):
+        """Close pooled connections when the application stops"""
+        if self.llm is not None:
+            try:
+                await self.llm.close()
+            except Exception as e:
+                print(f"Error closing LLM client: {e}")
+            self.llm = None
+
+        if self.http is not None:
+            try:
+                await self.http.close()
+            except Exception as e:
+                print(f"Error closing HTTP session: {e}")
+            self.http = None
+
+# Global client registry
+clients = ClientRegistry()
+
+def get_llm_client() -> openai.AsyncOpenAI:
+    """FastAPI dependency for the shared OpenAI client"""
+    return clients.get_llm()
+
+async def get_http_session() -> aiohttp.ClientSession:
+    """FastAPI dependency for the shared aiohttp session"""
+    return clients.get_http()
@@ -6,21 +6,146 @@ class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     PROJECT_NAME: str = "AdrianaBrill AI Service"
 
-    OPENAI_API_KEY: str
+    # Optional so the service boots without it; /ready reports "openai" as failed
+    OPENAI_API_KEY: Optional[str] = None
+
+    # Shared OpenAI client pool (see app/core/clients.py)
+    LLM_MAX_CONNECTIONS: int = 100
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    LLM_TIMEOUT_SECONDS: float = 60.0
+    LLM_MAX_RETRIES: int = 2
+
+    # "two_step" (analyze, then answer) or "tool_calling" (model calls search_products itself)
+    CHAT_ENGINE: str = "two_step"
+    # Start a search on the raw message while the intent call runs; reuse it if the
+    # analysed query's embedding is at least this similar to the message's
+    CHAT_SPECULATIVE_SEARCH: bool = False
+    SPECULATION_MIN_SIMILARITY: float = 0.75
+
+    # "openai" (EMBEDDING_MODEL via the API) or "local" (LOCAL_EMBEDDING_MODEL in-process,
+    # needs sentence-transformers). Vectors from different backends are not comparable:
+    # move a collection with `python -m app.vectordb.migrate`
+    EMBEDDING_BACKEND: str = "openai"
+    EMBEDDING_MODEL: str = "text-embedding-3-small"
+    LOCAL_EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    LOCAL_EMBEDDING_BATCH_SIZE: int = 64
+    LOCAL_EMBEDDING_ONNX: bool = False
+    # Shortened vectors (e.g. 512 or 256) from text-embedding-3 or Matryoshka local
+    # models; None keeps the full size. Changing it needs python -m app.vectordb.migrate
+    EMBEDDING_DIMENSIONS: Optional[int] = None
+    # History compaction (app/services/chat/history_compactor.py): recent turns are
+    # inlined verbatim up to this many tokens; older ones are folded into a summary
+    HISTORY_TOKEN_BUDGET: int = 1200
+    HISTORY_SUMMARY_ENABLED: bool = True
+    HISTORY_SUMMARY_KEEP_TURNS: int = 4
+    HISTORY_SUMMARY_MAX_TOKENS: int = 200
+
+    # Query-embedding cache (app/vectordb/embedding_cache.py); set a path to persist it
+    EMBEDDING_CACHE_SIZE: int = 10000
+    EMBEDDING_CACHE_PATH: Optional[str] = None
+
+    # Bulk ingestion: OpenAI accepts up to 2048 inputs / ~300k tokens per embedding request
+    EMBEDDING_BATCH_SIZE: int = 512
+    EMBEDDING_BATCH_MAX_CHARS: int = 600000
+    KNOWLEDGE_UPSERT_CHUNK_SIZE: int = 1000
+    # Catalog reads: largest page GET /api/knowledge/products serves, and the
+    # chunk size the NDJSON export walks the collection with
+    KNOWLEDGE_PAGE_MAX_LIMIT: int = 1000
+    KNOWLEDGE_EXPORT_CHUNK_SIZE: int = 1000
+
+    # Request tracing (app/core/tracing.py): "none", "file" (JSON lines) or "memory"
+    TRACING_EXPORTER: str = "none"
+    TRACING_FILE_PATH: str = "./traces.jsonl"
+    TRACE_SAMPLE_RATE: float = 0.01
+
+    # Cache in front of the intent-analysis LLM call (app/utils/semantic_cache.py)
+    ANALYSIS_CACHE_ENABLED: bool = True
+    ANALYSIS_CACHE_TTL_SECONDS: int = 3600
+    ANALYSIS_CACHE_MAX_ENTRIES: int = 5000
+    ANALYSIS_CACHE_SEMANTIC_ENABLED: bool = True
+    ANALYSIS_CACHE_SIMILARITY_THRESHOLD: float = 0.95
+    ANALYSIS_CACHE_MAX_CANDIDATES: int = 200
+    # Only short messages (greetings, "what is this site?") pay for the similarity probe
+    ANALYSIS_CACHE_SEMANTIC_MAX_CHARS: int = 120
+
+    # Shared aiohttp pool for outbound API calls
+    HTTP_POOL_SIZE: int = 100
+    HTTP_POOL_SIZE_PER_HOST: int = 20
+    HTTP_KEEPALIVE_TIMEOUT_SECONDS: float = 30.0
     
     HOST: str = "0.0.0.0"
     PORT: int = 8085
+    # Production entry point (python main.py): uvicorn worker processes. More than
+    # one needs CHROMA_MODE=http, or a read-only fleet next to a single writer
+    WORKERS: int = 1
+    RELOAD: bool = False
     
     BACKEND_CORS_ORIGINS: list = ["*"]
     
+    # "persistent" opens CHROMA_PERSIST_DIRECTORY in-process; "http" talks to a Chroma
+    # server at CHROMA_HOST:CHROMA_PORT that any number of workers can share
+    CHROMA_MODE: str = "persistent"
     CHROMA_PERSIST_DIRECTORY: str = "./chroma_db"
+    CHROMA_HOST: str = "localhost"
+    CHROMA_PORT: int = 8000
+    CHROMA_COLLECTION: str = "products"
+    # False makes knowledge write endpoints refuse (403), for query-only replicas
+    KNOWLEDGE_WRITER: bool = True
+    # How often each process checks the Redis catalog version for writes made by
+    # other processes and rebuilds its in-memory indexes; 0 disables
+    CATALOG_SYNC_INTERVAL_SECONDS: float = 5.0
+    # Hybrid retrieval (app/utils/knowledge/lexical_index.py): BM25 fused with vector
+    # results by reciprocal rank; each side contributes up to HYBRID_CANDIDATES
+    HYBRID_SEARCH_ENABLED: bool = True
+    HYBRID_CANDIDATES: int = 20
+    HYBRID_RRF_K: int = 60
+    # Model-number / SKU queries with lexical hits skip the embedding call
+    LEXICAL_SKU_SHORTCUT: bool = True
+    # "memory" answers vector queries from a NumPy mirror of the collection
+    # (app/utils/knowledge/memory_index.py); "chroma" queries Chroma directly
+    VECTOR_INDEX_BACKEND: str = "chroma"
+    # Memory index rows: "float32", "int8" (4x smaller) or "binary" (32x smaller).
+    # Quantized searches rescore VECTOR_INDEX_RESCORE_FACTOR x n candidates with
+    # the float vectors stored in Chroma (python -m app.vectordb.evaluate compares them)
+    VECTOR_INDEX_QUANTIZATION: str = "float32"
+    VECTOR_INDEX_RESCORE_FACTOR: int = 4
+    # Products put in the chat prompt; with an in_stock filter, this many times
+    # more candidates are fetched so enough remain after the live-stock check
+    CHAT_SEARCH_RESULTS: int = 5
+    SEARCH_OVERFETCH_FACTOR: int = 3
+    # Chroma calls are blocking, so they run on a bounded thread pool
+    VECTORDB_MAX_WORKERS: int = 8
+
+    PRODUCT_API_BASE_URL: str = "https://api.pantallaverde.com/api/v1/products"
+    # Optional batch endpoint, called as GET <url>?ids=a,b,c (app/utils/product_api.py)
+    PRODUCT_API_BATCH_URL: Optional[str] = None
+    PRODUCT_API_BATCH_SIZE: int = 50
+    PRODUCT_API_MAX_CONCURRENCY: int = 10
+    PRODUCT_API_TIMEOUT_SECONDS: float = 5.0
+    PRODUCT_API_MAX_RETRIES: int = 2
+    PRODUCT_API_BACKOFF_BASE_SECONDS: float = 0.1
+    PRODUCT_API_BACKOFF_MAX_SECONDS: float = 1.0
+    PRODUCT_API_BREAKER_FAILURES: int = 5
+    PRODUCT_API_BREAKER_RESET_SECONDS: float = 30.0
 
-    PRODUCT_API_BASE_URL: str = "https://fzjn9pz1-5101.inc1.devtunnels.ms/api/v1/products"
+    # Stock lookups (app/utils/stock_cache.py): fresh for TTL, served stale while revalidating up to STALE
+    STOCK_CACHE_TTL_SECONDS: float = 15.0
+    STOCK_CACHE_STALE_SECONDS: float = 300.0
+    STOCK_CACHE_MAX_ENTRIES: int = 10000
     
     # Redis configuration for session caching
     REDIS_URL: str = "redis://redis:6379"
     REDIS_DB: int = 0
     CACHE_TTL_HOURS: int = 24
+    # Pool and timeouts (app/utils/cache_manager.py); a stalled Redis must not stall chat
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT_SECONDS: float = 0.5
+    REDIS_SOCKET_TIMEOUT_SECONDS: float = 0.5
+    REDIS_CONNECT_TIMEOUT_SECONDS: float = 1.0
+    REDIS_RECONNECT_INTERVAL_SECONDS: float = 5.0
+    # Users whose history is kept in-process while Redis is unavailable
+    HISTORY_FALLBACK_MAX_USERS: int = 10000
     
     class Config:
         env_file = ".env"
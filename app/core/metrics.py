@@ -0,0 +1,207 @@
+# app/core/metrics.py
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.routing import Match
+from app.core.tracing import tracer
+
+# Set (in the environment, before start) when several uvicorn workers serve the app:
+# metric values then go to files there and every scrape aggregates all workers
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+if MULTIPROCESS:
+    # Metrics without labels open their file as soon as they are defined below
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+# Route template of the request being served, used as a label by stage metrics
+current_route: ContextVar[str] = ContextVar("current_route", default="none")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency",
+    ["route", "method", "status"],
+    buckets=LATENCY_BUCKETS
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests currently being served",
+    ["route"],
+    multiprocess_mode="livesum"
+)
+STAGE_LATENCY = Histogram(
+    "chat_stage_duration_seconds",
+    "Latency of individual pipeline stages",
+    ["stage", "route", "model"],
+    buckets=LATENCY_BUCKETS
+)
+STARTUP_SECONDS = Gauge(
+    "app_startup_seconds",
+    "Seconds from application start until a component finished warming up",
+    ["component"],
+    multiprocess_mode="liveall"
+)
+CHAT_RESPONSE_LATENCY = Histogram(
+    "chat_response_duration_seconds",
+    "End-to-end chat reply latency per engine",
+    ["engine"],
+    buckets=LATENCY_BUCKETS
+)
+PRODUCT_API_FETCH_LATENCY = Histogram(
+    "product_api_fetch_seconds",
+    "Latency of upstream stock fetches (one product, or one batch call)",
+    ["mode"],
+    buckets=LATENCY_BUCKETS
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "LLM token usage reported by the provider",
+    ["stage", "model", "kind"]
+)
+HISTORY_TOKENS_SAVED = Histogram(
+    "chat_history_tokens_saved",
+    "Prompt tokens saved per request by history compaction",
+    buckets=(0, 50, 100, 250, 500, 1000, 2000, 4000, 8000)
+)
+UPSTREAM_ERRORS = Counter(
+    "upstream_errors_total",
+    "Errors talking to external dependencies",
+    ["upstream"]
+)
+
+@contextmanager
+def observe_stage(stage: str, model: str = ""):
+    """Time a block into chat_stage_duration_seconds and trace it as a span"""
+    started = time.perf_counter()
+    try:
+        if model:
+            with tracer.span(stage, model=model):
+                yield
+        else:
+            with tracer.span(stage):
+                yield
+    finally:
+        STAGE_LATENCY.labels(stage=stage, route=current_route.get(), model=model).observe(
+            time.perf_counter() - started
+        )
+
+def record_llm_usage(usage: Any, stage: str, model: str):
+    """Count prompt/cached/completion tokens from a completion's usage block"""
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+    completion_tokens = getattr(usage, "completion_tokens", None) or 0
+    # Prompt tokens the provider served from its prefix cache (a subset of prompt)
+    cached_tokens = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None) or 0
+    if prompt_tokens:
+        LLM_TOKENS.labels(stage=stage, model=model, kind="prompt").inc(prompt_tokens)
+    if cached_tokens:
+        LLM_TOKENS.labels(stage=stage, model=model, kind="cached_prompt").inc(cached_tokens)
+    if completion_tokens:
+        LLM_TOKENS.labels(stage=stage, model=model, kind="completion").inc(completion_tokens)
+
+class StatsCollector:
+    """Exports in-process stats() dicts (caches, speculation) at scrape time.
+
+    Counting stays in the components' own plain counters, so the hot path
+    pays nothing extra for Prometheus. These values can't be merged across
+    workers, so in multiprocess mode they carry a pid label and each scrape
+    shows only the worker that answered it.
+    """
+
+    def __init__(self):
+        self.providers: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self.extra_labels = {"pid": str(os.getpid())} if MULTIPROCESS else {}
+
+    def register(self, component: str, provider: Callable[[], Dict[str, Any]]):
+        self.providers[component] = provider
+
+    def collect(self):
+        extra_names = list(self.extra_labels)
+        extra_values = list(self.extra_labels.values())
+        events = CounterMetricFamily(
+            "app_component_events",
+            "Event counters from in-process components",
+            labels=["component", "event", *extra_names]
+        )
+        gauges = GaugeMetricFamily(
+            "app_component_value",
+            "Point-in-time values (sizes, ratios, averages) from in-process components",
+            labels=["component", "name", *extra_names]
+        )
+        for component, provider in list(self.providers.items()):
+            try:
+                stats = provider()
+            except Exception as e:
+                print(f"Error collecting stats for {component}: {e}")
+                continue
+            for name, value in stats.items():
+                if not isinstance(value, (int, float)) or isinstance(value, bool):
+                    continue
+                if name in ("entries", "available") or name.endswith(("_ratio", "_rate", "_avg")):
+                    gauges.add_metric([component, name, *extra_values], value)
+                else:
+                    events.add_metric([component, name, *extra_values], value)
+        yield events
+        yield gauges
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+def scrape_registry() -> CollectorRegistry:
+    """Registry for /metrics: this process's, or every worker's in multiprocess mode"""
+    if not MULTIPROCESS:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(stats_collector)
+    return registry
+
+def mark_process_dead():
+    """Drop this worker's live gauges (in-flight, startup) from the shared files on exit"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency and in-flight requests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def _route_template(self, scope) -> str:
+        router = getattr(scope.get("app"), "router", None)
+        for route in getattr(router, "routes", []):
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", scope["path"])
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = self._route_template(scope)
+        token = current_route.set(route)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        in_flight = REQUESTS_IN_FLIGHT.labels(route=route)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            REQUEST_LATENCY.labels(route=route, method=scope["method"], status=str(status["code"])).observe(
+                time.perf_counter() - started
+            )
+            current_route.reset(token)
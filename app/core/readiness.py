@@ -0,0 +1,77 @@
+# app/core/readiness.py
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from app.core.metrics import STARTUP_SECONDS
+
+class Readiness:
+    """Warm-up state of each backend, behind the /ready probe.
+
+    The lifespan starts warm-ups in the background and the server accepts
+    traffic right away. Required components gate readiness. Optional ones
+    (like Redis, which has an in-process fallback) are only reported. A
+    probe can replace the recorded status once warm-up has finished.
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.components: Dict[str, Dict[str, Any]] = {}
+        self._probes: Dict[str, Callable[[], str]] = {}
+        self.startup_seconds: Optional[float] = None
+
+    def register(self, name: str, required: bool = True, probe: Optional[Callable[[], str]] = None):
+        self.components[name] = {"status": "pending", "required": required}
+        if probe is not None:
+            self._probes[name] = probe
+
+    async def run(self, name: str, warm_up: Callable[[], Awaitable[Any]]):
+        """Await one component's warm-up and record how it went"""
+        component = self.components[name]
+        component["status"] = "starting"
+        started = time.perf_counter()
+        try:
+            await warm_up()
+            component["status"] = "ready"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            component["status"] = "failed"
+            component["error"] = str(e)
+            print(f"Startup of {name} failed: {e}")
+        component["seconds"] = round(time.perf_counter() - started, 3)
+        STARTUP_SECONDS.labels(component=name).set(time.perf_counter() - self.started_at)
+
+    def start(self):
+        self.started_at = time.perf_counter()
+
+    def finish(self):
+        self.startup_seconds = round(time.perf_counter() - self.started_at, 3)
+        STARTUP_SECONDS.labels(component="all").set(self.startup_seconds)
+        print(f"Warm-up finished in {self.startup_seconds}s")
+
+    def status(self, name: str) -> str:
+        component = self.components[name]
+        probe = self._probes.get(name)
+        if probe is not None and component["status"] == "ready":
+            return probe()
+        return component["status"]
+
+    @property
+    def ready(self) -> bool:
+        return all(
+            self.status(name) == "ready"
+            for name, component in self.components.items()
+            if component["required"]
+        )
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "startup_seconds": self.startup_seconds,
+            "components": {
+                name: {**component, "status": self.status(name)}
+                for name, component in self.components.items()
+            }
+        }
+
+readiness = Readiness()
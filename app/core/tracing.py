@@ -0,0 +1,221 @@
+# app/core/tracing.py
+import json
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    name: str
+    parent_id: Optional[str] = None
+    sampled: bool = True
+    start_time: float = field(default_factory=time.time)
+    duration_ms: Optional[float] = None
+    status: str = "ok"
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    _started: float = field(default_factory=time.perf_counter, repr=False)
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def end(self):
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop("_started", None)
+        data.pop("sampled", None)
+        return data
+
+class InMemoryExporter:
+    """Keeps finished spans in memory; meant for tests and debugging"""
+
+    def __init__(self, max_spans: int = 10000):
+        self.spans: "deque[Span]" = deque(maxlen=max_spans)
+
+    def export(self, span: Span):
+        self.spans.append(span)
+
+    def get_trace(self, trace_id: str) -> List[Span]:
+        return [span for span in self.spans if span.trace_id == trace_id]
+
+    def clear(self):
+        self.spans.clear()
+
+class FileExporter:
+    """Appends finished spans to a JSON-lines file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            if span.parent_id is None:
+                # Flush once per finished trace rather than per span
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+# Span (or unsampled root) of the code currently running
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def _new_trace_id() -> str:
+    return f"{random.getrandbits(128):032x}"
+
+def _new_span_id() -> str:
+    return f"{random.getrandbits(64):016x}"
+
+class Tracer:
+    """Minimal request-scoped tracer with W3C traceparent propagation.
+
+    The sampling decision is made once per request at the root span.
+    Unsampled requests only carry ids for propagation, and their child
+    spans are no-ops, so a low sample rate keeps tracing cheap at full
+    traffic.
+    """
+
+    def __init__(self, exporter=None, sample_rate: float = 0.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def _parse_traceparent(self, header: Optional[str]):
+        if not header:
+            return None
+        parts = header.strip().split("-")
+        if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+            return None
+        return parts[1], parts[2], parts[3] == "01"
+
+    @contextmanager
+    def start_trace(self, name: str, traceparent: Optional[str] = None, **attributes):
+        """Open the root span of a request, continuing an incoming trace if given"""
+        if not self.enabled:
+            yield None
+            return
+
+        incoming = self._parse_traceparent(traceparent)
+        if incoming:
+            trace_id, parent_id, sampled = incoming
+        else:
+            trace_id, parent_id = _new_trace_id(), None
+            sampled = random.random() < self.sample_rate
+
+        root = Span(
+            trace_id=trace_id,
+            span_id=_new_span_id(),
+            name=name,
+            parent_id=parent_id,
+            sampled=sampled,
+            attributes=attributes if sampled else {}
+        )
+        token = _current_span.set(root)
+        try:
+            yield root
+        except BaseException as e:
+            root.status = "error"
+            root.attributes["error"] = str(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            if sampled:
+                root.end()
+                self.exporter.export(root)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Child span of the current span; a no-op outside sampled traces"""
+        parent = _current_span.get()
+        if parent is None or not parent.sampled:
+            yield None
+            return
+
+        span = Span(
+            trace_id=parent.trace_id,
+            span_id=_new_span_id(),
+            name=name,
+            parent_id=parent.span_id,
+            attributes=attributes
+        )
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.attributes["error"] = str(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+            self.exporter.export(span)
+
+    def current_trace_id(self) -> Optional[str]:
+        span = _current_span.get()
+        return span.trace_id if span is not None else None
+
+    def inject_headers(self) -> Dict[str, str]:
+        """traceparent header for outbound calls made inside the current span"""
+        span = _current_span.get()
+        if span is None:
+            return {}
+        flags = "01" if span.sampled else "00"
+        return {"traceparent": f"00-{span.trace_id}-{span.span_id}-{flags}"}
+
+def _build_exporter():
+    if settings.TRACING_EXPORTER == "file":
+        try:
+            return FileExporter(settings.TRACING_FILE_PATH)
+        except Exception as e:
+            print(f"Trace file unavailable at {settings.TRACING_FILE_PATH}: {e}. Tracing disabled.")
+            return None
+    if settings.TRACING_EXPORTER == "memory":
+        return InMemoryExporter()
+    return None
+
+# Global tracer
+tracer = Tracer(exporter=_build_exporter(), sample_rate=settings.TRACE_SAMPLE_RATE)
+
+class TracingMiddleware:
+    """ASGI middleware opening the root span of each HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for key, value in scope.get("headers", []):
+            if key == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+
+        with tracer.start_trace(f"{scope['method']} {scope['path']}", traceparent, method=scope["method"], path=scope["path"]) as root:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    if root.sampled:
+                        root.set_attribute("status_code", message["status"])
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"x-trace-id", root.trace_id.encode("ascii"))]
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
@@ -1,21 +1,23 @@
-import os
 import json
 import openai
 from dotenv import load_dotenv
 from .ai_suggestions_schema import ai_suggestions_request, ai_suggestions_response
 from pydantic import ValidationError
 from fastapi import HTTPException
+from typing import Optional
+from app.core.clients import clients
+from app.core.metrics import observe_stage, record_llm_usage
 
 load_dotenv()
 
 class Suggestion:
-    def __init__(self):
-        self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    def __init__(self, client: Optional[openai.AsyncOpenAI] = None):
+        self.client = client or clients.get_llm()
     
-    def get_suggestion(self, request: ai_suggestions_request) -> ai_suggestions_response:
+    async def get_suggestion(self, request: ai_suggestions_request) -> ai_suggestions_response:
         prompt = self.create_prompt()
         data = self.format_input_data(request)
-        response_text = self.get_openai_response(prompt, data)
+        response_text = await self.get_openai_response(prompt, data)
 
         try:
             json_start = response_text.find('{')
@@ -61,13 +63,15 @@ Example:
 Now generate the JSON object based on the following product details:
 """
      
-    def get_openai_response(self, prompt: str, data: str) -> str:
-        completion = self.client.chat.completions.create(
-            model="gpt-4o-mini-search-preview",  
-            messages=[
-                {"role": "system", "content": prompt},
-                {"role": "user", "content": data}
-            ]
-        )
+    async def get_openai_response(self, prompt: str, data: str) -> str:
+        with observe_stage("suggestion", "gpt-4o-mini-search-preview"):
+            completion = await self.client.chat.completions.create(
+                model="gpt-4o-mini-search-preview",  
+                messages=[
+                    {"role": "system", "content": prompt},
+                    {"role": "user", "content": data}
+                ]
+            )
+        record_llm_usage(completion.usage, "suggestion", "gpt-4o-mini-search-preview")
         return completion.choices[0].message.content
     
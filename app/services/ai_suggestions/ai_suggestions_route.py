@@ -1,14 +1,18 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
+import openai
+from app.core.clients import get_llm_client
 from .ai_suggestions_schema import ai_suggestions_request, ai_suggestions_response
 from .ai_suggestions import Suggestion
 
 router = APIRouter(prefix="/api", tags=["AI Suggestions"])
 
+def get_suggestion_service(llm_client: openai.AsyncOpenAI = Depends(get_llm_client)) -> Suggestion:
+    return Suggestion(llm_client)
+
 @router.post("/ai_suggestions", response_model=ai_suggestions_response)
-async def ai_suggestions(request: ai_suggestions_request):
+async def ai_suggestions(request: ai_suggestions_request, suggestion: Suggestion = Depends(get_suggestion_service)):
     try:
-        suggestion = Suggestion()
-        response = suggestion.get_suggestion(request)
+        response = await suggestion.get_suggestion(request)
         return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -1,29 +1,113 @@
-import os
 import json
 import openai
 import asyncio
 import aiohttp
+import time
+import numpy as np
 from dotenv import load_dotenv
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional, AsyncIterator, Tuple
 from .chatbot_schema import chat_request, chat_response, HistoryItem
 from app.utils.knowledge.knowledge import knowledge_manager
+from app.utils.knowledge.knowledge_schema import ProductFilters
+from app.utils.knowledge.filters import in_stock, parse_filters
 from app.utils.cache_manager import cache_manager
+from app.services.chat.history_compactor import history_compactor
+from app.services.chat.prompts import build_analysis_messages, build_generation_messages, build_tool_messages
+from app.core.clients import clients
+from app.core.config import settings
+from app.core.metrics import observe_stage, record_llm_usage, stats_collector, current_route, CHAT_RESPONSE_LATENCY, STAGE_LATENCY, UPSTREAM_ERRORS
+from app.utils.semantic_cache import analysis_cache
+from app.utils.stock_cache import stock_cache
+from app.utils.product_api import product_api
 
 load_dotenv()
 
-class Chat:
+SEARCH_PRODUCTS_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "search_products",
+        "description": "Search the Pantalla Verde catalog for products, with live stock. Use it for any new product, category, price or availability question.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "Short English search query (2-8 words) describing the products the user wants"
+                },
+                "min_price": {"type": "number", "description": "Only if the user states a minimum price"},
+                "max_price": {"type": "number", "description": "Only if the user states a maximum price"},
+                "brand": {"type": "string", "description": "Only if the user asks for a specific brand"},
+                "type": {"type": "string", "description": "Only if the user names a product type, e.g. headphones"},
+                "in_stock": {"type": "boolean", "description": "True if the user only wants products available now"}
+            },
+            "required": ["query"]
+        }
+    }
+}
+
+class SpeculationStats:
+    """Counters for speculative vector search (CHAT_SPECULATIVE_SEARCH)"""
+
     def __init__(self):
-        self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.product_api_base = "api.pantallaverde.com/api/v1/products"
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+        self.saved_seconds = 0.0
+
+    def stats(self) -> Dict[str, float]:
+        used = self.hits + self.misses
+        return {
+            "started": self.started,
+            "hits": self.hits,
+            "misses": self.misses,
+            "discarded": self.discarded,
+            "hit_rate": self.hits / used if used else 0.0,
+            "saved_seconds_total": self.saved_seconds,
+            "saved_seconds_avg": self.saved_seconds / self.hits if self.hits else 0.0
+        }
+
+speculation_stats = SpeculationStats()
+stats_collector.register("speculation", speculation_stats.stats)
+
+class Chat:
+    def __init__(self, client: Optional[openai.AsyncOpenAI] = None, http_session: Optional[aiohttp.ClientSession] = None):
+        # Clients come from the shared registry so connections are reused across requests
+        self.client = client or clients.get_llm()
+        self.http_session = http_session or clients.get_http()
 
     async def get_response(self, request: chat_request, id: str) -> chat_response:
-        # Get history: use provided history or fetch from cache
-        history = request.history
+        with CHAT_RESPONSE_LATENCY.labels(engine=settings.CHAT_ENGINE).time():
+            return await self._respond(request, id)
+
+    async def load_history(self, request: chat_request, id: str) -> Tuple[Optional[List[HistoryItem]], Optional[str]]:
+        """History turns for the prompts, trimmed to the token budget, plus the rolling summary"""
+        # Use provided history or fetch from cache
+        history, summary = request.history, None
         if not history and id:
-            history = cache_manager.get_history(id)
+            history, summary = await cache_manager.get_session(id)
+        compacted = history_compactor.fit(history, summary)
+        return compacted.turns, compacted.summary
+
+    async def save_turn(self, id: str, message: str, response_text: str):
+        """Append the turn to the session and fold old turns into the summary if needed"""
+        await cache_manager.update_history(id, message, response_text)
+        history_compactor.schedule(id)
+
+    async def _respond(self, request: chat_request, id: str) -> chat_response:
+        history, summary = await self.load_history(request, id)
+        
+        if settings.CHAT_ENGINE == "tool_calling":
+            response_text = await self.respond_with_tools(request.message, history, summary)
+            if id:
+                await self.save_turn(id, request.message, response_text)
+            return chat_response(
+                response=response_text,
+                user_message=request.message
+            )
         
         # First AI response to determine if vectordb search is needed
-        analysis_result = self.analyze_message(request.message, history)
+        analysis_result, relevant_products = await self.analyze_and_find(request.message, history, summary)
 
         # Validate analysis result format
         if not isinstance(analysis_result, dict):
@@ -34,288 +118,433 @@ class Chat:
 
         if analysis_result.get("vector_search") == True:
             # Vector search is needed
-            vector_query = analysis_result.get("vector_query", "")
             user_language = analysis_result.get("language", "english")
             
-            if vector_query:  # Only search if we have a valid query
-                relevant_products = self.search_relevant_products(vector_query)
-                
-                if relevant_products:
-                    relevant_products = await self.enrich_products_with_stock(relevant_products)
-            else:
-                relevant_products = []
-            
-            response_text = self.generate_response_with_products(
+            response_text = await self.generate_response_with_products(
                 request.message, 
                 relevant_products,
                 user_language,
-                history
+                history,
+                summary
             )
         else:
             response_text = analysis_result.get("response", "I'm sorry, I couldn't understand your request.")
 
         if id:
-            cache_manager.update_history(id, request.message, response_text, history)
+            await self.save_turn(id, request.message, response_text)
         
         return chat_response(
             response=response_text,
             user_message=request.message
         )
     
-    def analyze_message(self, message: str, history: Optional[List[HistoryItem]] = None) -> dict:
-        """Analyze user message to determine if vector search is needed and generate appropriate response"""
-        # Prepare conversation context
-        history_context = ""
-        if history:
-            recent_history = history[-8:] if len(history) > 8 else history
-            history_context = "\n".join([f"User: {h.message}\nAssistant: {h.response}" for h in recent_history])
-        else:
-            history_context = "No prior conversation"
-
-        system_prompt = """You are an AI shopping assistant for Pantalla Verde, an e-commerce store specializing in electronics, clothing, and accessories.
-
-Use hidden internal reasoning (chain of thought) to decide what to output, but NEVER reveal your reasoning. Only output the final JSON response.
-
------------------------------------------
-GUARDRAIL LOGIC
------------------------------------------
-
-FIRST: Internally check whether the user's message is about:
-- e-commerce
-- products
-- shopping
-- orders
-- customer service
-- OR asking what Pantalla Verde / this website is
-
-If the user asks about Pantalla Verde or the website itself (e.g., "What is this site?", "What is Pantalla Verde?"):
-Respond with:
-{"vector_search": false,
- "vector_query": "",
- "response": "<Pantalla Verde explanation in user's language>",
- "language": "<lang>",
- "user_msg": "<msg>"
-}
+    async def stream_response(self, request: chat_request, id: str) -> AsyncIterator[str]:
+        """Yield the reply text piece by piece as the model produces it.
 
-The explanation should say:
-- Pantalla Verde is an e-commerce website
-- It sells electronics, clothing, and accessories
-- You can assist with shopping-related questions
-
-Example English response:
-"Pantalla Verde is an e-commerce store where you can shop for electronics, clothing, and accessories. How can I help you today?"
-
-Example Spanish response:
-"Pantalla Verde es una tienda de comercio electrónico donde puedes comprar electrónica, ropa y accesorios. ¿En qué puedo ayudarte hoy?"
-
------------------------------------------
-GENERAL OFF-TOPIC RULE
------------------------------------------
-
-If the message is about anything ELSE (not shopping-related and not asking what the site is):
-Return ONLY this JSON:
-{"vector_search": false,
- "vector_query": "",
- "response": "<redirect message in user's language>",
- "language": "<lang>",
- "user_msg": "<msg>"
-}
-
-Redirect examples:
-EN: "I can only help with shopping and product questions at Pantalla Verde. How can I assist you with your purchase today?"
-ES: "Solo puedo ayudarte con preguntas sobre compras y productos en Pantalla Verde. ¿Cómo puedo asistirte con tu compra hoy?"
-
------------------------------------------
-WORKFLOW (internal reasoning only)
------------------------------------------
-
-1. Check conversation history.
-   If the user is asking a follow-up (about products already retrieved), then:
-   - vector_search = false
-   - answer using existing context
-
-2. Determine if vector search is needed.
-   - NEW product/category query → vector_search = true with a 2–8 word English query
-   - Follow-ups, store policies, comparisons → vector_search = false
-
-Always respond in valid JSON only.
-Always reply in the user's detected language.
-NEVER reveal chain-of-thought or hidden reasoning.
+        History is only written once the full reply has been streamed; if the
+        consumer stops early (client disconnect) the generator is closed and
+        the partial reply is discarded along with the upstream stream.
+        """
+        history, summary = await self.load_history(request, id)
+        
+        analysis_result, relevant_products = await self.analyze_and_find(request.message, history, summary)
 
-Your task:
-1. Detect the language of the message.
-2. Apply guardrails to check if the message is shopping-related or asking about Pantalla Verde.
-3. Determine if a vector (product) search is needed based on whether the user:
-   - Asks about specific products, features, comparisons, prices, or availability
-   - Requests recommendations or follows up on product discussions
-4. If a vector search is needed:
-   - Return an English search query summarizing the product-related intent
-   - Include the detected language
-5. If a vector search is NOT needed:
-   - Write a helpful, polite response in the **same language** as the user's message
-   - Leave vector_query empty
+        if not isinstance(analysis_result, dict):
+            yield "I apologize, but I'm having trouble processing your request. Please try again."
+            return
 
-Respond in strict JSON format:
-{
-    "vector_search": true or false,
-    "vector_query": "string (empty if not needed)",
-    "language": "detected language name",
-    "response": "LLM response if no vector search, empty otherwise",
-    "user_msg": "original user message"
-}"""
+        if analysis_result.get("vector_search") == True:
+            user_language = analysis_result.get("language", "english")
+            
+            chunks = []
+            stream = self.stream_response_with_products(
+                request.message,
+                relevant_products,
+                user_language,
+                history,
+                summary
+            )
+            try:
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    yield chunk
+            finally:
+                await stream.aclose()
+            response_text = "".join(chunks)
+        else:
+            response_text = analysis_result.get("response", "I'm sorry, I couldn't understand your request.")
+            yield response_text
 
-        user_prompt = f"""
-        Current user message:
-        "{message}"
+        if id and response_text:
+            await self.save_turn(id, request.message, response_text)
+    
+    async def respond_with_tools(self, message: str, history: Optional[List[HistoryItem]] = None, summary: Optional[str] = None) -> str:
+        """Single-conversation flow where the model calls search_products itself.
 
-        Recent conversation history:
-        {history_context}
+        Messages that need no search are answered in one round-trip; product
+        questions take a second call that sees the tool results.
         """
+        messages = build_tool_messages(message, history, summary)
+        
+        try:
+            with observe_stage("chat_tools", "gpt-4o-mini"):
+                completion = await self.client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=messages,
+                    tools=[SEARCH_PRODUCTS_TOOL],
+                    tool_choice="auto",
+                    temperature=0.5,
+                    max_tokens=500
+                )
+            record_llm_usage(completion.usage, "chat_tools", "gpt-4o-mini")
+            reply = completion.choices[0].message
+            if not reply.tool_calls:
+                return reply.content or "I'm sorry, I couldn't understand your request."
+            
+            messages.append({
+                "role": "assistant",
+                "content": reply.content,
+                "tool_calls": [tool_call.model_dump() for tool_call in reply.tool_calls]
+            })
+            tool_outputs = await asyncio.gather(*(
+                self.run_tool_call(tool_call) for tool_call in reply.tool_calls
+            ))
+            for tool_call, output in zip(reply.tool_calls, tool_outputs):
+                messages.append({"role": "tool", "tool_call_id": tool_call.id, "content": output})
+            
+            with observe_stage("tool_generation", "gpt-4o-mini"):
+                completion = await self.client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=500
+                )
+            record_llm_usage(completion.usage, "tool_generation", "gpt-4o-mini")
+            return completion.choices[0].message.content
+        except openai.APIError as e:
+            UPSTREAM_ERRORS.labels(upstream="openai").inc()
+            print(f"Error in respond_with_tools: {e}")
+            return "I apologize, but I'm having trouble processing your request. Please try again later."
+        except Exception as e:
+            print(f"Error in respond_with_tools: {e}")
+            return "I apologize, but I'm having trouble processing your request. Please try again later."
+    
+    async def run_tool_call(self, tool_call) -> str:
+        """Execute one tool call from the model and return its text result"""
+        if tool_call.function.name != "search_products":
+            return f"Unknown tool: {tool_call.function.name}"
+        try:
+            arguments = json.loads(tool_call.function.arguments or "{}")
+        except json.JSONDecodeError:
+            return "Invalid arguments for search_products."
+        
+        products = await self.find_products({
+            "vector_query": arguments.get("query", ""),
+            "filters": {key: arguments.get(key) for key in ("min_price", "max_price", "brand", "type", "in_stock")}
+        })
+        if not products:
+            return "No matching products found in the catalog."
+        return self.format_product_context_with_stock(products)
+    
+    async def analyze_and_find(self, message: str, history: Optional[List[HistoryItem]] = None, summary: Optional[str] = None) -> Tuple[Any, List[Dict]]:
+        """Intent analysis followed by the product lookup it asks for.
 
+        With CHAT_SPECULATIVE_SEARCH on, a search on the raw message (plus its
+        stock prefetch) runs while the analysis LLM call is in flight.
+        """
+        speculation = None
+        if settings.CHAT_SPECULATIVE_SEARCH:
+            speculation = asyncio.create_task(self.speculate(message))
+            speculation_stats.started += 1
+        
+        try:
+            analysis_result = await self.analyze_message(message, history, summary)
+            if isinstance(analysis_result, dict) and analysis_result.get("vector_search") == True:
+                return analysis_result, await self.find_products(analysis_result, speculation)
+            if speculation is not None:
+                speculation_stats.discarded += 1
+            return analysis_result, []
+        finally:
+            if speculation is not None:
+                if not speculation.done():
+                    speculation.cancel()
+                elif not speculation.cancelled():
+                    # Mark a failed, unused speculation as handled
+                    speculation.exception()
+    
+    async def speculate(self, message: str) -> Dict[str, Any]:
+        """Search (and prefetch stock) on the raw user message"""
+        started = time.perf_counter()
+        embedding = await knowledge_manager.embed_query_async(message)
+        products = await knowledge_manager.search_products_async(message, n_results=settings.CHAT_SEARCH_RESULTS, query_embedding=embedding)
+        if products:
+            products = await self.enrich_products_with_stock(products)
+        return {
+            "embedding": embedding,
+            "products": products,
+            "seconds": time.perf_counter() - started
+        }
+    
+    async def use_speculation(self, speculation: asyncio.Task, vector_query: str) -> Optional[List[Dict]]:
+        """Reuse speculative results if the analysed query is close to the raw message"""
+        analysis_done = time.perf_counter()
         try:
-            completion = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.3,
-                max_tokens=250
+            result, query_embedding = await asyncio.gather(
+                speculation,
+                knowledge_manager.embed_query_async(vector_query)
             )
+        except Exception as e:
+            print(f"Speculative search failed: {e}")
+            speculation_stats.misses += 1
+            return None
+        
+        guessed = np.asarray(result["embedding"], dtype=np.float32)
+        actual = np.asarray(query_embedding, dtype=np.float32)
+        denominator = float(np.linalg.norm(guessed) * np.linalg.norm(actual))
+        similarity = float(guessed @ actual) / denominator if denominator else 0.0
+        
+        if similarity >= settings.SPECULATION_MIN_SIMILARITY:
+            waited = time.perf_counter() - analysis_done
+            speculation_stats.hits += 1
+            speculation_stats.saved_seconds += max(0.0, result["seconds"] - waited)
+            return result["products"]
+        
+        speculation_stats.misses += 1
+        return None
+    
+    async def find_products(self, analysis_result: dict, speculation: Optional[asyncio.Task] = None) -> List[Dict]:
+        """Run the search requested by the analysis step (with its filters) and attach live stock"""
+        vector_query = analysis_result.get("vector_query", "")
+        filters = parse_filters(analysis_result.get("filters"))
+        if not vector_query or filters is not None:
+            # The speculative search ran unfiltered, so it can't stand in for a filtered one
+            if speculation is not None:
+                speculation_stats.discarded += 1
+                speculation = None
+            if not vector_query:  # Only search if we have a valid query
+                return []
+        
+        if speculation is not None:
+            speculated_products = await self.use_speculation(speculation, vector_query)
+            if speculated_products is not None:
+                return speculated_products
+        
+        relevant_products = await self.search_relevant_products(vector_query, filters)
+        if relevant_products:
+            relevant_products = await self.enrich_products_with_stock(relevant_products)
+            if filters is not None and filters.in_stock:
+                relevant_products = [product for product in relevant_products if in_stock(product)]
+        return relevant_products[:settings.CHAT_SEARCH_RESULTS]
+    
+    async def analyze_message(self, message: str, history: Optional[List[HistoryItem]] = None, summary: Optional[str] = None) -> dict:
+        """Analyze user message to determine if vector search is needed and generate appropriate response"""
+        # Repeated greetings / site questions / redirects are answered from cache
+        lookup = await analysis_cache.lookup(message, history, embed=self.embed_text, summary=summary)
+        if lookup.value is not None:
+            lookup.value["user_msg"] = message
+            return lookup.value
+
+        seed = None
+        if lookup.needs_vector:
+            # Nothing to compare against yet, so the probe skipped the embedding;
+            # compute it alongside the LLM call so this answer can seed the similarity tier
+            seed = asyncio.create_task(analysis_cache.embed_lookup(lookup, self.embed_text))
+
+        try:
+            with observe_stage("analyze_message", "gpt-4o-mini"):
+                completion = await self.client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=build_analysis_messages(message, history, summary),
+                    temperature=0.3,
+                    max_tokens=250
+                )
+            record_llm_usage(completion.usage, "analyze_message", "gpt-4o-mini")
 
             # Parse model output
-            import json
             result_text = completion.choices[0].message.content.strip()
             result = json.loads(result_text)
+            if isinstance(result, dict):
+                # Similar-looking product queries may need different searches,
+                # so only non-search answers are offered to the similarity tier
+                semantic = not result.get("vector_search")
+                if semantic and seed is not None:
+                    await seed
+                await analysis_cache.store(lookup, result, semantic=semantic)
             return result
 
+        except openai.APIError as e:
+            UPSTREAM_ERRORS.labels(upstream="openai").inc()
+            print(f"Error in analyze_message: {e}")
+            return self.analysis_fallback(message)
         except Exception as e:
             print(f"Error in analyze_message: {e}")
-            return {
-                "vector_search": False,
-                "vector_query": "",
-                "language": "unknown",
-                "response": "Sorry, I couldn't process your message right now.",
-                "user_msg": message
-            }
+            return self.analysis_fallback(message)
+        finally:
+            if seed is not None and not seed.done():
+                seed.cancel()
 
     
-    def search_relevant_products(self, query: str) -> List[Dict]:
+    def analysis_fallback(self, message: str) -> dict:
+        """Analysis result used when the analysis call fails"""
+        return {
+            "vector_search": False,
+            "vector_query": "",
+            "language": "unknown",
+            "response": "Sorry, I couldn't process your message right now.",
+            "user_msg": message
+        }
+    
+    async def embed_text(self, text: str) -> Optional[List[float]]:
+        """Embed a short text with the shared client; None if the call fails"""
+        if settings.EMBEDDING_BACKEND != "openai":
+            # Same in-process model (and cache) the product search uses
+            try:
+                return await knowledge_manager.embed_query_async(text)
+            except Exception as e:
+                print(f"Error embedding text: {e}")
+                return None
+        try:
+            with observe_stage("embedding", settings.EMBEDDING_MODEL):
+                response = await self.client.embeddings.create(
+                    model=settings.EMBEDDING_MODEL,
+                    input=text
+                )
+            return response.data[0].embedding
+        except openai.APIError as e:
+            UPSTREAM_ERRORS.labels(upstream="openai").inc()
+            print(f"Error embedding text: {e}")
+            return None
+        except Exception as e:
+            print(f"Error embedding text: {e}")
+            return None
+    
+    async def search_relevant_products(self, query: str, filters: Optional[ProductFilters] = None) -> List[Dict]:
         """Search for relevant products in the vector database"""
         try:
-            products = knowledge_manager.search_products(query, n_results=5)
+            n_results = settings.CHAT_SEARCH_RESULTS
+            if filters is not None and filters.in_stock:
+                n_results *= settings.SEARCH_OVERFETCH_FACTOR
+            products = await knowledge_manager.search_products_async(query, n_results=n_results, filters=filters)
+            if not products and filters is not None and filters.type:
+                # The product type is the model's wording and may not match the
+                # catalog's; brand and price came from the user and are kept
+                products = await knowledge_manager.search_products_async(
+                    query, n_results=n_results, filters=filters.copy(update={"type": None})
+                )
             return products
         except Exception as e:
             print(f"Error searching products: {e}")
             return []
     
-    async def fetch_single_product_stock(self, session: aiohttp.ClientSession, product_id: str) -> Dict:
-        """Fetch stock information for a single product"""
-        try:
-            url = f"{self.product_api_base}/{product_id}"
-            async with session.get(url, timeout=aiohttp.ClientTimeout(total=5)) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return {
-                        "id": product_id,
-                        "totalStock": data.get("totalStock", 0),
-                        "data": data
-                    }
-                else:
-                    return {
-                        "id": product_id,
-                        "totalStock": None,
-                        "error": f"API returned status {response.status}"
-                    }
-        except asyncio.TimeoutError:
-            return {
-                "id": product_id,
-                "totalStock": None,
-                "error": "Request timeout"
-            }
-        except Exception as e:
-            return {
-                "id": product_id,
-                "totalStock": None,
-                "error": str(e)
-            }
+    async def load_stock(self, product_ids: List[str]) -> Dict[str, Dict]:
+        """Stock loader for the cache; batching, limits and retries live in the product API client"""
+        return await product_api.fetch_stock(product_ids, session=self.http_session)
     
     async def enrich_products_with_stock(self, products: List[Dict]) -> List[Dict]:
         """Enrich products with real-time stock information"""
         enriched_products = []
         
-        async with aiohttp.ClientSession() as session:
-            tasks = []
+        product_ids = [product.get('id') for product in products if product.get('id')]
+        
+        if product_ids:
+            # Cached, de-duplicated lookups; stale values are served while revalidating
+            with observe_stage("stock_fetch"):
+                stock_dict = await stock_cache.get_many(product_ids, self.load_stock)
+            
             for product in products:
                 product_id = product.get('id')
-                if product_id:
-                    tasks.append(self.fetch_single_product_stock(session, product_id))
-            
-            if tasks:
-                stock_results = await asyncio.gather(*tasks)
-                
-                stock_dict = {result['id']: result for result in stock_results}
-                
-                for product in products:
-                    product_id = product.get('id')
-                    if product_id and product_id in stock_dict:
-                        stock_info = stock_dict[product_id]
-                        if 'data' not in product:
-                            product['data'] = {}
-                        product['data']['totalStock'] = stock_info.get('totalStock')
-                    enriched_products.append(product)
-            else:
-                enriched_products = products
+                if product_id and product_id in stock_dict:
+                    stock_info = stock_dict[product_id]
+                    if 'data' not in product:
+                        product['data'] = {}
+                    product['data']['totalStock'] = stock_info.get('totalStock')
+                enriched_products.append(product)
+        else:
+            enriched_products = products
         
         return enriched_products
 
     
-    def generate_response_with_products(self, original_message: str, products: List[Dict], user_language: str, history: Optional[List[HistoryItem]] = None) -> str:
+    async def generate_response_with_products(self, original_message: str, products: List[Dict], user_language: str, history: Optional[List[HistoryItem]] = None, summary: Optional[str] = None) -> str:
         """Generate a response with products in the user's original language"""
         
-        messages = [{"role": "system", "content": self.get_system_prompt_with_products(products, user_language, history)}]
-        messages.append({"role": "user", "content": original_message})
+        messages = build_generation_messages(
+            original_message,
+            self.format_product_context_with_stock(products),
+            user_language,
+            history,
+            summary
+        )
         
         try:
-            completion = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=500
-            )
+            with observe_stage("generation", "gpt-4o-mini"):
+                completion = await self.client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=500
+                )
+            record_llm_usage(completion.usage, "generation", "gpt-4o-mini")
             return completion.choices[0].message.content
+        except openai.APIError as e:
+            UPSTREAM_ERRORS.labels(upstream="openai").inc()
+            print(f"Error generating response: {e}")
+            return "I apologize, but I'm having trouble processing your request. Please try again later."
         except Exception as e:
+            # Our own bugs must not look like OpenAI outages
+            print(f"Error generating response: {e}")
             return "I apologize, but I'm having trouble processing your request. Please try again later."
     
-    def get_system_prompt_with_products(self, products: List[Dict], user_language: str, history: Optional[List[HistoryItem]] = None) -> str:
-        """Generate system prompt for responses with products"""
-        context = self.format_product_context_with_stock(products)
-        
-        history_text = ""
-        if history:
-            recent_history = history[-8:] if len(history) > 8 else history
-            history_text = "\n".join([f"User: {h.message}\nAssistant: {h.response}" for h in recent_history])
-        else:
-            history_text = "No prior history."
-        
-        return f"""You are a helpful e-commerce assistant with access to real-time inventory.
-        
-        Available products in our store:
-        {context}
-        
-        User's conversation history:
-        {history_text}
-        
-        IMPORTANT: The user's message language is detected as: {user_language}
-        You MUST respond in {user_language}.
+    async def stream_response_with_products(self, original_message: str, products: List[Dict], user_language: str, history: Optional[List[HistoryItem]] = None, summary: Optional[str] = None) -> AsyncIterator[str]:
+        """Streaming counterpart of generate_response_with_products"""
+        messages = build_generation_messages(
+            original_message,
+            self.format_product_context_with_stock(products),
+            user_language,
+            history,
+            summary
+        )
         
-        Guidelines for your response:
-        1. Answer the user's specific question directly and naturally in {user_language}
-        2. Reference conversation history when relevant to provide context
-        3. Only mention stock status, prices, or features when specifically asked or when comparing
-        4. Be conversational and helpful without being pushy or promotional
-        5. Keep responses focused and concise
-        6. ALWAYS respond in {user_language} - this is critical"""
+        # Spans the whole stream, not just the request; every caller closes
+        # this generator explicitly, so the span ends in the task it started in
+        with observe_stage("generation_stream", "gpt-4o-mini"):
+            started = time.perf_counter()
+            try:
+                stream = await self.client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=500,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                )
+            except openai.APIError as e:
+                UPSTREAM_ERRORS.labels(upstream="openai").inc()
+                print(f"Error starting response stream: {e}")
+                yield "I apologize, but I'm having trouble processing your request. Please try again later."
+                return
+            except Exception as e:
+                print(f"Error starting response stream: {e}")
+                yield "I apologize, but I'm having trouble processing your request. Please try again later."
+                return
+
+            first_token = True
+            try:
+                async for chunk in stream:
+                    if chunk.usage is not None:
+                        record_llm_usage(chunk.usage, "generation_stream", "gpt-4o-mini")
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if first_token:
+                            first_token = False
+                            STAGE_LATENCY.labels(
+                                stage="generation_first_token",
+                                route=current_route.get(),
+                                model="gpt-4o-mini"
+                            ).observe(time.perf_counter() - started)
+                        yield chunk.choices[0].delta.content
+            finally:
+                # Release the upstream connection even when the consumer stops early
+                await stream.close()
     
     def format_product_context_with_stock(self, products: List[Dict]) -> str:
         """Format product information with stock details for context"""
@@ -1,15 +1,53 @@
 # app/services/chat/chatbot_route.py
-from fastapi import APIRouter, HTTPException, Header
+import json
+import aiohttp
+import anyio
+import openai
+from fastapi import APIRouter, HTTPException, Header, Depends, Request
+from fastapi.responses import StreamingResponse
+from app.core.clients import get_llm_client, get_http_session
 from .chatbot_schema import chat_request, chat_response
 from .chatbot import Chat
 
 router = APIRouter(prefix="/api", tags=["Chatbot"])
 
+def get_chat(
+    llm_client: openai.AsyncOpenAI = Depends(get_llm_client),
+    http_session: aiohttp.ClientSession = Depends(get_http_session)
+) -> Chat:
+    return Chat(llm_client, http_session)
+
 @router.post("/chatbot", response_model=chat_response)
-async def chat_endpoint(request: chat_request, id_user: str = Header(None)):
+async def chat_endpoint(request: chat_request, id_user: str = Header(None), chat: Chat = Depends(get_chat)):
     try:
-        chat = Chat()
         response = await chat.get_response(request, id_user)
         return response
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/chatbot/stream")
+async def chat_stream_endpoint(request: chat_request, http_request: Request, id_user: str = Header(None), chat: Chat = Depends(get_chat)):
+    """Stream the chatbot reply as Server-Sent Events"""
+    async def event_stream():
+        chunks = chat.stream_response(request, id_user)
+        try:
+            async for chunk in chunks:
+                if await http_request.is_disconnected():
+                    break
+                yield f"data: {json.dumps({'token': chunk})}\n\n"
+            else:
+                yield f"event: done\ndata: {json.dumps({'user_message': request.message})}\n\n"
+        except Exception as e:
+            print(f"Error streaming chat response: {e}")
+            yield f"event: error\ndata: {json.dumps({'error': 'Internal server error'})}\n\n"
+        finally:
+            # Shield the cleanup so a cancelled (disconnected) response still
+            # closes the upstream completion stream
+            with anyio.CancelScope(shield=True):
+                await chunks.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
\ No newline at end of file
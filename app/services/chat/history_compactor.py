@@ -0,0 +1,184 @@
+# app/services/chat/history_compactor.py
+import asyncio
+import openai
+import tiktoken
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set
+from .chatbot_schema import HistoryItem
+from .prompts import build_summary_messages
+from app.core.clients import clients
+from app.core.config import settings
+from app.core.metrics import observe_stage, record_llm_usage, stats_collector, HISTORY_TOKENS_SAVED, UPSTREAM_ERRORS
+from app.utils.cache_manager import cache_manager, HISTORY_CONTEXT_TURNS, HISTORY_MAX_ITEMS
+
+# Per-message framing the chat format adds around each turn's text
+TURN_OVERHEAD_TOKENS = 8
+
+@dataclass
+class CompactedHistory:
+    turns: Optional[List[HistoryItem]]
+    summary: Optional[str]
+    tokens_saved: int = 0
+
+class HistoryCompactor:
+    """Keeps conversation history inside a token budget.
+
+    On every request the newest turns that fit the budget are inlined
+    verbatim and the rolling summary stands in for the rest. After a turn
+    is stored, turns that no longer fit are folded into that summary in
+    the background (one small LLM call per few turns), and removed from
+    the Redis list.
+    """
+
+    def __init__(
+        self,
+        token_budget: int,
+        max_turns: int = HISTORY_CONTEXT_TURNS,
+        keep_turns: int = 4,
+        summary_enabled: bool = True,
+        summary_model: str = "gpt-4o-mini",
+        summary_max_tokens: int = 200
+    ):
+        self.token_budget = token_budget
+        self.max_turns = max_turns
+        self.keep_turns = max(1, min(keep_turns, max_turns))
+        self.summary_enabled = summary_enabled
+        self.summary_model = summary_model
+        self.summary_max_tokens = summary_max_tokens
+
+        self._encoding = None
+        self._encoding_failed = False
+        self._compacting: Set[str] = set()
+        self._background: Set[asyncio.Task] = set()
+
+        self.requests = 0
+        self.tokens_saved = 0
+        self.folds = 0
+        self.folded_turns = 0
+        self.fold_errors = 0
+
+    def count_tokens(self, text: str) -> int:
+        """Token count with the model's tokenizer (a length estimate if it can't load)"""
+        if self._encoding is None and not self._encoding_failed:
+            try:
+                self._encoding = tiktoken.encoding_for_model(self.summary_model)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("o200k_base")
+            except Exception as e:
+                # tiktoken downloads its tables on first use; don't fail chat over it
+                print(f"Tokenizer unavailable, estimating token counts: {e}")
+                self._encoding_failed = True
+        if self._encoding is None:
+            return len(text) // 4 + 1
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def tokenizer_status(self) -> str:
+        """Readiness of the tokenizer: "degraded" while counts are estimates"""
+        return "degraded" if self._encoding is None else "ready"
+
+    def turn_tokens(self, item: HistoryItem) -> int:
+        return self.count_tokens(item.message) + self.count_tokens(item.response) + 2 * TURN_OVERHEAD_TOKENS
+
+    def _fitting(self, turn_costs: List[int], max_turns: int) -> int:
+        """How many of the newest turns fit the budget (always at least one)"""
+        used = 0
+        kept = 0
+        for cost in reversed(turn_costs[-max_turns:]):
+            if kept and used + cost > self.token_budget:
+                break
+            used += cost
+            kept += 1
+        return kept
+
+    def fit(self, history: Optional[List[HistoryItem]], summary: Optional[str] = None) -> CompactedHistory:
+        """Trim history for one prompt and record the tokens saved"""
+        if not history:
+            return CompactedHistory(turns=None, summary=summary)
+
+        recent = history[-self.max_turns:]
+        costs = [self.turn_tokens(item) for item in recent]
+        kept = self._fitting(costs, self.max_turns)
+        summary_tokens = self.count_tokens(summary) if summary else 0
+
+        saved = max(0, sum(costs[:-kept]) - summary_tokens) if kept < len(recent) else 0
+        self.requests += 1
+        self.tokens_saved += saved
+        HISTORY_TOKENS_SAVED.observe(saved)
+        return CompactedHistory(turns=recent[-kept:], summary=summary, tokens_saved=saved)
+
+    def schedule(self, user_id: str):
+        """Fold old turns for a user in the background, at most once at a time"""
+        if not self.summary_enabled or not user_id or user_id in self._compacting:
+            return
+        self._compacting.add(user_id)
+        task = asyncio.create_task(self.compact(user_id))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        task.add_done_callback(lambda _: self._compacting.discard(user_id))
+
+    async def compact(self, user_id: str):
+        """Summarize the turns that fall outside the budget and drop them from the list"""
+        history, summary = await cache_manager.get_session(user_id, limit=HISTORY_MAX_ITEMS)
+        if not history:
+            return
+        costs = [self.turn_tokens(item) for item in history]
+        if len(history) <= self.max_turns and sum(costs) <= self.token_budget:
+            return
+
+        # Fold down to a few turns so the next fold is several requests away
+        fold_count = len(history) - self._fitting(costs, self.keep_turns)
+        if fold_count <= 0:
+            return
+
+        lock = f"history_compaction:{user_id}"
+        if not await cache_manager.acquire_lock(lock, ttl_seconds=60):
+            return
+        try:
+            new_summary = await self.summarize(summary, history[:fold_count])
+            if new_summary:
+                await cache_manager.fold_history(user_id, fold_count, new_summary)
+                self.folds += 1
+                self.folded_turns += fold_count
+        finally:
+            await cache_manager.release_lock(lock)
+
+    async def summarize(self, summary: Optional[str], turns: List[HistoryItem]) -> Optional[str]:
+        """Fold turns into the running summary; None if the call fails"""
+        try:
+            with observe_stage("history_summary", self.summary_model):
+                completion = await clients.get_llm().chat.completions.create(
+                    model=self.summary_model,
+                    messages=build_summary_messages(summary, turns),
+                    temperature=0.2,
+                    max_tokens=self.summary_max_tokens
+                )
+            record_llm_usage(completion.usage, "history_summary", self.summary_model)
+            return (completion.choices[0].message.content or "").strip() or None
+        except openai.APIError as e:
+            UPSTREAM_ERRORS.labels(upstream="openai").inc()
+            self.fold_errors += 1
+            print(f"Error summarizing history: {e}")
+            return None
+        except Exception as e:
+            self.fold_errors += 1
+            print(f"Error summarizing history: {e}")
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "tokens_saved": self.tokens_saved,
+            "tokens_saved_avg": self.tokens_saved / self.requests if self.requests else 0.0,
+            "folds": self.folds,
+            "folded_turns": self.folded_turns,
+            "fold_errors": self.fold_errors
+        }
+
+# Shared compactor used by the chat service
+history_compactor = HistoryCompactor(
+    token_budget=settings.HISTORY_TOKEN_BUDGET,
+    keep_turns=settings.HISTORY_SUMMARY_KEEP_TURNS,
+    summary_enabled=settings.HISTORY_SUMMARY_ENABLED,
+    summary_max_tokens=settings.HISTORY_SUMMARY_MAX_TOKENS
+)
+stats_collector.register("history_compaction", history_compactor.stats)
@@ -1,80 +1,326 @@
 # app/utils/cache_manager.py
-import redis
+import asyncio
+import redis.asyncio as redis
 import json
-import os
-from typing import List, Optional
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
 from app.core.config import settings
+from app.core.metrics import stats_collector, UPSTREAM_ERRORS
+from app.core.tracing import tracer
 from app.services.chat.chatbot_schema import HistoryItem
 
+# Turns kept per user, and turns the chat prompts actually read back
+HISTORY_MAX_ITEMS = 15
+HISTORY_CONTEXT_TURNS = 8
+
 class SessionCacheManager:
-    def __init__(self):
+    """Conversation history in Redis, with a degraded in-process mode.
+
+    The client uses a bounded connection pool with short socket and pool
+    timeouts, so a stalled Redis costs a request at most a fraction of a
+    second. When a connection-level error occurs, Redis is marked
+    unavailable. A background task then pings it until it answers again.
+    Meanwhile history is kept in a bounded in-process LRU, and those turns
+    are written back once Redis recovers. Other Redis users (analysis and
+    stock caches) get the client through client() and skip Redis while it
+    is down.
+    """
+
+    def __init__(self, redis_client: Optional[redis.Redis] = None):
+        # A client can be injected (e.g. fakeredis.aioredis.FakeRedis in tests)
+        self.redis_client = redis_client
+        if self.redis_client is None:
+            try:
+                pool = redis.BlockingConnectionPool.from_url(
+                    settings.REDIS_URL,
+                    db=settings.REDIS_DB,
+                    max_connections=settings.REDIS_MAX_CONNECTIONS,
+                    timeout=settings.REDIS_POOL_TIMEOUT_SECONDS,
+                    socket_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+                    socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT_SECONDS,
+                    health_check_interval=30
+                )
+                self.redis_client = redis.Redis(connection_pool=pool)
+            except Exception as e:
+                print(f"Redis configuration invalid: {e}. History will be kept in-process only.")
+
+        # Optimistic until the first ping or operation says otherwise
+        self.available = self.redis_client is not None
+        self._reconnect_task: Optional[asyncio.Task] = None
+
+        # user_id -> recent turns, used while Redis is unavailable
+        self._fallback: "OrderedDict[str, Deque[Tuple[str, str]]]" = OrderedDict()
+        # Turns written to the fallback that still need to reach Redis
+        self._pending: "OrderedDict[str, List[Tuple[str, str]]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.fallback_writes = 0
+        self.reconnects = 0
+
+    def client(self) -> Optional[redis.Redis]:
+        """The Redis client, or None while Redis is unavailable"""
+        return self.redis_client if self.available else None
+
+    async def connect(self):
+        """Check Redis at startup; start reconnecting in the background if it is down"""
+        if self.redis_client is None:
+            return
         try:
-            self.redis_client = redis.from_url(settings.REDIS_URL, db=settings.REDIS_DB)
-            # Test connection
-            self.redis_client.ping()
+            await self.redis_client.ping()
+            self.available = True
         except Exception as e:
-            print(f"Redis connection failed: {e}. Cache will be disabled.")
-            self.redis_client = None
-    
+            print(f"Redis unavailable at startup: {e}. Using in-process history until it recovers.")
+            self._mark_unavailable()
+
+    async def close(self):
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self.redis_client is not None:
+            try:
+                await self.redis_client.aclose()
+            except Exception as e:
+                print(f"Error closing Redis client: {e}")
+
+    def report_error(self, error: Exception):
+        """Record a failed Redis call; connection-level failures switch to degraded mode"""
+        UPSTREAM_ERRORS.labels(upstream="redis").inc()
+        if isinstance(error, (RedisConnectionError, RedisTimeoutError, asyncio.TimeoutError, OSError)):
+            self._mark_unavailable()
+
+    def _mark_unavailable(self):
+        self.available = False
+        if self._reconnect_task is None or self._reconnect_task.done():
+            try:
+                self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect_loop())
+            except RuntimeError:
+                # No running loop (e.g. called during import); connect() retries at startup
+                self._reconnect_task = None
+
+    async def _reconnect_loop(self):
+        while not self.available:
+            await asyncio.sleep(settings.REDIS_RECONNECT_INTERVAL_SECONDS)
+            try:
+                await self.redis_client.ping()
+            except Exception:
+                continue
+            self.reconnects += 1
+            print("Redis connection restored.")
+            await self._flush_pending()
+            self.available = True
+
+    async def _flush_pending(self):
+        """Replay turns recorded while Redis was down"""
+        ttl_seconds = settings.CACHE_TTL_HOURS * 3600
+        while self._pending:
+            user_id, turns = self._pending.popitem(last=False)
+            cache_key = self._get_cache_key(user_id)
+            try:
+                async with self.redis_client.pipeline(transaction=True) as pipe:
+                    pipe.rpush(cache_key, *(self._encode_turn(message, response) for message, response in turns))
+                    pipe.ltrim(cache_key, -HISTORY_MAX_ITEMS, -1)
+                    pipe.expire(cache_key, ttl_seconds)
+                    await pipe.execute()
+            except Exception as e:
+                print(f"Error restoring history for user {user_id}: {e}")
+        self._fallback.clear()
+
     def _get_cache_key(self, user_id: str) -> str:
-        """Generate cache key for user session"""
-        return f"chat_session:{user_id}"
-    
-    def get_history(self, user_id: str) -> Optional[List[HistoryItem]]:
-        """Retrieve conversation history for a user"""
-        if not self.redis_client or not user_id:
+        """Generate cache key for user session (a Redis list, one item per turn)"""
+        return f"chat_history:{user_id}"
+
+    def _get_summary_key(self, user_id: str) -> str:
+        """Key of the rolling summary of turns folded out of the history list"""
+        return f"chat_summary:{user_id}"
+
+    @staticmethod
+    def _encode_turn(message: str, response: str) -> str:
+        return json.dumps({"message": message, "response": response}, separators=(",", ":"))
+
+    def _fallback_append(self, user_id: str, message: str, response: str):
+        turns = self._fallback.get(user_id)
+        if turns is None:
+            turns = deque(maxlen=HISTORY_MAX_ITEMS)
+            self._fallback[user_id] = turns
+        turns.append((message, response))
+        self._fallback.move_to_end(user_id)
+
+        pending = self._pending.setdefault(user_id, [])
+        pending.append((message, response))
+        del pending[:-HISTORY_MAX_ITEMS]
+        self._pending.move_to_end(user_id)
+
+        while len(self._fallback) > settings.HISTORY_FALLBACK_MAX_USERS:
+            evicted, _ = self._fallback.popitem(last=False)
+            self._pending.pop(evicted, None)
+        self.fallback_writes += 1
+
+    def _fallback_get(self, user_id: str, limit: int) -> Optional[List[HistoryItem]]:
+        turns = self._fallback.get(user_id)
+        if not turns:
             return None
-        
+        self._fallback.move_to_end(user_id)
+        return [HistoryItem(message=message, response=response) for message, response in list(turns)[-limit:]]
+
+    async def get_history(self, user_id: str, limit: int = HISTORY_CONTEXT_TURNS) -> Optional[List[HistoryItem]]:
+        """Retrieve the most recent conversation turns for a user"""
+        if not user_id:
+            return None
+
+        redis_client = self.client()
+        if redis_client is None:
+            return self._fallback_get(user_id, limit)
+
         try:
             cache_key = self._get_cache_key(user_id)
-            cached_data = self.redis_client.get(cache_key)
-            
-            if cached_data:
-                history_data = json.loads(cached_data)
-                return [HistoryItem(**item) for item in history_data]
-            
+            with tracer.span("redis.get_history", limit=limit):
+                cached_items = await redis_client.lrange(cache_key, -limit, -1)
+
+            if cached_items:
+                self.hits += 1
+                return [HistoryItem(**json.loads(item)) for item in cached_items]
+
+            self.misses += 1
             return None
         except Exception as e:
+            self.report_error(e)
             print(f"Error retrieving cache for user {user_id}: {e}")
-            return None
-    
-    def update_history(self, user_id: str, new_message: str, new_response: str, existing_history: Optional[List[HistoryItem]] = None):
-        """Update conversation history for a user"""
-        if not self.redis_client or not user_id:
+            return self._fallback_get(user_id, limit)
+
+    async def get_session(self, user_id: str, limit: int = HISTORY_CONTEXT_TURNS) -> Tuple[Optional[List[HistoryItem]], Optional[str]]:
+        """Recent turns plus the rolling summary of older ones, in one round-trip"""
+        if not user_id:
+            return None, None
+
+        redis_client = self.client()
+        if redis_client is None:
+            return self._fallback_get(user_id, limit), None
+
+        try:
+            with tracer.span("redis.get_session", limit=limit):
+                async with redis_client.pipeline(transaction=False) as pipe:
+                    pipe.lrange(self._get_cache_key(user_id), -limit, -1)
+                    pipe.get(self._get_summary_key(user_id))
+                    cached_items, summary = await pipe.execute()
+
+            if cached_items or summary:
+                self.hits += 1
+            else:
+                self.misses += 1
+            history = [HistoryItem(**json.loads(item)) for item in cached_items] or None
+            return history, summary.decode("utf-8") if summary else None
+        except Exception as e:
+            self.report_error(e)
+            print(f"Error retrieving session for user {user_id}: {e}")
+            return self._fallback_get(user_id, limit), None
+
+    async def fold_history(self, user_id: str, count: int, summary: str):
+        """Replace the oldest count turns with an updated rolling summary.
+
+        Turns are only ever appended on the right and compaction keeps the
+        list well under HISTORY_MAX_ITEMS, so popping count items from the
+        left removes the turns that were summarized even if new turns
+        arrived meanwhile.
+        """
+        redis_client = self.client()
+        if redis_client is None or not user_id or count <= 0:
+            return
+
+        ttl_seconds = settings.CACHE_TTL_HOURS * 3600
+        try:
+            with tracer.span("redis.fold_history", turns=count):
+                async with redis_client.pipeline(transaction=True) as pipe:
+                    pipe.lpop(self._get_cache_key(user_id), count)
+                    pipe.set(self._get_summary_key(user_id), summary, ex=ttl_seconds)
+                    await pipe.execute()
+        except Exception as e:
+            self.report_error(e)
+            print(f"Error folding history for user {user_id}: {e}")
+
+    async def acquire_lock(self, name: str, ttl_seconds: int) -> bool:
+        """Best-effort cross-worker lock; False when held elsewhere or Redis is down"""
+        redis_client = self.client()
+        if redis_client is None:
+            return False
+        try:
+            return bool(await redis_client.set(f"lock:{name}", "1", nx=True, ex=ttl_seconds))
+        except Exception as e:
+            self.report_error(e)
+            return False
+
+    async def release_lock(self, name: str):
+        redis_client = self.client()
+        if redis_client is None:
             return
-        
         try:
-            # Get existing history (from cache or provided)
-            history = existing_history or self.get_history(user_id) or []
-            
-            # Add new conversation
-            new_item = HistoryItem(message=new_message, response=new_response)
-            history.append(new_item)
-            
-            # Keep only last 15 conversations to prevent cache bloat
-            if len(history) > 15:
-                history = history[-15:]
-            
-            # Save to cache with TTL
+            await redis_client.delete(f"lock:{name}")
+        except Exception as e:
+            self.report_error(e)
+
+    async def update_history(self, user_id: str, new_message: str, new_response: str):
+        """Append one turn to a user's conversation history.
+
+        RPUSH, LTRIM and EXPIRE go out as one MULTI/EXEC pipeline, so the
+        append is a single round-trip and concurrent requests for the same
+        user (e.g. two open tabs) never overwrite each other's turns.
+        """
+        if not user_id:
+            return
+
+        redis_client = self.client()
+        if redis_client is None:
+            self._fallback_append(user_id, new_message, new_response)
+            return
+
+        try:
             cache_key = self._get_cache_key(user_id)
-            history_data = [item.dict() for item in history]
+            item = self._encode_turn(new_message, new_response)
             ttl_seconds = settings.CACHE_TTL_HOURS * 3600  # Convert hours to seconds
-            
-            self.redis_client.setex(cache_key, ttl_seconds, json.dumps(history_data))
-            
+
+            with tracer.span("redis.update_history"):
+                async with redis_client.pipeline(transaction=True) as pipe:
+                    pipe.rpush(cache_key, item)
+                    # Keep only the last turns to prevent cache bloat
+                    pipe.ltrim(cache_key, -HISTORY_MAX_ITEMS, -1)
+                    pipe.expire(cache_key, ttl_seconds)
+                    await pipe.execute()
+
         except Exception as e:
+            self.report_error(e)
             print(f"Error updating cache for user {user_id}: {e}")
-    
-    def clear_session(self, user_id: str):
+            self._fallback_append(user_id, new_message, new_response)
+
+    async def clear_session(self, user_id: str):
         """Clear conversation history for a user"""
-        if not self.redis_client or not user_id:
+        if not user_id:
             return
-        
+
+        self._fallback.pop(user_id, None)
+        self._pending.pop(user_id, None)
+        redis_client = self.client()
+        if redis_client is None:
+            return
+
         try:
             cache_key = self._get_cache_key(user_id)
-            self.redis_client.delete(cache_key)
+            await redis_client.delete(cache_key, self._get_summary_key(user_id))
         except Exception as e:
+            self.report_error(e)
             print(f"Error clearing cache for user {user_id}: {e}")
 
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "fallback_writes": self.fallback_writes,
+            "reconnects": self.reconnects,
+            "available": 1 if self.available else 0
+        }
+
 # Global cache manager instance
-cache_manager = SessionCacheManager()
\ No newline at end of file
+cache_manager = SessionCacheManager()
+stats_collector.register("session_history", cache_manager.stats)
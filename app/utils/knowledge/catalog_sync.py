@@ -0,0 +1,93 @@
+# app/utils/knowledge/catalog_sync.py
+import asyncio
+from typing import Dict, Optional
+from app.core.config import settings
+from app.core.metrics import stats_collector
+from app.utils.cache_manager import cache_manager
+from .knowledge import knowledge_manager
+
+CATALOG_VERSION_KEY = "catalog:version"
+
+class CatalogSync:
+    """Keeps each worker's in-process search indexes in step with the shared store.
+
+    The lexical and memory indexes are per process, so a write handled by
+    one worker is invisible to the others. Every knowledge write bumps a
+    version counter in Redis. Each process polls it and, when another
+    process moved it, rebuilds its indexes from Chroma off the event loop.
+    While Redis is down, processes keep serving the indexes they have.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.version: Optional[int] = None
+        self.reloads = 0
+        self.failed_reloads = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _read_version(self) -> Optional[int]:
+        client = cache_manager.client()
+        if client is None:
+            return None
+        try:
+            value = await client.get(CATALOG_VERSION_KEY)
+        except Exception as e:
+            cache_manager.report_error(e)
+            return None
+        return int(value) if value is not None else 0
+
+    async def bump(self):
+        """Announce a knowledge write made by this process"""
+        client = cache_manager.client()
+        if client is None:
+            return
+        try:
+            version = await client.incr(CATALOG_VERSION_KEY)
+        except Exception as e:
+            cache_manager.report_error(e)
+            return
+        # Only our own write since the last poll is already in our indexes;
+        # if others wrote in between, the next check reloads
+        if self.version is not None and version == self.version + 1:
+            self.version = version
+
+    async def check(self):
+        """Reload the indexes if the catalog changed since the last check"""
+        version = await self._read_version()
+        if version is None or version == self.version:
+            return
+        # Also reached when Redis was down at startup: the baseline is unknown
+        if not await knowledge_manager.reload_indexes_async():
+            self.failed_reloads += 1
+            return
+        self.reloads += 1
+        self.version = version
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception as e:
+                print(f"Catalog sync check failed: {e}")
+
+    async def start(self):
+        """Record the current version and start polling (no-op if the interval is 0)"""
+        if self.interval <= 0 or self._task is not None:
+            return
+        self.version = await self._read_version()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "reloads": self.reloads,
+            "failed_reloads": self.failed_reloads
+        }
+
+catalog_sync = CatalogSync(settings.CATALOG_SYNC_INTERVAL_SECONDS)
+stats_collector.register("catalog_sync", catalog_sync.stats)
@@ -0,0 +1,88 @@
+# app/utils/knowledge/filters.py
+from typing import Any, Dict, List, Optional, Union
+from pydantic import ValidationError
+from .knowledge_schema import ProductFilters
+
+# Normalized metadata written next to the raw fields so filters compare like with like
+EFFECTIVE_PRICE_KEY = "effectivePrice"
+BRAND_KEY = "brandKey"
+TYPE_KEY = "typeKey"
+
+def normalize_key(value: str) -> str:
+    return " ".join(str(value).casefold().split())
+
+def filter_values(value: Optional[Union[List[str], str]]) -> List[str]:
+    """Normalized filter values; a string is one value, even if it contains commas"""
+    if value is None:
+        return []
+    values = value if isinstance(value, list) else [value]
+    return [normalize_key(v) for v in values if str(v).strip()]
+
+def add_filter_fields(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the numeric price after offer and casefolded brand/type used by filters"""
+    price = metadata.get("price")
+    if isinstance(price, (int, float)) and not isinstance(price, bool):
+        offer = metadata.get("offer") or 0
+        metadata[EFFECTIVE_PRICE_KEY] = round(float(price) * (1 - float(offer) / 100), 2)
+    if metadata.get("brand"):
+        metadata[BRAND_KEY] = normalize_key(metadata["brand"])
+    if metadata.get("type"):
+        metadata[TYPE_KEY] = normalize_key(metadata["type"])
+    return metadata
+
+def parse_filters(raw: Any) -> Optional[ProductFilters]:
+    """ProductFilters from a model-produced dict; None if absent, invalid or empty"""
+    if isinstance(raw, ProductFilters):
+        filters = raw
+    elif isinstance(raw, dict):
+        try:
+            filters = ProductFilters(**{key: value for key, value in raw.items() if value not in (None, "", [])})
+        except (ValidationError, TypeError):
+            return None
+    else:
+        return None
+    return None if is_empty(filters) else filters
+
+def is_empty(filters: Optional[ProductFilters]) -> bool:
+    return filters is None or not any(
+        value not in (None, "", []) and value is not False
+        for value in filters.dict().values()
+    )
+
+def build_where(filters: Optional[ProductFilters]) -> Optional[Dict[str, Any]]:
+    """Chroma where clause for the metadata constraints (in_stock is not one of them)"""
+    if filters is None:
+        return None
+    clauses: List[Dict[str, Any]] = []
+    if filters.min_price is not None:
+        clauses.append({EFFECTIVE_PRICE_KEY: {"$gte": filters.min_price}})
+    if filters.max_price is not None:
+        clauses.append({EFFECTIVE_PRICE_KEY: {"$lte": filters.max_price}})
+    for key, values in ((BRAND_KEY, filter_values(filters.brand)), (TYPE_KEY, filter_values(filters.type))):
+        if len(values) == 1:
+            clauses.append({key: {"$eq": values[0]}})
+        elif values:
+            clauses.append({key: {"$in": values}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def matches(filters: Optional[ProductFilters], metadata: Optional[Dict[str, Any]]) -> bool:
+    """In-process equivalent of build_where, for results that did not come from Chroma"""
+    if filters is None:
+        return True
+    metadata = metadata or {}
+    price = metadata.get(EFFECTIVE_PRICE_KEY)
+    if filters.min_price is not None and (price is None or price < filters.min_price):
+        return False
+    if filters.max_price is not None and (price is None or price > filters.max_price):
+        return False
+    for key, values in ((BRAND_KEY, filter_values(filters.brand)), (TYPE_KEY, filter_values(filters.type))):
+        if values and metadata.get(key) not in values:
+            return False
+    return True
+
+def in_stock(product: Dict[str, Any]) -> bool:
+    """Keep products unless live stock says zero; unknown stock is not filtered out"""
+    stock = (product.get("data") or {}).get("totalStock")
+    return stock is None or stock > 0
@@ -1,14 +1,108 @@
-from typing import List, Dict, Optional, Any
+from typing import AsyncIterator, List, Dict, Optional, Any, Tuple
 from enum import Enum
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import base64
+import contextvars
+import functools
+import hashlib
 import uuid
 import json
+import httpx
+from chromadb.errors import ChromaError
+from app.core.config import settings
+from app.core.metrics import observe_stage, stats_collector, UPSTREAM_ERRORS
 from app.vectordb.config import vector_db
-from .knowledge_schema import ProductKnowledge
+from .knowledge_schema import ProductFilters, ProductKnowledge
+from .filters import add_filter_fields, build_where, matches
+from .lexical_index import LexicalIndex, looks_like_sku, reciprocal_rank_fusion
+from .memory_index import MemoryVectorIndex
+
+# Failures of the Chroma store itself (the HTTP client raises httpx errors when the server is unreachable)
+CHROMA_ERRORS = (ChromaError, httpx.HTTPError)
+
+# Stored with every product so re-pushed catalogs can skip unchanged items
+TEXT_HASH_KEY = "textHash"
+METADATA_HASH_KEY = "metadataHash"
 
 class KnowledgeManager:
     def __init__(self):
-        self.collection = vector_db.get_collection()
-        
+        # Chroma's client is synchronous; async callers go through this pool
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.VECTORDB_MAX_WORKERS,
+            thread_name_prefix="vectordb"
+        )
+        # Filled by warm_up(); until then searches use Chroma alone
+        self.lexical_index = LexicalIndex()
+        # Optional in-process mirror of the vectors; Chroma remains the store
+        self.memory_index: Optional[MemoryVectorIndex] = None
+        self.indexes_ready = False
+    
+    @property
+    def collection(self):
+        """The product collection, opened on first use"""
+        return vector_db.get_collection()
+    
+    def warm_up(self):
+        """Open the collection and build the in-process indexes; raises on failure"""
+        vector_db.warm_up()
+        self._rebuild_indexes()
+    
+    async def warm_up_async(self):
+        await self._run_in_executor(self.warm_up)
+    
+    def _build_lexical_index(self, page_size: int = 1000) -> LexicalIndex:
+        """Build the BM25 index from the documents already stored in Chroma"""
+        index = LexicalIndex()
+        offset = 0
+        while True:
+            chunk = self.get_products_chunk(offset, page_size, include_documents=True)
+            index.add_many((product["id"], product["document"] or "") for product in chunk)
+            if len(chunk) < page_size:
+                break
+            offset += len(chunk)
+        return index
+    
+    def _build_memory_index(self) -> Optional[MemoryVectorIndex]:
+        """Copy every stored embedding into a new in-memory vector index, if enabled"""
+        if settings.VECTOR_INDEX_BACKEND != "memory":
+            return None
+        index = MemoryVectorIndex(
+            quantization=settings.VECTOR_INDEX_QUANTIZATION,
+            rescore_factor=settings.VECTOR_INDEX_RESCORE_FACTOR,
+            fetch_vectors=self._get_embeddings
+        )
+        index.load(self.collection)
+        return index
+    
+    def _rebuild_indexes(self):
+        """Build the in-process indexes from Chroma, then swap them in.
+
+        Searches keep using the current indexes while the new ones load.
+        """
+        lexical_index = self._build_lexical_index()
+        memory_index = self._build_memory_index()
+        self.lexical_index = lexical_index
+        self.memory_index = memory_index
+        self.indexes_ready = True
+    
+    def reload_indexes(self) -> bool:
+        """Rebuild the indexes after another process changed the catalog, keeping the current ones on failure"""
+        try:
+            self._rebuild_indexes()
+        except Exception as e:
+            print(f"Error reloading search indexes: {e}")
+            return False
+        return True
+    
+    async def reload_indexes_async(self) -> bool:
+        return await self._run_in_executor(self.reload_indexes)
+    
+    def _get_embeddings(self, ids: List[str]) -> Dict[str, List[float]]:
+        """Stored float vectors by id, for rescoring quantized index candidates"""
+        with observe_stage("chroma_rescore_fetch"):
+            results = self.collection.get(ids=ids, include=["embeddings"])
+        return dict(zip(results["ids"], results["embeddings"]))
     
     def flatten_metadata(self,metadata: dict) -> dict:
         flattened = {}
@@ -23,16 +117,24 @@ class KnowledgeManager:
         """Add a new product to the vector database using the provided productId"""
         try:
             product_id = product.productId
+            if product_id in self._get_existing_metadata([product_id]):
+                # Chroma's add ignores existing ids; don't let the in-process indexes diverge
+                return {
+                    "success": False,
+                    "error": f"Product {product_id} already exists"
+                }
             
-            searchable_text = self._create_searchable_text(product)
-            
-            product_dict = product.dict(exclude_none=True)
-            flattened_metadata = self.flatten_metadata(product_dict) 
+            searchable_text, flattened_metadata = self._prepare_product(product)
+            embeddings = self.embed_documents([searchable_text])
             self.collection.add(
                 documents=[searchable_text],
                 metadatas=[flattened_metadata],
+                embeddings=embeddings,
                 ids=[product_id]  
             )
+            self.lexical_index.add(product_id, searchable_text)
+            if self.memory_index is not None:
+                self.memory_index.upsert([product_id], embeddings, [flattened_metadata])
             
             return {
                 "success": True,
@@ -45,46 +147,356 @@ class KnowledgeManager:
                 "error": str(e)
             }
     
-    def search_products(self, query: str, n_results: int = 5, filters: Optional[Dict] = None) -> List[Dict]:
-        """Search for products using vector similarity"""
+    async def add_product_async(self, product: ProductKnowledge) -> Dict[str, Any]:
+        """Run add_product on the vector DB pool"""
+        return await self._run_in_executor(self.add_product, product)
+    
+    def add_products_batch(self, products: List[ProductKnowledge], force: bool = False) -> Dict[str, Any]:
+        """Upsert many products with batched embedding calls and chunked Chroma writes.
+
+        Products whose content hashes match the stored copy are skipped, and
+        products where only metadata changed are updated without re-embedding
+        (unless force is set). Returns a per-item report; a failure only marks
+        the items it affected.
+        """
+        items: List[Dict[str, Any]] = [
+            {"index": i, "product_id": product.productId, "success": False}
+            for i, product in enumerate(products)
+        ]
+        
+        # Chroma rejects duplicate ids within one call; the last occurrence wins
+        latest: Dict[str, int] = {}
+        for i, product in enumerate(products):
+            if product.productId in latest:
+                items[latest[product.productId]]["error"] = "Superseded by a later item with the same productId"
+            latest[product.productId] = i
+        
+        pending = []
+        for product_id, i in latest.items():
+            try:
+                searchable_text, metadata = self._prepare_product(products[i])
+                pending.append((i, product_id, searchable_text, metadata))
+            except Exception as e:
+                items[i]["error"] = str(e)
+        
+        chunk_size = settings.KNOWLEDGE_UPSERT_CHUNK_SIZE
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            try:
+                existing = {} if force else self._get_existing_metadata([product_id for _, product_id, _, _ in chunk])
+            except Exception as e:
+                # Without the stored copies we can't tell what changed; fail this chunk, keep going
+                print(f"Error reading stored products, skipping a chunk of {len(chunk)}: {e}")
+                for i, _, _, _ in chunk:
+                    items[i]["error"] = f"Reading the stored product failed: {e}"
+                continue
+            
+            to_embed, to_update = [], []
+            for entry in chunk:
+                i, product_id, _, metadata = entry
+                action = "reembedded" if force else self._classify_change(existing.get(product_id), metadata)
+                items[i]["action"] = action
+                if action == "unchanged":
+                    items[i]["success"] = True
+                elif action == "metadata_updated":
+                    to_update.append(entry)
+                else:
+                    to_embed.append(entry)
+            
+            if to_update:
+                self._update_metadata_chunk(to_update, items)
+            if to_embed:
+                self._upsert_chunk(to_embed, items)
+        
+        succeeded = sum(1 for item in items if item["success"])
+        return {
+            "success": succeeded == len(items),
+            "total": len(items),
+            "succeeded": succeeded,
+            "failed": len(items) - succeeded,
+            "items": items
+        }
+    
+    def _upsert_chunk(self, chunk: List[tuple], items: List[Dict[str, Any]]):
+        """Embed and upsert one chunk, isolating bad items if the bulk write fails"""
+        indices = [i for i, _, _, _ in chunk]
+        ids = [product_id for _, product_id, _, _ in chunk]
+        documents = [text for _, _, text, _ in chunk]
+        metadatas = [metadata for _, _, _, metadata in chunk]
+        
         try:
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=n_results,
-                where=filters if filters else None
+            embeddings = self.embed_documents(documents)
+        except Exception as e:
+            for i in indices:
+                items[i]["error"] = f"Embedding failed: {e}"
+            return
+        
+        try:
+            self.collection.upsert(
+                ids=ids,
+                documents=documents,
+                metadatas=metadatas,
+                embeddings=embeddings
             )
+            for i in indices:
+                items[i]["success"] = True
+            self.lexical_index.add_many(zip(ids, documents))
+            if self.memory_index is not None:
+                self.memory_index.upsert(ids, embeddings, metadatas)
+            return
+        except Exception as e:
+            print(f"Bulk upsert failed, retrying items individually: {e}")
+        
+        for i, product_id, document, metadata, embedding in zip(indices, ids, documents, metadatas, embeddings):
+            try:
+                self.collection.upsert(
+                    ids=[product_id],
+                    documents=[document],
+                    metadatas=[metadata],
+                    embeddings=[embedding]
+                )
+                items[i]["success"] = True
+                self.lexical_index.add(product_id, document)
+                if self.memory_index is not None:
+                    self.memory_index.upsert([product_id], [embedding], [metadata])
+            except Exception as e:
+                items[i]["error"] = str(e)
+    
+    def _update_metadata_chunk(self, chunk: List[tuple], items: List[Dict[str, Any]]):
+        """Write metadata-only changes; the stored document and embedding are kept"""
+        indices = [i for i, _, _, _ in chunk]
+        ids = [product_id for _, product_id, _, _ in chunk]
+        metadatas = [metadata for _, _, _, metadata in chunk]
+        
+        try:
+            self.collection.update(ids=ids, metadatas=metadatas)
+            for i in indices:
+                items[i]["success"] = True
+            if self.memory_index is not None:
+                self.memory_index.update_metadata(ids, metadatas)
+            return
+        except Exception as e:
+            print(f"Bulk metadata update failed, retrying items individually: {e}")
+        
+        for i, product_id, metadata in zip(indices, ids, metadatas):
+            try:
+                self.collection.update(ids=[product_id], metadatas=[metadata])
+                items[i]["success"] = True
+                if self.memory_index is not None:
+                    self.memory_index.update_metadata([product_id], [metadata])
+            except Exception as e:
+                items[i]["error"] = str(e)
+    
+    def _get_existing_metadata(self, ids: List[str]) -> Dict[str, Dict]:
+        """Stored metadata for the given ids (missing ids are simply absent)"""
+        results = self.collection.get(ids=ids, include=["metadatas"])
+        return {
+            product_id: metadata or {}
+            for product_id, metadata in zip(results['ids'], results['metadatas'] or [])
+        }
+    
+    @staticmethod
+    def _content_hash(value: str) -> str:
+        return hashlib.sha256(value.encode("utf-8")).hexdigest()
+    
+    def _prepare_product(self, product: ProductKnowledge) -> Tuple[str, Dict[str, Any]]:
+        """Searchable text plus flattened metadata carrying both content hashes"""
+        searchable_text = self._create_searchable_text(product)
+        metadata = add_filter_fields(self.flatten_metadata(product.dict(exclude_none=True)))
+        metadata[METADATA_HASH_KEY] = self._content_hash(json.dumps(metadata, sort_keys=True, default=str))
+        metadata[TEXT_HASH_KEY] = self._content_hash(searchable_text)
+        return searchable_text, metadata
+    
+    def _classify_change(self, existing: Optional[Dict], metadata: Dict[str, Any]) -> str:
+        """Decide how much work a write needs by comparing stored and new hashes"""
+        if existing is None:
+            return "created"
+        if existing.get(TEXT_HASH_KEY) != metadata[TEXT_HASH_KEY]:
+            return "reembedded"
+        if existing.get(METADATA_HASH_KEY) != metadata[METADATA_HASH_KEY]:
+            return "metadata_updated"
+        return "unchanged"
+    
+    def embed_documents(self, documents: List[str]) -> List[List[float]]:
+        """Embed documents in request-sized batches (input count and total size)"""
+        embeddings: List[List[float]] = []
+        batch: List[str] = []
+        batch_chars = 0
+        for document in documents:
+            if batch and (
+                len(batch) >= settings.EMBEDDING_BATCH_SIZE
+                or batch_chars + len(document) > settings.EMBEDDING_BATCH_MAX_CHARS
+            ):
+                embeddings.extend(vector_db.embedding_function(batch))
+                batch, batch_chars = [], 0
+            batch.append(document)
+            batch_chars += len(document)
+        if batch:
+            embeddings.extend(vector_db.embedding_function(batch))
+        return embeddings
+    
+    async def add_products_batch_async(self, products: List[ProductKnowledge], force: bool = False) -> Dict[str, Any]:
+        """Run add_products_batch on the vector DB pool"""
+        return await self._run_in_executor(self.add_products_batch, products, force)
+    
+    def search_products(self, query: str, n_results: int = 5, filters: Optional[ProductFilters] = None, query_embedding: Optional[List[float]] = None) -> List[Dict]:
+        """Hybrid product search: BM25 and vector similarity fused by reciprocal rank.
+
+        Model-number / SKU queries that hit the lexical index are answered
+        from it alone, without embedding the query. Pass query_embedding to
+        skip embedding the query. Price, brand and type filters are pushed
+        down to Chroma as a where clause (or applied as masks by the memory
+        index); in_stock needs live stock and is left to the caller.
+        """
+        try:
+            where = build_where(filters)
+            lexical_hits: List[Tuple[str, float]] = []
+            if settings.HYBRID_SEARCH_ENABLED:
+                with observe_stage("lexical_query"):
+                    lexical_hits = self.lexical_index.search(query, max(n_results, settings.HYBRID_CANDIDATES))
+                if lexical_hits and settings.LEXICAL_SKU_SHORTCUT and looks_like_sku(query):
+                    products = self._fuse([], lexical_hits, n_results, filters)
+                    if products or where is None:
+                        return products
             
-            products = []
-            if results['metadatas'] and len(results['metadatas']) > 0:
-                for i, metadata in enumerate(results['metadatas'][0]):
-                    product = {
-                        "id": results['ids'][0][i] if results['ids'] else None,
-                        "data": metadata,
-                        "relevance_score": 1 - results['distances'][0][i] if results['distances'] else 0
-                    }
-                    products.append(product)
+            if query_embedding is None:
+                query_embedding = self.embed_query(query)
+            candidates = max(n_results, settings.HYBRID_CANDIDATES) if lexical_hits else n_results
+            products = self._vector_search(query_embedding, candidates, filters, where)
             
-            return products
+            if not lexical_hits:
+                return products
+            return self._fuse(products, lexical_hits, n_results, filters)
+        except CHROMA_ERRORS as e:
+            UPSTREAM_ERRORS.labels(upstream="chroma").inc()
+            print(f"Search error: {e}")
+            return []
         except Exception as e:
+            # Embedding failures are counted by the embedding cache
             print(f"Search error: {e}")
             return []
     
+    def _vector_search(self, query_embedding: List[float], n_results: int, filters: Optional[ProductFilters], where: Optional[Dict[str, Any]]) -> List[Dict]:
+        """Nearest products from the memory index when enabled, otherwise from Chroma"""
+        memory_index = self.memory_index
+        if memory_index is not None:
+            with observe_stage("memory_query"):
+                return memory_index.search(query_embedding, n_results, filters)
+        
+        with observe_stage("chroma_query"):
+            results = self.collection.query(
+                query_embeddings=[query_embedding],
+                n_results=n_results,
+                where=where
+            )
+        
+        products = []
+        if results['metadatas'] and len(results['metadatas']) > 0:
+            for i, metadata in enumerate(results['metadatas'][0]):
+                product = {
+                    "id": results['ids'][0][i] if results['ids'] else None,
+                    "data": metadata,
+                    "relevance_score": 1 - results['distances'][0][i] if results['distances'] else 0
+                }
+                products.append(product)
+        return products
+    
+    def _fuse(self, vector_products: List[Dict], lexical_hits: List[Tuple[str, float]], n_results: int, filters: Optional[ProductFilters] = None) -> List[Dict]:
+        """Merge vector and BM25 rankings with reciprocal rank fusion.
+
+        Products found only lexically have no relevance_score; every product
+        the lexical index matched carries its lexical_score. Lexical-only
+        candidates are checked against the filters here, since Chroma never
+        saw them.
+        """
+        by_id = {product["id"]: product for product in vector_products}
+        vector_ids = set(by_id)
+        lexical_scores = dict(lexical_hits)
+        fused = reciprocal_rank_fusion(
+            [list(by_id), [product_id for product_id, _ in lexical_hits]],
+            k=settings.HYBRID_RRF_K
+        )
+        if filters is None:
+            fused = fused[:n_results]
+        
+        missing = [product_id for product_id, _ in fused if product_id not in by_id]
+        if missing:
+            results = self.collection.get(ids=missing, include=["metadatas"])
+            for product_id, metadata in zip(results['ids'], results['metadatas'] or []):
+                by_id[product_id] = {"id": product_id, "data": metadata, "relevance_score": None}
+        
+        products = []
+        for product_id, _ in fused:
+            product = by_id.get(product_id)
+            if product is None:
+                # Indexed but gone from Chroma; drop the stale entry
+                self.lexical_index.remove(product_id)
+                if self.memory_index is not None:
+                    self.memory_index.remove([product_id])
+                continue
+            if product_id not in vector_ids and not matches(filters, product["data"]):
+                continue
+            if product_id in lexical_scores:
+                product["lexical_score"] = lexical_scores[product_id]
+            products.append(product)
+            if len(products) >= n_results:
+                break
+        return products
+    
+    async def search_products_async(self, query: str, n_results: int = 5, filters: Optional[ProductFilters] = None, query_embedding: Optional[List[float]] = None) -> List[Dict]:
+        """Run search_products on the vector DB pool without blocking the event loop"""
+        return await self._run_in_executor(self.search_products, query, n_results, filters, query_embedding)
+    
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a search query with the collection's (cached) embedding function"""
+        return vector_db.embedding_function([query])[0]
+    
+    async def embed_query_async(self, query: str) -> List[float]:
+        return await self._run_in_executor(self.embed_query, query)
+    
+    async def _run_in_executor(self, func, *args):
+        """Run a blocking call on the vector DB pool, keeping the caller's context (metrics labels)"""
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, functools.partial(context.run, func, *args))
+    
     def update_product(self, product_id: str, product: ProductKnowledge) -> Dict[str, Any]:
-        """Update an existing product"""
+        """Update an existing product, re-embedding only if its searchable text changed"""
         try:
-            searchable_text = self._create_searchable_text(product)
-            product_dict = product.dict(exclude_none=True)
-            flattened_metadata = self.flatten_metadata(product_dict) 
+            searchable_text, flattened_metadata = self._prepare_product(product)
+            existing = self._get_existing_metadata([product_id]).get(product_id)
+            if existing is None:
+                # Chroma's update ignores unknown ids; don't let the in-process indexes diverge
+                return {
+                    "success": False,
+                    "not_found": True,
+                    "error": f"Product {product_id} not found"
+                }
+            action = self._classify_change(existing, flattened_metadata)
             
-            self.collection.update(
-                ids=[product_id],
-                documents=[searchable_text],
-                metadatas=[flattened_metadata]
-            )
+            if action == "metadata_updated":
+                self.collection.update(
+                    ids=[product_id],
+                    metadatas=[flattened_metadata]
+                )
+                if self.memory_index is not None:
+                    self.memory_index.update_metadata([product_id], [flattened_metadata])
+            elif action != "unchanged":
+                embeddings = self.embed_documents([searchable_text])
+                self.collection.update(
+                    ids=[product_id],
+                    documents=[searchable_text],
+                    metadatas=[flattened_metadata],
+                    embeddings=embeddings
+                )
+                self.lexical_index.add(product_id, searchable_text)
+                if self.memory_index is not None:
+                    self.memory_index.upsert([product_id], embeddings, [flattened_metadata])
             
             return {
                 "success": True,
-                "message": "Product updated successfully"
+                "message": "Product updated successfully",
+                "action": action
             }
         except Exception as e:
             return {
@@ -92,10 +504,17 @@ class KnowledgeManager:
                 "error": str(e)
             }
     
+    async def update_product_async(self, product_id: str, product: ProductKnowledge) -> Dict[str, Any]:
+        """Run update_product on the vector DB pool"""
+        return await self._run_in_executor(self.update_product, product_id, product)
+    
     def delete_product(self, product_id: str) -> Dict[str, Any]:
         """Delete a product from the database"""
         try:
             self.collection.delete(ids=[product_id])
+            self.lexical_index.remove(product_id)
+            if self.memory_index is not None:
+                self.memory_index.remove([product_id])
             return {
                 "success": True,
                 "message": "Product deleted successfully"
@@ -106,27 +525,89 @@ class KnowledgeManager:
                 "error": str(e)
             }
     
-    def get_all_products(self, limit: int = 100) -> List[Dict]:
-        """Get all products from the database"""
+    async def delete_product_async(self, product_id: str) -> Dict[str, Any]:
+        """Run delete_product on the vector DB pool"""
+        return await self._run_in_executor(self.delete_product, product_id)
+    
+    def get_all_products(self, limit: int = 100, offset: int = 0, include_documents: bool = False, include_embeddings: bool = False) -> List[Dict]:
+        """Get one page of products from the database"""
         try:
-            results = self.collection.get(limit=limit)
-            products = []
-            
-            if results['metadatas']:
-                for i, metadata in enumerate(results['metadatas']):
-                    product = {
-                        "id": results['ids'][i] if results['ids'] else None,
-                        "data": metadata
-                    }
-                    products.append(product)
-            
-            return products
+            return self.get_products_chunk(offset, limit, include_documents, include_embeddings)
         except Exception as e:
             print(f"Error getting products: {e}")
             return []
     
+    def get_products_chunk(self, offset: int, limit: int, include_documents: bool = False, include_embeddings: bool = False) -> List[Dict]:
+        """Products [offset, offset + limit) in storage order; documents and embeddings only on request"""
+        include = ["metadatas"]
+        if include_documents:
+            include.append("documents")
+        if include_embeddings:
+            include.append("embeddings")
+        results = self.collection.get(limit=limit, offset=offset, include=include)
+        
+        metadatas = results['metadatas'] or []
+        documents = results['documents'] if include_documents else None
+        embeddings = results['embeddings'] if include_embeddings else None
+        products = []
+        for i, product_id in enumerate(results['ids']):
+            product = {
+                "id": product_id,
+                "data": metadatas[i] if i < len(metadatas) else None
+            }
+            if documents is not None:
+                product["document"] = documents[i]
+            if embeddings is not None:
+                embedding = embeddings[i]
+                product["embedding"] = embedding.tolist() if hasattr(embedding, "tolist") else list(embedding)
+            products.append(product)
+        return products
+    
+    @staticmethod
+    def encode_cursor(offset: int) -> str:
+        return base64.urlsafe_b64encode(f"o:{offset}".encode("ascii")).decode("ascii")
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> int:
+        """Offset from a cursor produced by encode_cursor; ValueError if malformed"""
+        try:
+            kind, value = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii").split(":", 1)
+            offset = int(value)
+        except Exception:
+            raise ValueError("Invalid cursor")
+        if kind != "o" or offset < 0:
+            raise ValueError("Invalid cursor")
+        return offset
+    
+    async def get_products_page(self, limit: int = 100, cursor: Optional[str] = None, offset: int = 0, include_documents: bool = False, include_embeddings: bool = False) -> Dict[str, Any]:
+        """One page plus the cursor of the next one (None on the last page)"""
+        if cursor:
+            offset = self.decode_cursor(cursor)
+        products = await self._run_in_executor(self.get_products_chunk, offset, limit, include_documents, include_embeddings)
+        return {
+            "products": products,
+            "offset": offset,
+            "next_cursor": self.encode_cursor(offset + len(products)) if len(products) == limit else None
+        }
+    
+    async def iter_products(self, chunk_size: int = 1000, include_documents: bool = False, include_embeddings: bool = False) -> AsyncIterator[List[Dict]]:
+        """Walk the whole collection one chunk at a time, so memory stays bounded by chunk_size"""
+        offset = 0
+        while True:
+            chunk = await self._run_in_executor(self.get_products_chunk, offset, chunk_size, include_documents, include_embeddings)
+            if chunk:
+                yield chunk
+            if len(chunk) < chunk_size:
+                return
+            offset += len(chunk)
+    
     def _create_searchable_text(self, product: ProductKnowledge) -> str:
-        """Create a searchable text representation of the product"""
+        """Create a searchable text representation of the product.
+
+        Price, installation price and status are deliberately left out: they
+        live in metadata, so catalog price/stock changes never need a new
+        embedding.
+        """
         parts = []
         
         if product.productName:
@@ -141,17 +622,15 @@ class KnowledgeManager:
             parts.append(f"Color: {product.color}")
         if product.description:
             parts.append(f"Description: {product.description}")
-        if product.price:
-            parts.append(f"Price: ${product.price}")
-        if product.priceWithInstallation:
-            parts.append(f"Price with installation: ${product.priceWithInstallation}")
         if product.condition:
             parts.append(f"Condition: {product.condition}")
         if product.warrantyType:
             parts.append(f"Warranty: {product.warrantyType}")
-        if product.status:
-            parts.append(f"Status: {product.status}")
         
         return " | ".join(parts)
 
 knowledge_manager = KnowledgeManager()
+# Looked up on each scrape, since reload_indexes replaces the indexes
+stats_collector.register("lexical_index", lambda: knowledge_manager.lexical_index.stats())
+if settings.VECTOR_INDEX_BACKEND == "memory":
+    stats_collector.register("memory_index", lambda: knowledge_manager.memory_index.stats() if knowledge_manager.memory_index is not None else {})
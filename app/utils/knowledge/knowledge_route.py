@@ -1,59 +1,211 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
+from pydantic import ValidationError
+import json
+from app.core.config import settings
+from app.utils.product_api import product_api
+from app.utils.stock_cache import stock_cache
+from .catalog_sync import catalog_sync
 from .knowledge import ProductKnowledge, knowledge_manager
+from .filters import in_stock as product_in_stock, parse_filters
 
 router = APIRouter(prefix="/api/knowledge", tags=["Knowledge Management"])
 
-@router.post("/products")
+def require_writer():
+    """Reject knowledge writes on query-only replicas"""
+    if not settings.KNOWLEDGE_WRITER:
+        raise HTTPException(
+            status_code=403,
+            detail="This instance is read-only (KNOWLEDGE_WRITER=false); send knowledge writes to the writer"
+        )
+
+@router.post("/products", dependencies=[Depends(require_writer)])
 async def add_product(product: ProductKnowledge):
     """Add a new product to the knowledge base"""
     try:
-        result = knowledge_manager.add_product(product)
+        result = await knowledge_manager.add_product_async(product)
         if result["success"]:
+            await catalog_sync.bump()
             return result
         else:
             raise HTTPException(status_code=400, detail=result.get("error"))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/products/batch", dependencies=[Depends(require_writer)])
+async def add_products_batch(products: List[ProductKnowledge], force: bool = False):
+    """Add or update many products in one call, with a per-item report.
+
+    Unchanged products are skipped; pass force=true to re-embed everything.
+    """
+    try:
+        report = await knowledge_manager.add_products_batch_async(products, force)
+        await catalog_sync.bump()
+        return report
+    except Exception as e:
+        # Earlier chunks may already be written; other workers must still reload
+        await catalog_sync.bump()
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _iter_ndjson_lines(request: Request):
+    """Yield (line_number, raw_line) from a streamed request body"""
+    buffer = b""
+    line_number = 0
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for raw in lines:
+            line_number += 1
+            yield line_number, raw
+    if buffer:
+        yield line_number + 1, buffer
+
+@router.post("/products/batch/ndjson", dependencies=[Depends(require_writer)])
+async def add_products_ndjson(request: Request, force: bool = False):
+    """Add or update products from an NDJSON body (one product per line), streamed in chunks"""
+    try:
+        items = []
+        batch: List[ProductKnowledge] = []
+        batch_lines: List[int] = []
+
+        async def flush():
+            report = await knowledge_manager.add_products_batch_async(batch, force)
+            for item in report["items"]:
+                item["line"] = batch_lines[item.pop("index")]
+                items.append(item)
+            batch.clear()
+            batch_lines.clear()
+
+        async for line_number, raw in _iter_ndjson_lines(request):
+            if not raw.strip():
+                continue
+            try:
+                batch.append(ProductKnowledge(**json.loads(raw)))
+                batch_lines.append(line_number)
+            except (json.JSONDecodeError, ValidationError, TypeError) as e:
+                items.append({"line": line_number, "product_id": None, "success": False, "error": str(e)})
+                continue
+            if len(batch) >= settings.KNOWLEDGE_UPSERT_CHUNK_SIZE:
+                await flush()
+        if batch:
+            await flush()
+        await catalog_sync.bump()
+
+        items.sort(key=lambda item: item["line"])
+        succeeded = sum(1 for item in items if item["success"])
+        return {
+            "success": succeeded == len(items),
+            "total": len(items),
+            "succeeded": succeeded,
+            "failed": len(items) - succeeded,
+            "items": items
+        }
     except Exception as e:
+        # Chunks flushed before the failure are already written
+        await catalog_sync.bump()
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/products/search")
-async def search_products(query: str, limit: int = 5):
-    """Search for products in the knowledge base"""
+async def search_products(
+    query: str,
+    limit: int = 5,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    brand: Optional[List[str]] = Query(None),
+    type: Optional[List[str]] = Query(None),
+    in_stock: Optional[bool] = None
+):
+    """Search for products in the knowledge base.
+
+    brand and type can be repeated to match any of several values
+    (brand=a&brand=b); prices compare against the price after offer.
+    in_stock checks live stock.
+    """
     try:
-        products = knowledge_manager.search_products(query, n_results=limit)
-        return {"products": products}
+        filters = parse_filters({
+            "min_price": min_price,
+            "max_price": max_price,
+            "brand": brand,
+            "type": type,
+            "in_stock": in_stock
+        })
+        n_results = limit * settings.SEARCH_OVERFETCH_FACTOR if filters is not None and filters.in_stock else limit
+        products = await knowledge_manager.search_products_async(query, n_results=n_results, filters=filters)
+        if filters is not None and filters.in_stock and products:
+            stock = await stock_cache.get_many([product["id"] for product in products], product_api.fetch_stock)
+            for product in products:
+                product["data"]["totalStock"] = stock.get(product["id"], {}).get("totalStock")
+            products = [product for product in products if product_in_stock(product)]
+        return {"products": products[:limit]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/products")
-async def get_all_products(limit: int = 100):
-    """Get all products from the knowledge base"""
+async def get_all_products(
+    limit: int = 100,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    include_documents: bool = False,
+    include_embeddings: bool = False
+):
+    """Get a page of products; pass next_cursor back as cursor for the next page"""
+    if limit < 1 or limit > settings.KNOWLEDGE_PAGE_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {settings.KNOWLEDGE_PAGE_MAX_LIMIT}")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="offset must not be negative")
     try:
-        products = knowledge_manager.get_all_products(limit=limit)
-        return {"products": products}
+        return await knowledge_manager.get_products_page(limit, cursor, offset, include_documents, include_embeddings)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.put("/products/{product_id}")
+@router.get("/products/export")
+async def export_products(include_documents: bool = False, include_embeddings: bool = False):
+    """Stream the whole catalog as NDJSON (one product per line), read in chunks"""
+    async def lines():
+        try:
+            async for chunk in knowledge_manager.iter_products(
+                settings.KNOWLEDGE_EXPORT_CHUNK_SIZE, include_documents, include_embeddings
+            ):
+                yield "".join(json.dumps(product, default=str) + "\n" for product in chunk)
+        except Exception as e:
+            # Headers are already sent; a final error line tells the reader the dump is incomplete
+            print(f"Error exporting products: {e}")
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.put("/products/{product_id}", dependencies=[Depends(require_writer)])
 async def update_product(product_id: str, product: ProductKnowledge):
     """Update an existing product"""
     try:
-        result = knowledge_manager.update_product(product_id, product)
+        result = await knowledge_manager.update_product_async(product_id, product)
         if result["success"]:
+            await catalog_sync.bump()
             return result
         else:
-            raise HTTPException(status_code=400, detail=result.get("error"))
+            status_code = 404 if result.get("not_found") else 400
+            raise HTTPException(status_code=status_code, detail=result.get("error"))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.delete("/products/{product_id}")
+@router.delete("/products/{product_id}", dependencies=[Depends(require_writer)])
 async def delete_product(product_id: str):
     """Delete a product from the knowledge base"""
     try:
-        result = knowledge_manager.delete_product(product_id)
+        result = await knowledge_manager.delete_product_async(product_id)
         if result["success"]:
+            await catalog_sync.bump()
             return result
         else:
             raise HTTPException(status_code=400, detail=result.get("error"))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -14,4 +14,12 @@ class ProductKnowledge(BaseModel):
     condition: Optional[str] = None
     warrantyType: Optional[str] = None
     description: Optional[str] = None
-    offer: Optional[int] = None
\ No newline at end of file
+    offer: Optional[int] = None
+class ProductFilters(BaseModel):
+    """Structured search constraints, pushed down to the vector store where possible"""
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    brand: Optional[Union[List[str], str]] = None
+    type: Optional[Union[List[str], str]] = None
+    # Needs live stock, so it is applied after the stock lookup
+    in_stock: Optional[bool] = None
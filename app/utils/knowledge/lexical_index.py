@@ -0,0 +1,136 @@
+# app/utils/knowledge/lexical_index.py
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Words, plus codes whose parts are joined by - . / (e.g. "SM-A546", "MX3.1")
+_TOKEN_RE = re.compile(r"\w+(?:[-./]\w+)*")
+# A query term with both letters and digits, at least 4 characters once joined
+_SKU_TERM_RE = re.compile(r"(?=\w*\d)(?=\w*[^\W\d_])\w{4,}")
+
+def tokenize(text: str) -> List[str]:
+    """Casefolded terms; compound codes also index their joined form.
+
+    "SM-A546B" yields "sm", "a546b" and "sma546b", so a query for the
+    model number matches with or without the hyphen.
+    """
+    terms = []
+    for match in _TOKEN_RE.finditer(text.casefold()):
+        parts = [part for part in re.split(r"[-./_]", match.group()) if part]
+        terms.extend(parts)
+        if len(parts) > 1:
+            terms.append("".join(parts))
+    return terms
+
+def looks_like_sku(query: str) -> bool:
+    """True for short queries made of a model number or SKU, like "SM-A546" or "rtx4090" """
+    words = query.split()
+    if not words or len(words) > 2:
+        return False
+    return any(_SKU_TERM_RE.fullmatch(re.sub(r"[-./_]", "", word.casefold())) for word in words)
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists: score(id) = sum over lists of 1 / (k + rank)"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+class LexicalIndex:
+    """In-process BM25 inverted index over product searchable text.
+
+    Writes replace a document's postings, so add() doubles as update.
+    Guarded by a lock because Chroma work (and with it index upkeep)
+    runs on the vector DB thread pool.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_terms: Dict[str, Counter] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def add(self, doc_id: str, text: str):
+        """Index (or re-index) one document"""
+        terms = Counter(tokenize(text))
+        with self._lock:
+            self._remove(doc_id)
+            for term, count in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = count
+            self._doc_terms[doc_id] = terms
+            length = sum(terms.values())
+            self._doc_lengths[doc_id] = length
+            self._total_length += length
+
+    def add_many(self, documents: Iterable[Tuple[str, str]]):
+        for doc_id, text in documents:
+            self.add(doc_id, text)
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id: str):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(doc_id, 0)
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._doc_lengths.clear()
+            self._total_length = 0
+
+    def _expand(self, terms: Iterable[str]) -> set:
+        """Let model-number terms also match longer codes ("a546" finds "a546b")"""
+        expanded = set(terms)
+        prefixes = [term for term in expanded if _SKU_TERM_RE.fullmatch(term)]
+        if prefixes:
+            for vocabulary_term in self._postings:
+                if vocabulary_term.startswith(tuple(prefixes)):
+                    expanded.add(vocabulary_term)
+        return expanded
+
+    def search(self, query: str, n_results: int = 10) -> List[Tuple[str, float]]:
+        """Top documents by BM25 score, best first"""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            doc_count = len(self._doc_lengths)
+            if not doc_count:
+                return []
+            terms = self._expand(terms)
+            avg_length = self._total_length / doc_count
+            scores: Dict[str, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "entries": len(self._doc_lengths)
+        }
@@ -0,0 +1,271 @@
+# app/utils/knowledge/memory_index.py
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import numpy as np
+from .filters import BRAND_KEY, EFFECTIVE_PRICE_KEY, TYPE_KEY, filter_values
+from .knowledge_schema import ProductFilters
+
+QUANTIZATIONS = ("float32", "int8", "binary")
+# Set bits per byte value, for Hamming distances over packed binary codes
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+# Quantized rows are widened to float in blocks of this many, bounding the temporary
+_SCORE_BLOCK_ROWS = 8192
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+class MemoryVectorIndex:
+    """In-process mirror of the product collection for top-k cosine search.
+
+    Embeddings are L2-normalized rows of one contiguous matrix, so a query
+    is a single matrix-vector product plus argpartition. Metadata is kept
+    next to it, with the filterable fields (effective price, brand and type
+    keys) also held as arrays so filters become vectorized masks. Chroma
+    stays the source of truth; KnowledgeManager mirrors every write.
+
+    Rows are float32, int8 (one scale per row, 4x smaller) or binary sign
+    bits (32x smaller, scored by Hamming distance). Quantized searches take
+    rescore_factor times more candidates and, when fetch_vectors is given,
+    re-rank them by exact cosine on the float vectors it returns by id.
+    """
+
+    def __init__(
+        self,
+        quantization: str = "float32",
+        rescore_factor: int = 4,
+        fetch_vectors: Optional[Callable[[List[str]], Dict[str, Sequence[float]]]] = None,
+        initial_capacity: int = 1024
+    ):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization '{quantization}' (expected one of: {', '.join(QUANTIZATIONS)})")
+        self.quantization = quantization
+        self.rescore_factor = max(1, rescore_factor)
+        self.fetch_vectors = fetch_vectors
+        self._lock = threading.RLock()
+        self._capacity = initial_capacity
+        self._dimensions: Optional[int] = None
+        self._matrix: Optional[np.ndarray] = None
+        self._scales = np.ones(initial_capacity, dtype=np.float32)
+        self._ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._metadatas: List[Dict[str, Any]] = []
+        self._prices = np.full(initial_capacity, np.nan)
+        self._brands = np.empty(initial_capacity, dtype=object)
+        self._types = np.empty(initial_capacity, dtype=object)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def dimensions(self) -> Optional[int]:
+        return self._dimensions
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the vector rows in use (metadata not included)"""
+        if self._matrix is None:
+            return 0
+        count = len(self._ids)
+        scales = self._scales[:count].nbytes if self.quantization == "int8" else 0
+        return self._matrix[:count].nbytes + scales
+
+    def load(self, collection, page_size: int = 1000):
+        """Fill the index from every stored embedding and metadata in the collection"""
+        offset = 0
+        while True:
+            results = collection.get(limit=page_size, offset=offset, include=["embeddings", "metadatas"])
+            ids = results["ids"]
+            if not len(ids):
+                break
+            self.upsert(ids, results["embeddings"], results["metadatas"])
+            if len(ids) < page_size:
+                break
+            offset += len(ids)
+
+    def _encode(self, vectors: np.ndarray):
+        """Storage rows and per-row scales for normalized float vectors"""
+        if self.quantization == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127
+            scales = np.where(scales == 0, 1, scales).astype(np.float32)
+            return np.round(vectors / scales[:, None]).astype(np.int8), scales
+        if self.quantization == "binary":
+            return np.packbits(vectors > 0, axis=1), None
+        return vectors, None
+
+    def _ensure_capacity(self, size: int, width: int, dtype):
+        if self._matrix is None:
+            self._matrix = np.zeros((max(self._capacity, size), width), dtype=dtype)
+            self._capacity = self._matrix.shape[0]
+            self._scales = np.ones(self._capacity, dtype=np.float32)
+            self._prices = np.full(self._capacity, np.nan)
+            self._brands = np.empty(self._capacity, dtype=object)
+            self._types = np.empty(self._capacity, dtype=object)
+            return
+        if size <= self._capacity:
+            return
+        capacity = max(size, self._capacity * 2)
+        matrix = np.zeros((capacity, self._matrix.shape[1]), dtype=self._matrix.dtype)
+        matrix[:len(self._ids)] = self._matrix[:len(self._ids)]
+        self._matrix = matrix
+        self._scales = np.concatenate([self._scales, np.ones(capacity - self._capacity, dtype=np.float32)])
+        self._prices = np.concatenate([self._prices, np.full(capacity - self._capacity, np.nan)])
+        self._brands = np.concatenate([self._brands, np.empty(capacity - self._capacity, dtype=object)])
+        self._types = np.concatenate([self._types, np.empty(capacity - self._capacity, dtype=object)])
+        self._capacity = capacity
+
+    def _set_metadata(self, position: int, metadata: Optional[Dict[str, Any]]):
+        # Own copy: callers add live fields (totalStock) to the dicts they hold
+        metadata = dict(metadata or {})
+        self._metadatas[position] = metadata
+        price = metadata.get(EFFECTIVE_PRICE_KEY)
+        self._prices[position] = price if isinstance(price, (int, float)) else np.nan
+        self._brands[position] = metadata.get(BRAND_KEY)
+        self._types[position] = metadata.get(TYPE_KEY)
+
+    def upsert(self, ids: Sequence[str], embeddings: Sequence[Sequence[float]], metadatas: Sequence[Optional[Dict[str, Any]]]):
+        """Insert or replace vectors and metadata"""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or not len(ids):
+            return
+        rows, scales = self._encode(normalize_rows(vectors))
+
+        with self._lock:
+            if self._dimensions is not None and vectors.shape[1] != self._dimensions:
+                raise ValueError(f"Embedding has {vectors.shape[1]} dimensions, index has {self._dimensions}")
+            self._dimensions = vectors.shape[1]
+            new_ids = [product_id for product_id in ids if product_id not in self._positions]
+            self._ensure_capacity(len(self._ids) + len(new_ids), rows.shape[1], rows.dtype)
+            for i, (product_id, row, metadata) in enumerate(zip(ids, rows, metadatas)):
+                position = self._positions.get(product_id)
+                if position is None:
+                    position = len(self._ids)
+                    self._positions[product_id] = position
+                    self._ids.append(product_id)
+                    self._metadatas.append({})
+                self._matrix[position] = row
+                if scales is not None:
+                    self._scales[position] = scales[i]
+                self._set_metadata(position, metadata)
+
+    def update_metadata(self, ids: Sequence[str], metadatas: Sequence[Optional[Dict[str, Any]]]):
+        """Replace metadata of products already in the index"""
+        with self._lock:
+            for product_id, metadata in zip(ids, metadatas):
+                position = self._positions.get(product_id)
+                if position is not None:
+                    self._set_metadata(position, metadata)
+
+    def remove(self, ids: Sequence[str]):
+        """Delete products by moving the last row into each freed slot"""
+        with self._lock:
+            for product_id in ids:
+                position = self._positions.pop(product_id, None)
+                if position is None:
+                    continue
+                last = len(self._ids) - 1
+                if position != last:
+                    moved_id = self._ids[last]
+                    self._ids[position] = moved_id
+                    self._positions[moved_id] = position
+                    self._matrix[position] = self._matrix[last]
+                    self._scales[position] = self._scales[last]
+                    self._metadatas[position] = self._metadatas[last]
+                    self._prices[position] = self._prices[last]
+                    self._brands[position] = self._brands[last]
+                    self._types[position] = self._types[last]
+                self._ids.pop()
+                self._metadatas.pop()
+                self._prices[last] = np.nan
+                self._brands[last] = None
+                self._types[last] = None
+
+    def _filter_mask(self, filters: ProductFilters, count: int) -> Optional[np.ndarray]:
+        """Vectorized equivalent of filters.matches over the first count rows"""
+        mask = None
+        prices = self._prices[:count]
+        if filters.min_price is not None:
+            mask = prices >= filters.min_price
+        if filters.max_price is not None:
+            upper = prices <= filters.max_price
+            mask = upper if mask is None else mask & upper
+        for column, values in ((self._brands, filter_values(filters.brand)), (self._types, filter_values(filters.type))):
+            if values:
+                allowed = np.isin(column[:count], values)
+                mask = allowed if mask is None else mask & allowed
+        return mask
+
+    def _scores(self, query: np.ndarray, count: int) -> np.ndarray:
+        """Cosine similarity (approximate when quantized) of the first count rows"""
+        if self.quantization == "float32":
+            return self._matrix[:count] @ query
+        scores = np.empty(count, dtype=np.float32)
+        if self.quantization == "binary":
+            bits = np.packbits(query > 0)
+            for start in range(0, count, _SCORE_BLOCK_ROWS):
+                block = self._matrix[start:start + _SCORE_BLOCK_ROWS]
+                distance = _POPCOUNT[np.bitwise_xor(block[:count - start], bits)].sum(axis=1)
+                scores[start:start + len(distance)] = 1 - 2 * distance / self._dimensions
+            return scores
+        for start in range(0, count, _SCORE_BLOCK_ROWS):
+            end = min(start + _SCORE_BLOCK_ROWS, count)
+            scores[start:end] = (self._matrix[start:end].astype(np.float32) @ query) * self._scales[start:end]
+        return scores
+
+    def _rescore(self, query: np.ndarray, candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Replace approximate scores with exact cosine on the stored float vectors"""
+        vectors = self.fetch_vectors([candidate["id"] for candidate in candidates])
+        rescored = []
+        for candidate in candidates:
+            vector = vectors.get(candidate["id"])
+            if vector is None:
+                # Gone from the store since the index last saw it
+                continue
+            vector = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            candidate["relevance_score"] = float(vector @ query / norm) if norm else 0.0
+            rescored.append(candidate)
+        rescored.sort(key=lambda candidate: candidate["relevance_score"], reverse=True)
+        return rescored
+
+    def search(self, query_embedding: Sequence[float], n_results: int = 5, filters: Optional[ProductFilters] = None) -> List[Dict[str, Any]]:
+        """Top products by cosine similarity, in the shape search_products returns"""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        query = query / norm
+        rescore = self.quantization != "float32" and self.fetch_vectors is not None
+
+        with self._lock:
+            count = len(self._ids)
+            if not count or n_results <= 0:
+                return []
+            if query.shape[0] != self._dimensions:
+                raise ValueError(f"Query has {query.shape[0]} dimensions, index has {self._dimensions}")
+            scores = self._scores(query, count)
+            if filters is not None:
+                mask = self._filter_mask(filters, count)
+                if mask is not None:
+                    scores = np.where(mask, scores, -np.inf)
+            k = min(n_results * self.rescore_factor if rescore else n_results, count)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            candidates = [
+                {
+                    "id": self._ids[position],
+                    "data": dict(self._metadatas[position]),
+                    "relevance_score": float(scores[position])
+                }
+                for position in top
+                if np.isfinite(scores[position])
+            ]
+
+        if rescore and candidates:
+            candidates = self._rescore(query, candidates)
+        return candidates[:n_results]
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "entries": len(self._ids)
+        }
@@ -0,0 +1,249 @@
+# app/utils/product_api.py
+import asyncio
+import random
+import time
+import aiohttp
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+from app.core.clients import clients
+from app.core.config import settings
+from app.core.metrics import UPSTREAM_ERRORS
+from app.core.tracing import tracer
+from app.utils.stock_cache import stock_cache
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    After failure_threshold failures in a row the circuit opens and calls
+    fail fast for reset_timeout seconds; then one trial call is let
+    through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_started_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open":
+            now = time.monotonic()
+            # A trial that never reported back (e.g. cancelled) must not wedge the circuit
+            if self.trial_started_at is None or now - self.trial_started_at >= self.reset_timeout:
+                self.trial_started_at = now
+                return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_started_at = None
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+class ProductAPIError(Exception):
+    def __init__(self, message: str, retryable: bool = False, upstream_failure: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+        # Whether the error says the service itself is unhealthy (trips the breaker)
+        self.upstream_failure = upstream_failure
+
+class ProductAPIClient:
+    """Client for the external product API used for live stock.
+
+    Uses a batch endpoint when PRODUCT_API_BATCH_URL is configured and
+    falls back to individual requests otherwise (or when a batch call
+    fails). Requests share the registry's keep-alive session, are bounded
+    per host, retried with jittered backoff on transient errors, and
+    guarded by a circuit breaker so a degraded inventory service fails
+    fast instead of tying up chat workers.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        batch_url: Optional[str] = None,
+        batch_size: int = 50,
+        max_concurrency: int = 10,
+        timeout_seconds: float = 5.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.1,
+        backoff_max: float = 1.0,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.batch_url = batch_url
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.timeout = aiohttp.ClientTimeout(total=timeout_seconds)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker(failure_threshold=5, reset_timeout=30.0)
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        semaphore = self._host_limits.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._host_limits[host] = semaphore
+        return semaphore
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter keeps retries from many workers from lining up
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def _get_json(self, session: aiohttp.ClientSession, url: str, params: Optional[Dict[str, str]] = None) -> Any:
+        """GET with bounded per-host concurrency, retries and circuit breaking"""
+        if not self.breaker.allow():
+            UPSTREAM_ERRORS.labels(upstream="product_api_circuit_open").inc()
+            raise ProductAPIError("Product API circuit open")
+
+        attempt = 0
+        while True:
+            try:
+                async with self._host_limit(url):
+                    # Propagate the trace to the product API
+                    async with session.get(url, params=params, headers=tracer.inject_headers(), timeout=self.timeout) as response:
+                        if response.status == 200:
+                            data = await response.json()
+                            self.breaker.record_success()
+                            return data
+                        transient = response.status == 429 or response.status >= 500
+                        error = ProductAPIError(
+                            f"API returned status {response.status}",
+                            retryable=transient,
+                            upstream_failure=transient
+                        )
+            except asyncio.TimeoutError:
+                # A timeout already cost the full budget; retrying would only
+                # make the chat reply slower
+                error = ProductAPIError("Request timeout", upstream_failure=True)
+            except aiohttp.ClientError as e:
+                error = ProductAPIError(str(e), retryable=True, upstream_failure=True)
+
+            if error.retryable and attempt < self.max_retries:
+                await asyncio.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+
+            if error.upstream_failure:
+                UPSTREAM_ERRORS.labels(upstream="product_api").inc()
+                self.breaker.record_failure()
+            else:
+                # 4xx means the service answered; it is healthy
+                self.breaker.record_success()
+            raise error
+
+    async def fetch_single_product_stock(self, session: aiohttp.ClientSession, product_id: str) -> Dict[str, Any]:
+        """Fetch stock information for a single product"""
+        started = time.perf_counter()
+        try:
+            with tracer.span("product_api.fetch_single_product_stock", product_id=product_id):
+                data = await self._get_json(session, f"{self.base_url}/{product_id}")
+            return {
+                "id": product_id,
+                "totalStock": data.get("totalStock", 0),
+                "data": data
+            }
+        except Exception as e:
+            return {
+                "id": product_id,
+                "totalStock": None,
+                "error": str(e)
+            }
+        finally:
+            stock_cache.record_latency(time.perf_counter() - started)
+
+    async def _fetch_batch(self, session: aiohttp.ClientSession, product_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        started = time.perf_counter()
+        try:
+            with tracer.span("product_api.fetch_stock_batch", products=len(product_ids)):
+                data = await self._get_json(session, self.batch_url, params={"ids": ",".join(product_ids)})
+        finally:
+            stock_cache.record_latency(time.perf_counter() - started, mode="batch")
+
+        if isinstance(data, dict):
+            data = data.get("data") or data.get("products") or []
+
+        results = {}
+        for item in data:
+            if not isinstance(item, dict):
+                continue
+            product_id = item.get("id") or item.get("_id") or item.get("productId")
+            if product_id in product_ids:
+                results[product_id] = {
+                    "id": product_id,
+                    "totalStock": item.get("totalStock", 0),
+                    "data": item
+                }
+        for product_id in product_ids:
+            results.setdefault(product_id, {"id": product_id, "totalStock": None, "error": "Not returned by batch endpoint"})
+        return results
+
+    async def fetch_stock(self, product_ids: List[str], session: Optional[aiohttp.ClientSession] = None) -> Dict[str, Dict[str, Any]]:
+        """Stock for many products, via the batch endpoint when available"""
+        session = session or clients.get_http()
+        product_ids = list(dict.fromkeys(product_ids))
+
+        if self.batch_url:
+            chunks = [product_ids[i:i + self.batch_size] for i in range(0, len(product_ids), self.batch_size)]
+            batch_results = await asyncio.gather(
+                *(self._fetch_batch(session, chunk) for chunk in chunks),
+                return_exceptions=True
+            )
+            results: Dict[str, Dict[str, Any]] = {}
+            fallback: List[str] = []
+            for chunk, outcome in zip(chunks, batch_results):
+                if isinstance(outcome, Exception):
+                    print(f"Batch stock lookup failed, falling back to single requests: {outcome}")
+                    fallback.extend(chunk)
+                else:
+                    results.update(outcome)
+            if fallback and self.breaker.state == "closed":
+                results.update(await self._fetch_individually(session, fallback))
+            for product_id in fallback:
+                results.setdefault(product_id, {"id": product_id, "totalStock": None, "error": "Product API unavailable"})
+            return results
+
+        return await self._fetch_individually(session, product_ids)
+
+    async def _fetch_individually(self, session: aiohttp.ClientSession, product_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        stock_results = await asyncio.gather(*(
+            self.fetch_single_product_stock(session, product_id)
+            for product_id in product_ids
+        ))
+        return {result['id']: result for result in stock_results}
+
+# Shared client so the circuit breaker and host limits are process-wide
+product_api = ProductAPIClient(
+    base_url=settings.PRODUCT_API_BASE_URL,
+    batch_url=settings.PRODUCT_API_BATCH_URL,
+    batch_size=settings.PRODUCT_API_BATCH_SIZE,
+    max_concurrency=settings.PRODUCT_API_MAX_CONCURRENCY,
+    timeout_seconds=settings.PRODUCT_API_TIMEOUT_SECONDS,
+    max_retries=settings.PRODUCT_API_MAX_RETRIES,
+    backoff_base=settings.PRODUCT_API_BACKOFF_BASE_SECONDS,
+    backoff_max=settings.PRODUCT_API_BACKOFF_MAX_SECONDS,
+    breaker=CircuitBreaker(
+        failure_threshold=settings.PRODUCT_API_BREAKER_FAILURES,
+        reset_timeout=settings.PRODUCT_API_BREAKER_RESET_SECONDS
+    )
+)
@@ -0,0 +1,330 @@
+# app/utils/semantic_cache.py
+import base64
+import hashlib
+import json
+import re
+import time
+import numpy as np
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from app.core.config import settings
+from app.core.metrics import stats_collector
+from app.services.chat.chatbot_schema import HistoryItem
+from app.utils.cache_manager import cache_manager
+
+_PUNCTUATION_EDGES = re.compile(r"^[\s¡¿!?.,;:]+|[\s¡¿!?.,;:]+$")
+
+@dataclass
+class CacheLookup:
+    """Result of a cache probe; carries what store() needs so nothing is recomputed"""
+    key: str
+    fingerprint: str
+    normalized: str
+    value: Optional[Dict[str, Any]] = None
+    vector: Optional[np.ndarray] = None
+    source: str = "miss"
+    # Semantic-eligible miss that skipped the embedding because nothing could match it
+    needs_vector: bool = False
+
+class SemanticCache:
+    """Two-tier (in-process L1 + Redis) cache for LLM JSON results.
+
+    Lookups try an exact match on the normalized message and history
+    fingerprint first. Short messages then fall back to embedding
+    similarity against entries recorded for the same history fingerprint;
+    when there are none, the embedding is skipped and the caller can
+    compute it alongside the LLM call (embed_lookup) before store().
+    Only results flagged as semantic-safe are eligible for the similarity
+    tier, since near-duplicate product queries can need different answers.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        ttl_seconds: int,
+        max_entries: int,
+        similarity_threshold: float,
+        max_candidates: int,
+        semantic_max_chars: int,
+        enabled: bool = True,
+        semantic_enabled: bool = True
+    ):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.max_candidates = max_candidates
+        self.semantic_max_chars = semantic_max_chars
+        self.enabled = enabled
+        self.semantic_enabled = semantic_enabled
+
+        # key -> {"expires_at", "fingerprint", "vector", "value"}
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._by_fingerprint: Dict[str, Set[str]] = {}
+
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.misses = 0
+
+    def normalize(self, message: str) -> str:
+        """Casefold, collapse whitespace and drop surrounding punctuation"""
+        text = " ".join(message.casefold().split())
+        return _PUNCTUATION_EDGES.sub("", text)
+
+    def fingerprint(self, history: Optional[List[HistoryItem]], summary: Optional[str] = None, turns: int = 8) -> str:
+        """Stable hash of the history turns (and summary) that reach the prompt"""
+        if not history and not summary:
+            return "none"
+        recent_history = history[-turns:] if history else []
+        digest = hashlib.sha256()
+        if summary:
+            digest.update(summary.encode("utf-8"))
+            digest.update(b"\x02")
+        for h in recent_history:
+            digest.update(h.message.encode("utf-8"))
+            digest.update(b"\x00")
+            digest.update(h.response.encode("utf-8"))
+            digest.update(b"\x01")
+        return digest.hexdigest()[:32]
+
+    def _make_key(self, normalized: str, fingerprint: str) -> str:
+        return hashlib.sha256(f"{fingerprint}\x00{normalized}".encode("utf-8")).hexdigest()[:32]
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.namespace}_cache:{key}"
+
+    def _redis_candidates_key(self, fingerprint: str) -> str:
+        return f"{self.namespace}_cache:fp:{fingerprint}"
+
+    # L1 helpers
+
+    def _l1_get(self, key: str, touch: bool = True) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry["expires_at"] < time.monotonic():
+            self._l1_remove(key)
+            return None
+        if touch:
+            self._entries.move_to_end(key)
+        return entry
+
+    def _l1_set(self, key: str, fingerprint: str, value: Dict[str, Any], vector: Optional[np.ndarray]):
+        if key in self._entries:
+            self._l1_remove(key)
+        self._entries[key] = {
+            "expires_at": time.monotonic() + self.ttl_seconds,
+            "fingerprint": fingerprint,
+            "vector": vector,
+            "value": value
+        }
+        self._by_fingerprint.setdefault(fingerprint, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest_key = next(iter(self._entries))
+            self._l1_remove(oldest_key)
+
+    def _l1_remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._by_fingerprint.get(entry["fingerprint"])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_fingerprint[entry["fingerprint"]]
+
+    # Vector helpers
+
+    @staticmethod
+    def _encode_vector(vector: np.ndarray) -> str:
+        return base64.b64encode(vector.astype(np.float32).tobytes()).decode("ascii")
+
+    @staticmethod
+    def _decode_vector(data: str) -> np.ndarray:
+        return np.frombuffer(base64.b64decode(data), dtype=np.float32)
+
+    def _best_match(self, vector: np.ndarray, candidates: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        candidates = [c for c in candidates if c.get("vector") is not None and len(c["vector"]) == len(vector)]
+        if not candidates:
+            return None
+        matrix = np.stack([c["vector"] for c in candidates])
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] >= self.similarity_threshold:
+            return candidates[best]
+        return None
+
+    @staticmethod
+    def _unit_vector(embedding: Optional[List[float]]) -> Optional[np.ndarray]:
+        if embedding is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def _l1_candidates(self, fingerprint: str) -> List[Dict[str, Any]]:
+        candidates = []
+        for key in list(self._by_fingerprint.get(fingerprint, ())):
+            candidate = self._l1_get(key, touch=False)
+            if candidate is not None and candidate["vector"] is not None:
+                candidates.append(dict(candidate, key=key))
+        return candidates
+
+    async def _redis_candidates(self, redis_client, fingerprint: str) -> List[Dict[str, Any]]:
+        if redis_client is None:
+            return []
+        try:
+            raw_candidates = await redis_client.lrange(
+                self._redis_candidates_key(fingerprint), 0, self.max_candidates - 1
+            )
+            candidates = []
+            for raw in raw_candidates:
+                item = json.loads(raw)
+                item["vector"] = self._decode_vector(item["vector"])
+                candidates.append(item)
+            return candidates
+        except Exception as e:
+            cache_manager.report_error(e)
+            print(f"Error reading {self.namespace} semantic cache: {e}")
+            return []
+
+    def _semantic_eligible(self, normalized: str) -> bool:
+        return self.semantic_enabled and 0 < len(normalized) <= self.semantic_max_chars
+
+    # Public API
+
+    async def lookup(
+        self,
+        message: str,
+        history: Optional[List[HistoryItem]],
+        embed: Optional[Callable[[str], Awaitable[Optional[List[float]]]]] = None,
+        summary: Optional[str] = None
+    ) -> CacheLookup:
+        """Probe L1, then Redis, for an exact and then a semantic match"""
+        normalized = self.normalize(message)
+        fingerprint = self.fingerprint(history, summary)
+        lookup = CacheLookup(
+            key=self._make_key(normalized, fingerprint),
+            fingerprint=fingerprint,
+            normalized=normalized
+        )
+        if not self.enabled:
+            return lookup
+
+        # Exact tier
+        entry = self._l1_get(lookup.key)
+        if entry is not None:
+            return self._hit(lookup, entry["value"], "exact")
+
+        redis_client = cache_manager.client()
+        if redis_client is not None:
+            try:
+                cached = await redis_client.get(self._redis_key(lookup.key))
+                if cached:
+                    value = json.loads(cached)
+                    self._l1_set(lookup.key, fingerprint, value, None)
+                    return self._hit(lookup, value, "exact")
+            except Exception as e:
+                cache_manager.report_error(e)
+                print(f"Error reading {self.namespace} cache: {e}")
+
+        # Semantic tier
+        if embed is not None and self._semantic_eligible(normalized):
+            match = await self._semantic_match(lookup, embed, redis_client)
+            if match is not None:
+                return self._hit(lookup, match["value"], "semantic")
+
+        self.misses += 1
+        return lookup
+
+    async def _semantic_match(self, lookup: CacheLookup, embed, redis_client) -> Optional[Dict[str, Any]]:
+        """Closest entry for the same history, embedding the message only if there are candidates"""
+        l1_candidates = self._l1_candidates(lookup.fingerprint)
+        redis_candidates = None
+        if not l1_candidates:
+            redis_candidates = await self._redis_candidates(redis_client, lookup.fingerprint)
+            if not redis_candidates:
+                # Mid-conversation the fingerprint is new every turn, so this is the common case
+                lookup.needs_vector = True
+                return None
+
+        lookup.vector = self._unit_vector(await embed(lookup.normalized))
+        if lookup.vector is None:
+            return None
+        match = self._best_match(lookup.vector, l1_candidates)
+        if match is not None:
+            self._entries.move_to_end(match["key"])
+            return match
+
+        if redis_candidates is None:
+            redis_candidates = await self._redis_candidates(redis_client, lookup.fingerprint)
+        match = self._best_match(lookup.vector, redis_candidates)
+        if match is not None:
+            self._l1_set(match["key"], lookup.fingerprint, match["value"], match["vector"])
+        return match
+
+    def _hit(self, lookup: CacheLookup, value: Dict[str, Any], source: str) -> CacheLookup:
+        if source == "exact":
+            self.hits_exact += 1
+        else:
+            self.hits_semantic += 1
+        lookup.value = dict(value)
+        lookup.source = source
+        return lookup
+
+    async def embed_lookup(self, lookup: CacheLookup, embed: Callable[[str], Awaitable[Optional[List[float]]]]):
+        """Embed a miss that skipped it, so the stored result can seed the similarity tier"""
+        lookup.vector = self._unit_vector(await embed(lookup.normalized))
+
+    async def store(self, lookup: CacheLookup, value: Dict[str, Any], semantic: bool = True):
+        """Record a fresh result in both tiers"""
+        if not self.enabled:
+            return
+
+        vector = lookup.vector if semantic else None
+        self._l1_set(lookup.key, lookup.fingerprint, value, vector)
+
+        redis_client = cache_manager.client()
+        if redis_client is None:
+            return
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.setex(self._redis_key(lookup.key), self.ttl_seconds, json.dumps(value))
+                if vector is not None:
+                    candidates_key = self._redis_candidates_key(lookup.fingerprint)
+                    pipe.lpush(candidates_key, json.dumps({
+                        "key": lookup.key,
+                        "vector": self._encode_vector(vector),
+                        "value": value
+                    }))
+                    pipe.ltrim(candidates_key, 0, self.max_candidates - 1)
+                    pipe.expire(candidates_key, self.ttl_seconds)
+                await pipe.execute()
+        except Exception as e:
+            cache_manager.report_error(e)
+            print(f"Error writing {self.namespace} cache: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.hits_exact + self.hits_semantic
+        total = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits_exact": self.hits_exact,
+            "hits_semantic": self.hits_semantic,
+            "misses": self.misses,
+            "hit_ratio": hits / total if total else 0.0
+        }
+
+# Cache in front of Chat.analyze_message
+analysis_cache = SemanticCache(
+    namespace="analysis",
+    ttl_seconds=settings.ANALYSIS_CACHE_TTL_SECONDS,
+    max_entries=settings.ANALYSIS_CACHE_MAX_ENTRIES,
+    similarity_threshold=settings.ANALYSIS_CACHE_SIMILARITY_THRESHOLD,
+    max_candidates=settings.ANALYSIS_CACHE_MAX_CANDIDATES,
+    semantic_max_chars=settings.ANALYSIS_CACHE_SEMANTIC_MAX_CHARS,
+    enabled=settings.ANALYSIS_CACHE_ENABLED,
+    semantic_enabled=settings.ANALYSIS_CACHE_SEMANTIC_ENABLED
+)
+stats_collector.register("analysis_cache", analysis_cache.stats)
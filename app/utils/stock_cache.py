@@ -0,0 +1,217 @@
+# app/utils/stock_cache.py
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Set, Tuple
+from app.core.config import settings
+from app.core.metrics import stats_collector, PRODUCT_API_FETCH_LATENCY
+from app.utils.cache_manager import cache_manager
+
+StockLoader = Callable[[List[str]], Awaitable[Dict[str, Dict[str, Any]]]]
+
+class StockCache:
+    """Short-TTL stock cache (in-process + Redis) with single-flight fetches.
+
+    Fresh entries are served directly. Entries past the TTL but inside the
+    stale window are served immediately while one background fetch
+    revalidates them. Concurrent requests for the same product share a
+    single upstream call. Failed lookups are never cached.
+    """
+
+    def __init__(self, ttl_seconds: float, stale_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = max(stale_seconds, ttl_seconds)
+        self.max_entries = max_entries
+
+        # product_id -> (stock info, fetched_at epoch seconds)
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._background: Set[asyncio.Task] = set()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def _redis_key(self, product_id: str) -> str:
+        return f"stock:{product_id}"
+
+    def _remember(self, product_id: str, value: Dict[str, Any], fetched_at: float):
+        self._entries[product_id] = (value, fetched_at)
+        self._entries.move_to_end(product_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def record_latency(self, seconds: float, mode: str = "single"):
+        """Record how long one upstream stock fetch took (mode "single" or "batch")"""
+        PRODUCT_API_FETCH_LATENCY.labels(mode=mode).observe(seconds)
+
+    async def get_many(self, product_ids: Iterable[str], loader: StockLoader) -> Dict[str, Dict[str, Any]]:
+        """Return stock info for every id, fetching only what is missing or expired"""
+        now = time.time()
+        results: Dict[str, Dict[str, Any]] = {}
+        stale: List[str] = []
+        missing: List[str] = []
+
+        for product_id in dict.fromkeys(product_ids):
+            entry = self._entries.get(product_id)
+            if entry is not None:
+                value, fetched_at = entry
+                age = now - fetched_at
+                if age < self.ttl_seconds:
+                    results[product_id] = value
+                    self.hits += 1
+                    continue
+                if age < self.stale_seconds:
+                    results[product_id] = value
+                    stale.append(product_id)
+                    continue
+            missing.append(product_id)
+
+        # Another worker may already hold a fresher copy
+        if missing or stale:
+            for product_id, (value, fetched_at) in (await self._redis_get_many(missing + stale)).items():
+                age = now - fetched_at
+                entry = self._entries.get(product_id)
+                if age >= self.stale_seconds or (entry is not None and entry[1] >= fetched_at):
+                    continue
+                self._remember(product_id, value, fetched_at)
+                results[product_id] = value
+                if product_id in missing:
+                    missing.remove(product_id)
+                    if age >= self.ttl_seconds:
+                        stale.append(product_id)
+                if age < self.ttl_seconds:
+                    if product_id in stale:
+                        stale.remove(product_id)
+                    self.hits += 1
+
+        if stale:
+            self.stale_hits += len(stale)
+            task = asyncio.create_task(self._fetch(stale, loader))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+        if missing:
+            self.misses += len(missing)
+            results.update(await self._fetch(missing, loader))
+
+        return results
+
+    async def _fetch(self, product_ids: List[str], loader: StockLoader) -> Dict[str, Dict[str, Any]]:
+        """Single-flight fetch: join in-flight lookups, start one loader call for the rest"""
+        loop = asyncio.get_running_loop()
+        futures: Dict[str, asyncio.Future] = {}
+        to_load: List[str] = []
+        for product_id in product_ids:
+            future = self._inflight.get(product_id)
+            if future is None:
+                future = loop.create_future()
+                self._inflight[product_id] = future
+                to_load.append(product_id)
+            futures[product_id] = future
+
+        if to_load:
+            # Run the load as its own task so a cancelled caller can't abort it
+            # for the other requests waiting on the same products
+            task = asyncio.create_task(self._load(to_load, loader))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+        values = await asyncio.gather(*(asyncio.shield(future) for future in futures.values()))
+        return dict(zip(futures.keys(), values))
+
+    async def _load(self, product_ids: List[str], loader: StockLoader):
+        try:
+            await self._load_and_store(product_ids, loader)
+        finally:
+            # Never leave waiters hanging, even if the load was cancelled
+            for product_id in product_ids:
+                future = self._inflight.pop(product_id, None)
+                if future is not None and not future.done():
+                    future.set_result({"id": product_id, "totalStock": None, "error": "Lookup cancelled"})
+
+    async def _load_and_store(self, product_ids: List[str], loader: StockLoader):
+        try:
+            loaded = await loader(product_ids)
+        except Exception as e:
+            loaded = {}
+            print(f"Error loading stock: {e}")
+
+        fetched_at = time.time()
+        fresh: Dict[str, Dict[str, Any]] = {}
+        for product_id in product_ids:
+            value = loaded.get(product_id) or {"id": product_id, "totalStock": None, "error": "No result"}
+            if value.get("totalStock") is not None:
+                value = {"id": product_id, "totalStock": value["totalStock"]}
+                self._remember(product_id, value, fetched_at)
+                fresh[product_id] = value
+            else:
+                # Fall back to the last good value while it is inside the stale window
+                entry = self._entries.get(product_id)
+                if entry is not None and fetched_at - entry[1] < self.stale_seconds:
+                    value = entry[0]
+            future = self._inflight.pop(product_id, None)
+            if future is not None and not future.done():
+                future.set_result(value)
+
+        if fresh:
+            await self._redis_set_many(fresh, fetched_at)
+
+    async def _redis_get_many(self, product_ids: List[str]) -> Dict[str, Tuple[Dict[str, Any], float]]:
+        redis_client = cache_manager.client()
+        if redis_client is None or not product_ids:
+            return {}
+        try:
+            raw_values = await redis_client.mget([self._redis_key(product_id) for product_id in product_ids])
+        except Exception as e:
+            cache_manager.report_error(e)
+            print(f"Error reading stock cache: {e}")
+            return {}
+
+        found = {}
+        for product_id, raw in zip(product_ids, raw_values):
+            if not raw:
+                continue
+            # A corrupt or foreign value is treated as a miss for that product only
+            try:
+                data = json.loads(raw)
+                found[product_id] = ({"id": product_id, "totalStock": data["totalStock"]}, float(data["fetchedAt"]))
+            except (ValueError, TypeError, KeyError) as e:
+                print(f"Ignoring unreadable stock cache entry for {product_id}: {e}")
+        return found
+
+    async def _redis_set_many(self, values: Dict[str, Dict[str, Any]], fetched_at: float):
+        redis_client = cache_manager.client()
+        if redis_client is None:
+            return
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for product_id, value in values.items():
+                    pipe.setex(
+                        self._redis_key(product_id),
+                        int(self.stale_seconds),
+                        json.dumps({"totalStock": value["totalStock"], "fetchedAt": fetched_at})
+                    )
+                await pipe.execute()
+        except Exception as e:
+            cache_manager.report_error(e)
+            print(f"Error writing stock cache: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.stale_hits) / total if total else 0.0
+        }
+
+# Shared stock cache used by the chat service
+stock_cache = StockCache(
+    ttl_seconds=settings.STOCK_CACHE_TTL_SECONDS,
+    stale_seconds=settings.STOCK_CACHE_STALE_SECONDS,
+    max_entries=settings.STOCK_CACHE_MAX_ENTRIES
+)
+stats_collector.register("stock_cache", stock_cache.stats)
@@ -1,40 +1,126 @@
-import os
+import threading
+from typing import Optional
 import chromadb
 from chromadb.config import Settings
-from chromadb.utils import embedding_functions
 from dotenv import load_dotenv
+from app.core.config import settings
+from app.core.metrics import stats_collector
+from .embedding_backends import build_embedding_function, embedding_model_name
+from .embedding_cache import CachedEmbeddingFunction
 
 load_dotenv()
 
+def create_client():
+    """Chroma client for CHROMA_MODE.
+
+    A persistent client owns its SQLite files and in-memory HNSW index, so
+    only one process may write through it. Multi-worker deployments use a
+    Chroma server instead, which all workers share over HTTP.
+    """
+    client_settings = Settings(
+        anonymized_telemetry=False,
+        allow_reset=True
+    )
+    if settings.CHROMA_MODE == "http":
+        return chromadb.HttpClient(
+            host=settings.CHROMA_HOST,
+            port=settings.CHROMA_PORT,
+            settings=client_settings
+        )
+    if settings.CHROMA_MODE != "persistent":
+        raise ValueError(f"Unknown CHROMA_MODE '{settings.CHROMA_MODE}' (expected 'persistent' or 'http')")
+    return chromadb.PersistentClient(
+        path=settings.CHROMA_PERSIST_DIRECTORY,
+        settings=client_settings
+    )
+
 class VectorDBConfig:
+    """Chroma client, embedding function and product collection, created on first use.
+
+    Nothing connects at import time: the lifespan warms this up in the
+    background (or the first request that needs it does), so a slow or
+    missing Chroma server or embedding key doesn't hold up startup.
+    """
+
     def __init__(self):
-        self.client = chromadb.PersistentClient(
-            path="./chroma_db",
-            settings=Settings(
-                anonymized_telemetry=False,
-                allow_reset=True
-            )
-        )
-        
-        self.embedding_function = embedding_functions.OpenAIEmbeddingFunction(
-            api_key=os.getenv("OPENAI_API_KEY"),
-            model_name="text-embedding-3-small"
-        )
-        
-        self.collection = self.client.get_or_create_collection(
-            name="products",
+        self.embedding_backend = settings.EMBEDDING_BACKEND
+        self.embedding_model = embedding_model_name(self.embedding_backend)
+        self.collection_name = settings.CHROMA_COLLECTION
+        self._lock = threading.RLock()
+        self._client = None
+        self._embedding_function: Optional[CachedEmbeddingFunction] = None
+        self._collection = None
+    
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = create_client()
+        return self._client
+    
+    @property
+    def embedding_function(self) -> CachedEmbeddingFunction:
+        if self._embedding_function is None:
+            with self._lock:
+                if self._embedding_function is None:
+                    # Repeated search queries are served from the cache instead of the backend
+                    self._embedding_function = CachedEmbeddingFunction(
+                        build_embedding_function(self.embedding_backend),
+                        model_name=self.embedding_model,
+                        max_entries=settings.EMBEDDING_CACHE_SIZE,
+                        persist_path=settings.EMBEDDING_CACHE_PATH
+                    )
+        return self._embedding_function
+    
+    @property
+    def collection(self):
+        if self._collection is None:
+            with self._lock:
+                if self._collection is None:
+                    self._collection = self.open_collection(self.collection_name)
+        return self._collection
+    
+    @property
+    def ready(self) -> bool:
+        return self._collection is not None
+    
+    def warm_up(self):
+        """Connect and open the collection now instead of on the first request"""
+        return self.collection
+    
+    def collection_metadata(self) -> dict:
+        """Metadata for new collections, recording which model their vectors come from"""
+        return {
+            "hnsw:space": "cosine",
+            "embedding_backend": self.embedding_backend,
+            "embedding_model": self.embedding_model
+        }
+    
+    def open_collection(self, name: str):
+        """Get or create a collection bound to the configured embedding function"""
+        collection = self.client.get_or_create_collection(
+            name=name,
             embedding_function=self.embedding_function,
-            metadata={"hnsw:space": "cosine"}
+            metadata=self.collection_metadata()
         )
+        stored_model = (collection.metadata or {}).get("embedding_model")
+        if stored_model and stored_model != self.embedding_model:
+            print(
+                f"Collection '{name}' was embedded with {stored_model} but EMBEDDING_BACKEND uses "
+                f"{self.embedding_model}; searches will be meaningless until it is migrated "
+                f"(python -m app.vectordb.migrate)."
+            )
+        return collection
     
     def reset_collection(self):
         """Reset the collection if needed"""
         try:
-            self.client.delete_collection("products")
-            self.collection = self.client.create_collection(
-                name="products",
+            self.client.delete_collection(self.collection_name)
+            self._collection = self.client.create_collection(
+                name=self.collection_name,
                 embedding_function=self.embedding_function,
-                metadata={"hnsw:space": "cosine"}
+                metadata=self.collection_metadata()
             )
         except Exception as e:
             print(f"Error resetting collection: {e}")
@@ -44,5 +130,9 @@ class VectorDBConfig:
     
     def get_client(self):
         return self.client
+    
+    def embedding_cache_stats(self) -> dict:
+        return self._embedding_function.stats() if self._embedding_function is not None else {}
 
-vector_db = VectorDBConfig()
\ No newline at end of file
+vector_db = VectorDBConfig()
+stats_collector.register("embedding_cache", vector_db.embedding_cache_stats)
@@ -0,0 +1,97 @@
+# app/vectordb/embedding_backends.py
+import threading
+from typing import Any, Optional, Sequence
+import numpy as np
+from chromadb import Documents, EmbeddingFunction, Embeddings
+from chromadb.utils import embedding_functions
+from app.core.config import settings
+
+EMBEDDING_BACKENDS = ("openai", "local")
+
+class LocalEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Sentence-transformers model run in-process on CPU.
+
+    sentence-transformers is an optional dependency and the model is loaded
+    on first use. Chroma calls already run on the vector DB thread pool and
+    inference releases the GIL, so concurrent requests embed in parallel.
+    Texts are encoded in batches of batch_size and returned L2-normalized,
+    cut to truncate_dim dimensions first when it is set.
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 64, onnx: bool = False, device: str = "cpu", truncate_dim: Optional[int] = None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.onnx = onnx
+        self.device = device
+        self.truncate_dim = truncate_dim
+        self._model: Any = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    try:
+                        from sentence_transformers import SentenceTransformer
+                    except ImportError as e:
+                        raise RuntimeError(
+                            "EMBEDDING_BACKEND=local needs the sentence-transformers package "
+                            "(pip install sentence-transformers, plus optimum[onnxruntime] for ONNX)"
+                        ) from e
+                    kwargs = {"device": self.device}
+                    if self.onnx:
+                        kwargs["backend"] = "onnx"
+                    if self.truncate_dim:
+                        kwargs["truncate_dim"] = self.truncate_dim
+                    self._model = SentenceTransformer(self.model_name, **kwargs)
+        return self._model
+
+    def __call__(self, input: Documents) -> Embeddings:
+        vectors = self._load().encode(
+            list(input),
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return np.asarray(vectors, dtype=np.float32).tolist()
+
+def embedding_model_name(backend: str) -> str:
+    """Model identifier a backend embeds with (recorded on the collection).
+
+    Shortened embeddings get a "@<dimensions>" suffix, so collections and
+    cached vectors of different sizes are never mixed up.
+    """
+    model = settings.LOCAL_EMBEDDING_MODEL if backend == "local" else settings.EMBEDDING_MODEL
+    return f"{model}@{settings.EMBEDDING_DIMENSIONS}" if settings.EMBEDDING_DIMENSIONS else model
+
+def truncate_embeddings(embeddings: Sequence[Sequence[float]], dimensions: int) -> np.ndarray:
+    """Keep the first dimensions of each vector and re-normalize.
+
+    Matches what the text-embedding-3 `dimensions` parameter returns, so
+    existing full-size vectors can be shortened without re-embedding.
+    """
+    vectors = np.asarray(embeddings, dtype=np.float32)[:, :dimensions]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+def build_embedding_function(backend: str) -> EmbeddingFunction:
+    """Uncached embedding function for a backend name from EMBEDDING_BACKENDS"""
+    if backend == "openai":
+        kwargs = {}
+        if settings.EMBEDDING_DIMENSIONS:
+            # Needs a text-embedding-3 model
+            kwargs["dimensions"] = settings.EMBEDDING_DIMENSIONS
+        return embedding_functions.OpenAIEmbeddingFunction(
+            api_key=settings.OPENAI_API_KEY,
+            model_name=settings.EMBEDDING_MODEL,
+            **kwargs
+        )
+    if backend == "local":
+        return LocalEmbeddingFunction(
+            settings.LOCAL_EMBEDDING_MODEL,
+            batch_size=settings.LOCAL_EMBEDDING_BATCH_SIZE,
+            onnx=settings.LOCAL_EMBEDDING_ONNX,
+            truncate_dim=settings.EMBEDDING_DIMENSIONS
+        )
+    raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}' (expected one of: {', '.join(EMBEDDING_BACKENDS)})")
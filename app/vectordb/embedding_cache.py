@@ -0,0 +1,145 @@
+# app/vectordb/embedding_cache.py
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from chromadb import Documents, EmbeddingFunction, Embeddings
+from app.core.metrics import observe_stage, UPSTREAM_ERRORS
+
+class CachedEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Memoizing wrapper around a Chroma embedding function.
+
+    Vectors are keyed by model name and normalized text and kept as
+    float32 arrays in a bounded in-memory LRU, with an optional SQLite
+    tier that survives restarts. Only texts that miss both tiers are sent
+    to the wrapped function, as given and in a single batch.
+    """
+
+    def __init__(
+        self,
+        embedding_function: EmbeddingFunction,
+        model_name: str,
+        max_entries: int = 10000,
+        persist_path: Optional[str] = None,
+        max_text_chars: int = 512
+    ):
+        self.embedding_function = embedding_function
+        self.model_name = model_name
+        self.max_entries = max_entries
+        # Long texts are product documents that are embedded once at ingest;
+        # caching them would only push queries out of the LRU
+        self.max_text_chars = max_text_chars
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        if persist_path:
+            try:
+                self._db = sqlite3.connect(persist_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+                )
+                self._db.commit()
+            except Exception as e:
+                print(f"Embedding cache store unavailable at {persist_path}: {e}")
+                self._db = None
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.casefold().split())
+
+    def _key(self, normalized: str) -> str:
+        return hashlib.sha1(f"{self.model_name}\x00{normalized}".encode("utf-8")).hexdigest()
+
+    def _get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                return vector
+            if self._db is None:
+                return None
+            try:
+                row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            except Exception as e:
+                print(f"Error reading embedding cache: {e}")
+                return None
+            if row is None:
+                return None
+            vector = np.frombuffer(row[0], dtype=np.float32)
+            self._remember(key, vector)
+            return vector
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _put_many(self, items: Dict[str, np.ndarray]):
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+            if self._db is None:
+                return
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, vector.tobytes()) for key, vector in items.items()]
+                )
+                self._db.commit()
+            except Exception as e:
+                print(f"Error writing embedding cache: {e}")
+
+    def __call__(self, input: Documents) -> Embeddings:
+        results: List[Optional[np.ndarray]] = [None] * len(input)
+        # cache key (or the text itself, if too long to cache) -> (text to embed, cache key, positions)
+        pending: Dict[str, Tuple[str, Optional[str], List[int]]] = {}
+
+        for i, text in enumerate(input):
+            normalized = self.normalize(text)
+            key = None
+            if len(normalized) <= self.max_text_chars:
+                key = self._key(normalized)
+                vector = self._get(key)
+                if vector is not None:
+                    results[i] = vector
+                    self.hits += 1
+                    continue
+            self.misses += 1
+            # Normalization only shapes the key; the model sees the text as given
+            pending.setdefault(key or text, (text, key, []))[2].append(i)
+
+        if pending:
+            batch = list(pending.values())
+            try:
+                with observe_stage("embedding", self.model_name):
+                    embeddings = self.embedding_function([text for text, _, _ in batch])
+            except Exception:
+                UPSTREAM_ERRORS.labels(upstream="embedding").inc()
+                raise
+            to_store = {}
+            for (text, key, positions), embedding in zip(batch, embeddings):
+                vector = np.asarray(embedding, dtype=np.float32)
+                for i in positions:
+                    results[i] = vector
+                if key is not None:
+                    to_store[key] = vector
+            if to_store:
+                self._put_many(to_store)
+
+        return [vector.tolist() for vector in results]
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._memory),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0
+        }
@@ -0,0 +1,133 @@
+# app/vectordb/evaluate.py
+"""Compare vector index settings on a labeled query set.
+
+Reports recall@k, query latency and vector memory for each combination of
+embedding size and memory index quantization, against the vectors already
+stored in the collection:
+
+    python -m app.vectordb.evaluate --queries queries.jsonl --k 5 10 --dimensions 512 256
+
+Each line of the query file is {"query": "...", "relevant": ["<productId>", ...]}.
+Smaller sizes are made by truncating the stored vectors (valid for
+text-embedding-3 and other Matryoshka models), so nothing is re-embedded
+except the queries. Rescoring reads float vectors from memory here; in
+production they come from Chroma, so that fetch is not in the latency.
+"""
+import argparse
+import json
+import time
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from app.core.config import settings
+from app.utils.knowledge.memory_index import QUANTIZATIONS, MemoryVectorIndex
+from app.vectordb.config import vector_db
+from app.vectordb.embedding_backends import truncate_embeddings
+
+def load_queries(path: str) -> List[Dict]:
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                queries.append({"query": item["query"], "relevant": set(item["relevant"])})
+    if not queries:
+        raise ValueError(f"No queries in {path}")
+    return queries
+
+def load_vectors(collection, page_size: int = 1000):
+    """All ids and stored embeddings of a collection"""
+    ids: List[str] = []
+    pages = []
+    offset = 0
+    while True:
+        results = collection.get(limit=page_size, offset=offset, include=["embeddings"])
+        if not len(results["ids"]):
+            break
+        ids.extend(results["ids"])
+        pages.append(np.asarray(results["embeddings"], dtype=np.float32))
+        if len(results["ids"]) < page_size:
+            break
+        offset += len(results["ids"])
+    if not ids:
+        raise ValueError("Collection has no vectors")
+    return ids, np.concatenate(pages)
+
+def evaluate(
+    ids: List[str],
+    vectors: np.ndarray,
+    query_vectors: np.ndarray,
+    queries: List[Dict],
+    ks: Sequence[int],
+    quantization: str,
+    rescore_factor: Optional[int]
+) -> Dict:
+    """Recall@k and latency of one index configuration"""
+    stored = dict(zip(ids, vectors))
+    index = MemoryVectorIndex(
+        quantization=quantization,
+        rescore_factor=rescore_factor or 1,
+        fetch_vectors=(lambda wanted: {product_id: stored[product_id] for product_id in wanted if product_id in stored}) if rescore_factor else None,
+        initial_capacity=len(ids)
+    )
+    index.upsert(ids, vectors, [{}] * len(ids))
+
+    n_results = max(ks)
+    recalls = {k: [] for k in ks}
+    latencies = []
+    for query, query_vector in zip(queries, query_vectors):
+        started = time.perf_counter()
+        results = index.search(query_vector, n_results)
+        latencies.append((time.perf_counter() - started) * 1000)
+        found = [result["id"] for result in results]
+        for k in ks:
+            recalls[k].append(len(query["relevant"].intersection(found[:k])) / len(query["relevant"]))
+
+    return {
+        "dimensions": vectors.shape[1],
+        "quantization": quantization,
+        "rescore_factor": rescore_factor,
+        "vector_mb": round(index.nbytes / 1024 / 1024, 2),
+        **{f"recall@{k}": round(float(np.mean(recalls[k])), 4) for k in ks},
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3)
+    }
+
+def report(queries_path: str, ks: Sequence[int], dimensions: Sequence[int], quantizations: Sequence[str], rescore_factor: int, collection_name: str) -> List[Dict]:
+    queries = [query for query in load_queries(queries_path) if query["relevant"]]
+    ids, full_vectors = load_vectors(vector_db.open_collection(collection_name))
+    query_vectors = np.asarray(vector_db.embedding_function([query["query"] for query in queries]), dtype=np.float32)
+    full_size = full_vectors.shape[1]
+    if query_vectors.shape[1] < full_size:
+        raise ValueError(f"Queries embed to {query_vectors.shape[1]} dimensions but '{collection_name}' stores {full_size}")
+
+    rows = []
+    for size in sorted({full_size, *[size for size in dimensions if size < full_size]}, reverse=True):
+        vectors = full_vectors if size == full_size else truncate_embeddings(full_vectors, size)
+        sized_queries = truncate_embeddings(query_vectors, size)
+        for quantization in quantizations:
+            for factor in ([None] if quantization == "float32" else [None, rescore_factor]):
+                rows.append(evaluate(ids, vectors, sized_queries, queries, ks, quantization, factor))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k, latency and memory of vector index settings on a labeled query set")
+    parser.add_argument("--queries", required=True, help="JSONL file of {\"query\", \"relevant\": [ids]}")
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 10], help="Cutoffs for recall@k")
+    parser.add_argument("--dimensions", type=int, nargs="*", default=[], help="Shorter embedding sizes to try")
+    parser.add_argument("--quantization", nargs="+", choices=QUANTIZATIONS, default=list(QUANTIZATIONS))
+    parser.add_argument("--rescore-factor", type=int, default=settings.VECTOR_INDEX_RESCORE_FACTOR)
+    parser.add_argument("--collection", default=settings.CHROMA_COLLECTION)
+    parser.add_argument("--output", help="Also write the rows to this JSON file")
+    args = parser.parse_args()
+
+    rows = report(args.queries, args.k, args.dimensions, args.quantization, args.rescore_factor, args.collection)
+    columns = list(rows[0].keys())
+    print("  ".join(f"{column:>14}" for column in columns))
+    for row in rows:
+        print("  ".join(f"{str(row[column]):>14}" for column in columns))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# app/vectordb/migrate.py
+"""Re-embed a product collection with the configured embedding backend.
+
+Vectors from different models can't be mixed, so switching EMBEDDING_BACKEND
+(or the model) means copying the catalog into a new collection:
+
+    EMBEDDING_BACKEND=local python -m app.vectordb.migrate --source products --target products_local
+
+Documents and metadata are read from the source in chunks and re-embedded
+with the current backend; the target gets the same ids. Writes are upserts,
+so an interrupted run can be resumed with --start-offset. Point
+CHROMA_COLLECTION at the target once it finishes.
+
+Shortening text-embedding-3 vectors to EMBEDDING_DIMENSIONS doesn't need
+the API: --truncate cuts and re-normalizes the stored vectors instead.
+
+    EMBEDDING_DIMENSIONS=512 python -m app.vectordb.migrate --target products_512 --truncate
+"""
+import argparse
+import time
+from app.core.config import settings
+from app.vectordb.config import vector_db
+from app.vectordb.embedding_backends import truncate_embeddings
+
+def migrate(source_name: str, target_name: str, chunk_size: int = 500, start_offset: int = 0, drop_target: bool = False, truncate: bool = False) -> int:
+    if source_name == target_name:
+        raise ValueError("Source and target collections must differ")
+    if truncate and not settings.EMBEDDING_DIMENSIONS:
+        raise ValueError("--truncate needs EMBEDDING_DIMENSIONS")
+
+    client = vector_db.get_client()
+    source = client.get_collection(source_name)
+    if drop_target:
+        try:
+            client.delete_collection(target_name)
+        except Exception:
+            pass
+    target = vector_db.open_collection(target_name)
+
+    embed = vector_db.embedding_function
+    batch_size = settings.EMBEDDING_BATCH_SIZE
+    offset = start_offset
+    migrated = 0
+    started = time.perf_counter()
+    include = ["documents", "metadatas", "embeddings"] if truncate else ["documents", "metadatas"]
+    while True:
+        results = source.get(limit=chunk_size, offset=offset, include=include)
+        ids = results["ids"]
+        if not ids:
+            break
+        documents = [document or "" for document in results["documents"]]
+        if truncate:
+            embeddings = truncate_embeddings(results["embeddings"], settings.EMBEDDING_DIMENSIONS).tolist()
+        else:
+            embeddings = []
+            for start in range(0, len(documents), batch_size):
+                embeddings.extend(embed(documents[start:start + batch_size]))
+        target.upsert(ids=ids, documents=documents, metadatas=results["metadatas"], embeddings=embeddings)
+
+        offset += len(ids)
+        migrated += len(ids)
+        elapsed = time.perf_counter() - started
+        print(f"Migrated {migrated} products (offset {offset}, {migrated / elapsed:.1f}/s)")
+        if len(ids) < chunk_size:
+            break
+    return migrated
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-embed a product collection with the configured embedding backend")
+    parser.add_argument("--source", default=settings.CHROMA_COLLECTION, help="Collection to read from")
+    parser.add_argument("--target", required=True, help="Collection to write (created if missing)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Products read and written per step")
+    parser.add_argument("--start-offset", type=int, default=0, help="Resume an interrupted run from this offset")
+    parser.add_argument("--drop-target", action="store_true", help="Delete the target collection first")
+    parser.add_argument("--truncate", action="store_true", help="Shorten the stored vectors to EMBEDDING_DIMENSIONS instead of re-embedding")
+    args = parser.parse_args()
+
+    action = "Truncating" if args.truncate else "Re-embedding"
+    print(f"{action} '{args.source}' into '{args.target}' with {vector_db.embedding_backend}:{vector_db.embedding_model}")
+    migrated = migrate(args.source, args.target, args.chunk_size, args.start_offset, args.drop_target, args.truncate)
+    print(f"Done: {migrated} products. Set CHROMA_COLLECTION={args.target} to serve from it.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# bench/clients.py
+"""Per-request clients vs the shared client registry, against local fake upstreams.
+
+    python -m bench.clients --requests 500 --concurrency 20
+
+For the OpenAI client and the aiohttp session used for stock lookups, it
+times the same calls made with a client built (and closed) per request,
+as the routes used to do, and with the process-wide pooled clients from
+app/core/clients.py. Each row has p50/p99 latency, throughput and the
+number of TCP connections the fake upstream saw. The upstreams are plain
+HTTP, so the gap here is connection setup alone; against the real API
+every new connection also pays a TLS handshake.
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, List
+import aiohttp
+import openai
+from .fake_upstreams import FakeUpstreams
+from .report import latency_summary, print_rows
+
+async def measure(calls: Callable[[], Awaitable[None]], requests: int, concurrency: int) -> Dict:
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await calls()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    return {"req_per_s": round(requests / elapsed, 1), **latency_summary(latencies)}
+
+async def run(args) -> List[Dict]:
+    upstreams = FakeUpstreams(latency=args.latency, embedding_latency=args.latency, stock_latency=args.latency)
+    base_url = await upstreams.start(port=args.port)
+    # Read by the shared registry's settings and by the OpenAI client
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["OPENAI_BASE_URL"] = f"{base_url}/v1"
+    from app.core.clients import ClientRegistry
+
+    messages = [{"role": "user", "content": "Do you have wireless headphones?"}]
+    stock_url = f"{base_url}/products/bench-1"
+
+    async def llm_per_request():
+        client = openai.AsyncOpenAI(max_retries=0)
+        try:
+            await client.chat.completions.create(model="gpt-4o-mini", messages=messages)
+        finally:
+            await client.close()
+
+    async def http_per_request():
+        async with aiohttp.ClientSession() as session:
+            async with session.get(stock_url) as response:
+                await response.json()
+
+    registry = ClientRegistry()
+
+    async def llm_shared():
+        await registry.get_llm().chat.completions.create(model="gpt-4o-mini", messages=messages)
+
+    async def http_shared():
+        async with registry.get_http().get(stock_url) as response:
+            await response.json()
+
+    rows = []
+    try:
+        for client, mode, calls in (
+            ("openai", "per_request", llm_per_request),
+            ("openai", "shared", llm_shared),
+            ("aiohttp", "per_request", http_per_request),
+            ("aiohttp", "shared", http_shared)
+        ):
+            upstreams.peers.clear()
+            result = await measure(calls, args.requests, args.concurrency)
+            rows.append({"client": client, "mode": mode, **result, "connections": len(upstreams.peers)})
+    finally:
+        await registry.shutdown()
+        await upstreams.stop()
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency of per-request vs shared LLM and HTTP clients")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.01, help="Seconds each fake upstream call takes")
+    parser.add_argument("--port", type=int, default=0, help="Port for the fake upstreams (0 picks a free one)")
+    parser.add_argument("--output", help="Also write the rows to this JSON file")
+    args = parser.parse_args()
+    print_rows(asyncio.run(run(args)), args.output)
+
+if __name__ == "__main__":
+    main()
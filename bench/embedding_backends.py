@@ -0,0 +1,100 @@
+# bench/embedding_backends.py
+"""Query latency and recall of each embedding backend on a fixed product fixture.
+
+    python -m bench.embedding_backends --backends openai local --k 1 5
+
+Embeds bench/fixtures/products.jsonl with each backend (as the catalog
+would be stored), then embeds every query of bench/fixtures/queries.jsonl
+one at a time, uncached, and ranks the products by cosine similarity.
+Reports recall@k, query p50/p99 and document throughput. The first call
+(model load for the local backend) is made before timing.
+
+The openai backend needs OPENAI_API_KEY. --fake-openai serves it from
+bench.fake_upstreams instead, which measures the client path only: fake
+vectors are random, so recall is meaningless there. The local backend
+needs sentence-transformers installed.
+"""
+import argparse
+import json
+import os
+import time
+from typing import Dict, List
+import numpy as np
+from .fake_upstreams import FakeUpstreams, serve_in_thread
+from .report import latency_summary, print_rows
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+def load_products(path: str):
+    from app.utils.knowledge.knowledge_schema import ProductKnowledge
+    with open(path, encoding="utf-8") as f:
+        return [ProductKnowledge(**json.loads(line)) for line in f if line.strip()]
+
+def unit_rows(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+def evaluate_backend(backend: str, documents: List[str], ids: List[str], queries: List[Dict], ks: List[int]) -> Dict:
+    from app.vectordb.embedding_backends import build_embedding_function, embedding_model_name
+
+    embed = build_embedding_function(backend)
+    embed(["warm up"])
+
+    started = time.perf_counter()
+    document_vectors = unit_rows(embed(documents))
+    documents_seconds = time.perf_counter() - started
+
+    latencies = []
+    recalls = {k: [] for k in ks}
+    for query in queries:
+        started = time.perf_counter()
+        query_vector = unit_rows(embed([query["query"]]))[0]
+        latencies.append(time.perf_counter() - started)
+        ranked = [ids[i] for i in np.argsort(-(document_vectors @ query_vector))]
+        for k in ks:
+            recalls[k].append(len(query["relevant"].intersection(ranked[:k])) / len(query["relevant"]))
+
+    return {
+        "backend": backend,
+        "model": embedding_model_name(backend),
+        "dimensions": document_vectors.shape[1],
+        **{f"recall@{k}": round(float(np.mean(recalls[k])), 3) for k in ks},
+        **latency_summary(latencies, prefix="query_"),
+        "docs_per_s": round(len(documents) / documents_seconds, 1)
+    }
+
+def run(args) -> List[Dict]:
+    if args.fake_openai:
+        base_url = serve_in_thread(FakeUpstreams(embedding_latency=args.fake_latency))
+        os.environ.update({"OPENAI_API_KEY": "bench", "OPENAI_BASE_URL": f"{base_url}/v1"})
+    from app.utils.knowledge.knowledge import knowledge_manager
+    from app.vectordb.evaluate import load_queries
+
+    products = load_products(args.products)
+    documents = [knowledge_manager._create_searchable_text(product) for product in products]
+    ids = [product.productId for product in products]
+    queries = load_queries(args.queries)
+
+    rows = []
+    for backend in args.backends:
+        try:
+            rows.append(evaluate_backend(backend, documents, ids, queries, args.k))
+        except Exception as e:
+            print(f"Skipping {backend}: {e}")
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k and query latency of embedding backends on a fixed fixture")
+    parser.add_argument("--backends", nargs="+", default=["openai", "local"])
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 5])
+    parser.add_argument("--products", default=os.path.join(FIXTURES, "products.jsonl"))
+    parser.add_argument("--queries", default=os.path.join(FIXTURES, "queries.jsonl"))
+    parser.add_argument("--fake-openai", action="store_true", help="Serve the openai backend from local fake upstreams")
+    parser.add_argument("--fake-latency", type=float, default=0.05)
+    parser.add_argument("--output", help="Also write the rows to this JSON file")
+    args = parser.parse_args()
+    print_rows(run(args), args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+# bench/fake_upstreams.py
+"""Local stand-ins for OpenAI and the product API, for load tests and benchmarks.
+
+Every endpoint waits a fixed latency (plus optional jitter) and answers
+with well-formed data, so the service can be driven hard without cost and
+the numbers reflect our own code and connection handling:
+
+    python -m bench.fake_upstreams --port 8100 --latency 0.3
+
+Then point the service at it:
+
+    OPENAI_API_KEY=bench OPENAI_BASE_URL=http://127.0.0.1:8100/v1 \\
+    PRODUCT_API_BASE_URL=http://127.0.0.1:8100/products \\
+    PRODUCT_API_BATCH_URL=http://127.0.0.1:8100/products/batch python main.py
+
+Embeddings are deterministic per text (seeded by its hash), so repeated
+texts embed identically but unrelated texts are not semantically close.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional
+import numpy as np
+from aiohttp import web
+
+def fake_embedding(text: str, dimensions: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+class FakeUpstreams:
+    """aiohttp application serving the fake endpoints, with request counters"""
+
+    def __init__(self, latency: float = 0.3, jitter: float = 0.0, embedding_latency: Optional[float] = None, stock_latency: Optional[float] = None, dimensions: int = 1536):
+        self.latency = latency
+        self.jitter = jitter
+        self.embedding_latency = latency if embedding_latency is None else embedding_latency
+        self.stock_latency = latency if stock_latency is None else stock_latency
+        self.dimensions = dimensions
+        self.requests = {"chat": 0, "embeddings": 0, "stock": 0, "stock_batch": 0}
+        # Client address of every connection seen, to tell pooled clients from per-request ones
+        self.peers = set()
+
+        self.app = web.Application(middlewares=[self._track_peer])
+        self.app.router.add_post("/v1/chat/completions", self.chat_completions)
+        self.app.router.add_post("/v1/embeddings", self.embeddings)
+        self.app.router.add_get("/products/batch", self.stock_batch)
+        self.app.router.add_get("/products/{product_id}", self.stock)
+        self._runner: Optional[web.AppRunner] = None
+
+    @web.middleware
+    async def _track_peer(self, request: web.Request, handler):
+        self.peers.add(request.transport.get_extra_info("peername") if request.transport else None)
+        return await handler(request)
+
+    async def _wait(self, latency: float):
+        await asyncio.sleep(max(0.0, latency + random.uniform(-self.jitter, self.jitter)))
+
+    @staticmethod
+    def _usage(prompt_tokens: int, completion_tokens: int = 0):
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": 0}
+        }
+
+    def _reply(self, body) -> str:
+        messages = body.get("messages") or [{}]
+        system = str(messages[0].get("content") or "")
+        user = str(messages[-1].get("content") or "")
+        if '"vector_search"' in system:
+            # Intent analysis: ask for a product search on the user's words
+            return json.dumps({
+                "vector_search": True,
+                "vector_query": user[:60],
+                "language": "English",
+                "filters": {},
+                "response": ""
+            })
+        return f"Here are some options for '{user[:60]}'. Let me know if you would like more details."
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        self.requests["chat"] += 1
+        body = await request.json()
+        prompt_tokens = sum(len(str(message.get("content") or "")) // 4 for message in body.get("messages", []))
+        content = self._reply(body)
+        created = int(time.time())
+        await self._wait(self.latency)
+
+        if not body.get("stream"):
+            return web.json_response({
+                "id": "chatcmpl-bench",
+                "object": "chat.completion",
+                "created": created,
+                "model": body.get("model", "gpt-4o-mini"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }],
+                "usage": self._usage(prompt_tokens, len(content) // 4)
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            chunk = {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": body.get("model", "gpt-4o-mini"),
+                "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}]
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            await asyncio.sleep(0.005)
+        if (body.get("stream_options") or {}).get("include_usage"):
+            chunk = {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": body.get("model", "gpt-4o-mini"),
+                "choices": [],
+                "usage": self._usage(prompt_tokens, len(content) // 4)
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def embeddings(self, request: web.Request) -> web.Response:
+        self.requests["embeddings"] += 1
+        body = await request.json()
+        texts: List[str] = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        dimensions = body.get("dimensions") or self.dimensions
+        await self._wait(self.embedding_latency)
+
+        data = []
+        for i, text in enumerate(texts):
+            vector = fake_embedding(str(text), dimensions)
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        return web.json_response({
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "text-embedding-3-small"),
+            "usage": {"prompt_tokens": sum(len(str(text)) // 4 for text in texts), "total_tokens": sum(len(str(text)) // 4 for text in texts)}
+        })
+
+    @staticmethod
+    def _stock_item(product_id: str):
+        return {"id": product_id, "totalStock": int(hashlib.sha256(product_id.encode("utf-8")).digest()[0]) % 20}
+
+    async def stock(self, request: web.Request) -> web.Response:
+        self.requests["stock"] += 1
+        await self._wait(self.stock_latency)
+        return web.json_response(self._stock_item(request.match_info["product_id"]))
+
+    async def stock_batch(self, request: web.Request) -> web.Response:
+        self.requests["stock_batch"] += 1
+        await self._wait(self.stock_latency)
+        ids = [product_id for product_id in request.query.get("ids", "").split(",") if product_id]
+        return web.json_response({"data": [self._stock_item(product_id) for product_id in ids]})
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8100) -> str:
+        """Serve in the running event loop; returns the base URL"""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port, backlog=1024)
+        await site.start()
+        if port == 0:
+            port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+def serve_in_thread(upstreams: FakeUpstreams, host: str = "127.0.0.1", port: int = 0) -> str:
+    """Serve from a daemon thread with its own event loop, for benchmarks of blocking code"""
+    loop = asyncio.new_event_loop()
+    started: Future = Future()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        try:
+            started.set_result(loop.run_until_complete(upstreams.start(host, port)))
+        except Exception as e:
+            started.set_exception(e)
+            return
+        loop.run_forever()
+
+    threading.Thread(target=run, name="fake-upstreams", daemon=True).start()
+    return started.result(timeout=10)
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI and product API endpoints with fixed latency")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds each chat completion takes")
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--stock-latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- seconds added to every latency")
+    parser.add_argument("--dimensions", type=int, default=1536)
+    args = parser.parse_args()
+
+    upstreams = FakeUpstreams(args.latency, args.jitter, args.embedding_latency, args.stock_latency, args.dimensions)
+    web.run_app(upstreams.app, host=args.host, port=args.port, access_log=None, print=lambda message: print(f"Fake upstreams on http://{args.host}:{args.port}"))
+
+if __name__ == "__main__":
+    main()
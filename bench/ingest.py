@@ -0,0 +1,96 @@
+# bench/ingest.py
+"""Items/sec of single-product vs batch ingestion, into a scratch Chroma store.
+
+    python -m bench.ingest --products 5000 --single 200
+
+Embeddings come from the fake upstreams, each call taking
+--embedding-latency seconds whatever its size (real batch calls grow
+somewhat with the batch). Three passes are timed: add_product one at a
+time (as POST /api/knowledge/products does), add_products_batch on new
+products (POST /api/knowledge/products/batch), and the same batch pushed
+again unchanged, which the content hashes skip without embedding.
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import Dict, List
+from .fake_upstreams import FakeUpstreams, serve_in_thread
+from .report import print_rows
+
+BRANDS = ["Samsung", "Apple", "Sony", "LG", "Xiaomi", "Lenovo", "HP", "JBL"]
+TYPES = ["phone", "laptop", "headphones", "tv", "tablet", "speaker", "monitor", "watch"]
+
+def make_products(count: int, prefix: str) -> List:
+    from app.utils.knowledge.knowledge_schema import ProductKnowledge
+    return [
+        ProductKnowledge(
+            productId=f"{prefix}-{i}",
+            productName=f"{BRANDS[i % len(BRANDS)]} {TYPES[i % len(TYPES)]} model {i}",
+            model=f"M{i:05d}",
+            brand=BRANDS[i % len(BRANDS)],
+            type=TYPES[i % len(TYPES)],
+            color=["black", "white"] if i % 2 else "silver",
+            price=float(50 + (i * 37) % 2000),
+            description=f"{TYPES[i % len(TYPES)]} with {8 * (1 + i % 4)} GB and a {1 + i % 3}-year warranty"
+        )
+        for i in range(count)
+    ]
+
+def run(args, store: str) -> List[Dict]:
+    upstreams = FakeUpstreams(embedding_latency=args.embedding_latency, dimensions=args.dimensions)
+    base_url = serve_in_thread(upstreams)
+    # Settings are read on import, so the scratch store has to be configured first
+    os.environ.update({
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{base_url}/v1",
+        "CHROMA_MODE": "persistent",
+        "CHROMA_PERSIST_DIRECTORY": store,
+        "CHROMA_COLLECTION": "bench_products",
+        "EMBEDDING_BATCH_SIZE": str(args.batch_size),
+        "KNOWLEDGE_UPSERT_CHUNK_SIZE": str(args.chunk_size)
+    })
+    from app.utils.knowledge.knowledge import knowledge_manager
+
+    rows = []
+
+    def record(path: str, count: int, seconds: float, failed: int, embedding_calls: int):
+        rows.append({
+            "path": path,
+            "items": count,
+            "failed": failed,
+            "seconds": round(seconds, 2),
+            "items_per_s": round(count / seconds, 1),
+            "embedding_calls": embedding_calls
+        })
+
+    singles = make_products(args.single, "single")
+    calls = upstreams.requests["embeddings"]
+    started = time.perf_counter()
+    failed = sum(1 for product in singles if not knowledge_manager.add_product(product)["success"])
+    record("single", len(singles), time.perf_counter() - started, failed, upstreams.requests["embeddings"] - calls)
+
+    products = make_products(args.products, "batch")
+    for path in ("batch", "batch_unchanged"):
+        calls = upstreams.requests["embeddings"]
+        started = time.perf_counter()
+        report = knowledge_manager.add_products_batch(products)
+        record(path, len(products), time.perf_counter() - started, report["failed"], upstreams.requests["embeddings"] - calls)
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Items/sec of single vs batch product ingestion")
+    parser.add_argument("--products", type=int, default=5000, help="Products sent through the batch path")
+    parser.add_argument("--single", type=int, default=200, help="Products sent one at a time")
+    parser.add_argument("--embedding-latency", type=float, default=0.1, help="Seconds each fake embedding call takes")
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--batch-size", type=int, default=512, help="EMBEDDING_BATCH_SIZE")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="KNOWLEDGE_UPSERT_CHUNK_SIZE")
+    parser.add_argument("--output", help="Also write the rows to this JSON file")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory(prefix="bench-chroma-", ignore_cleanup_errors=True) as store:
+        rows = run(args, store)
+    print_rows(rows, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# bench/load_chat.py
+"""Load test for the chat endpoint, run against a service backed by fake upstreams.
+
+Start bench.fake_upstreams and the service pointed at it (see that module),
+then step through concurrency levels:
+
+    python -m bench.load_chat --concurrency 1 10 50 100 --requests 200
+
+Each level reports throughput, p50/p99 latency and errors, plus the p99
+of /health probed during the load. With every LLM call taking a fixed
+--latency upstream, an async pipeline keeps throughput growing with
+concurrency and /health stays fast; a blocking one flattens at about one
+request per LLM round-trip and /health queues behind the chat calls.
+"""
+import argparse
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+import httpx
+from .report import latency_summary, print_rows
+
+async def run_load(
+    client: httpx.AsyncClient,
+    send: Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]],
+    requests: int,
+    concurrency: int,
+    probe_path: Optional[str] = "/health"
+) -> Dict:
+    """Send requests with at most concurrency in flight, probing probe_path meanwhile"""
+    latencies: List[float] = []
+    probe_latencies: List[float] = []
+    errors = 0
+    next_index = 0
+    finished = asyncio.Event()
+
+    async def worker():
+        nonlocal errors, next_index
+        while next_index < requests:
+            index = next_index
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                response = await send(client, index)
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    async def probe():
+        while not finished.is_set():
+            started = time.perf_counter()
+            try:
+                await client.get(probe_path)
+                probe_latencies.append(time.perf_counter() - started)
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.1)
+
+    probe_task = asyncio.create_task(probe()) if probe_path else None
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    finished.set()
+    if probe_task is not None:
+        await probe_task
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "req_per_s": round(len(latencies) / elapsed, 2),
+        **latency_summary(latencies),
+        **(latency_summary(probe_latencies, prefix="health_") if probe_path else {})
+    }
+
+def chat_sender(path: str, message: str, stream: bool) -> Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]:
+    async def send(client: httpx.AsyncClient, index: int) -> httpx.Response:
+        # A distinct message per request, so the analysis cache doesn't answer them
+        body = {"message": f"{message} #{index}", "history": []}
+        if not stream:
+            return await client.post(path, json=body)
+        async with client.stream("POST", path, json=body) as response:
+            async for _ in response.aiter_bytes():
+                pass
+            return response
+    return send
+
+async def run(args) -> List[Dict]:
+    limits = httpx.Limits(max_connections=max(args.concurrency) + 10, max_keepalive_connections=max(args.concurrency) + 10)
+    path = "/api/chatbot/stream" if args.stream else "/api/chatbot"
+    send = chat_sender(path, args.message, args.stream)
+    rows = []
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        for concurrency in args.concurrency:
+            rows.append(await run_load(client, send, args.requests, concurrency))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and latency of the chat endpoint at several concurrency levels")
+    parser.add_argument("--url", default="http://127.0.0.1:8085")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 100])
+    parser.add_argument("--message", default="Do you have wireless headphones")
+    parser.add_argument("--stream", action="store_true", help="Use the SSE endpoint and read each stream to the end")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="Also write the rows to this JSON file")
+    args = parser.parse_args()
+    print_rows(asyncio.run(run(args)), args.output)
+
+if __name__ == "__main__":
+    main()
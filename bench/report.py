@@ -0,0 +1,29 @@
+# bench/report.py
+"""Helpers shared by the benchmark scripts in this directory."""
+import json
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+def latency_summary(seconds: Sequence[float], prefix: str = "") -> Dict[str, Optional[float]]:
+    """p50/p99 (and mean) of a list of durations, in milliseconds"""
+    if not len(seconds):
+        return {f"{prefix}p50_ms": None, f"{prefix}p99_ms": None, f"{prefix}mean_ms": None}
+    values = np.asarray(seconds, dtype=np.float64) * 1000
+    return {
+        f"{prefix}p50_ms": round(float(np.percentile(values, 50)), 2),
+        f"{prefix}p99_ms": round(float(np.percentile(values, 99)), 2),
+        f"{prefix}mean_ms": round(float(values.mean()), 2)
+    }
+
+def print_rows(rows: List[Dict], output: Optional[str] = None):
+    """Print rows as an aligned table, and optionally write them as JSON"""
+    if not rows:
+        print("No results")
+        return
+    columns = list(dict.fromkeys(column for row in rows for column in row))
+    print("  ".join(f"{column:>14}" for column in columns))
+    for row in rows:
+        print("  ".join(f"{str(row.get(column, '')):>14}" for column in columns))
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
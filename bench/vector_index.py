@@ -0,0 +1,98 @@
+# bench/vector_index.py
+"""Query latency of the in-memory NumPy index vs Chroma, on synthetic vectors.
+
+    python -m bench.vector_index --products 20000 --dimensions 1536 --queries 200
+
+Loads the same random unit vectors (with brand/type/price metadata) into
+a scratch persistent Chroma collection and a MemoryVectorIndex, then
+times top-k queries against both, unfiltered and with a brand filter, as
+KnowledgeManager issues them. Queries are noisy copies of stored vectors
+so neighbours are meaningful; overlap@k is the share of Chroma's (HNSW,
+approximate) top-k that the exact memory index also returns. Past the
+first hit, random vectors are near-ties, so overlap here understates how
+well the two agree on a real catalog.
+"""
+import argparse
+import tempfile
+import time
+from typing import Dict, List
+import numpy as np
+from .report import latency_summary, print_rows
+
+BRANDS = ["Samsung", "Apple", "Sony", "LG", "Xiaomi", "Lenovo", "HP", "JBL"]
+
+def run(args, store: str) -> List[Dict]:
+    import chromadb
+    from chromadb.config import Settings
+    from app.utils.knowledge.filters import add_filter_fields, build_where
+    from app.utils.knowledge.knowledge_schema import ProductFilters
+    from app.utils.knowledge.memory_index import MemoryVectorIndex, normalize_rows
+
+    rng = np.random.default_rng(args.seed)
+    vectors = normalize_rows(rng.standard_normal((args.products, args.dimensions)).astype(np.float32))
+    ids = [f"p{i}" for i in range(args.products)]
+    metadatas = [
+        add_filter_fields({"brand": BRANDS[i % len(BRANDS)], "type": "phone", "price": float(50 + i % 2000)})
+        for i in range(args.products)
+    ]
+
+    client = chromadb.PersistentClient(path=store, settings=Settings(anonymized_telemetry=False))
+    collection = client.get_or_create_collection("bench_vectors", metadata={"hnsw:space": "cosine"})
+    started = time.perf_counter()
+    batch = client.get_max_batch_size()
+    for start in range(0, args.products, batch):
+        end = start + batch
+        collection.add(ids=ids[start:end], embeddings=vectors[start:end].tolist(), metadatas=metadatas[start:end])
+    chroma_load = time.perf_counter() - started
+
+    index = MemoryVectorIndex(quantization=args.quantization, initial_capacity=args.products)
+    started = time.perf_counter()
+    index.load(collection)
+    memory_load = time.perf_counter() - started
+
+    picks = rng.integers(0, args.products, args.queries)
+    queries = normalize_rows(vectors[picks] + rng.standard_normal((args.queries, args.dimensions)).astype(np.float32) * args.noise / np.sqrt(args.dimensions))
+
+    rows = []
+    for label, filters in (("none", None), ("brand", ProductFilters(brand="Samsung"))):
+        where = build_where(filters)
+        chroma_latencies, memory_latencies, overlaps = [], [], []
+        for query in queries:
+            started = time.perf_counter()
+            results = collection.query(query_embeddings=[query.tolist()], n_results=args.k, where=where)
+            chroma_latencies.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            found = index.search(query, args.k, filters)
+            memory_latencies.append(time.perf_counter() - started)
+
+            chroma_ids = set(results["ids"][0])
+            overlaps.append(len(chroma_ids.intersection(result["id"] for result in found)) / max(1, len(chroma_ids)))
+
+        for backend, latencies, load_seconds in (("chroma", chroma_latencies, chroma_load), ("memory", memory_latencies, memory_load)):
+            rows.append({
+                "backend": backend,
+                "filter": label,
+                **latency_summary(latencies),
+                "load_s": round(load_seconds, 2),
+                **({f"overlap@{args.k}": round(float(np.mean(overlaps)), 3)} if backend == "memory" else {})
+            })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory index vs Chroma top-k query latency")
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--noise", type=float, default=0.5, help="Gaussian noise added to the stored vector each query is drawn from")
+    parser.add_argument("--quantization", default="float32", help="Memory index rows (see VECTOR_INDEX_QUANTIZATION)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the rows to this JSON file")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory(prefix="bench-chroma-", ignore_cleanup_errors=True) as store:
+        rows = run(args, store)
+    print_rows(rows, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# bench/workers.py
+"""Throughput vs uvicorn worker count, against fake upstreams.
+
+    python -m bench.workers --workers 1 2 4 --concurrency 64 --requests 1000
+
+Seeds a scratch persistent Chroma store with synthetic products, then for
+each worker count starts `python main.py` as a read-only fleet
+(KNOWLEDGE_WRITER=false, the supported multi-worker mode for a persistent
+store) with OpenAI and the product API served by bench.fake_upstreams.
+Once /ready answers it runs the bench.load_chat load and stops the fleet.
+
+The default target is product search, which is CPU-bound in the service
+(lexical index, vector query, filters) and so shows what extra processes
+buy; --target chat mostly waits on the fake LLM. The load generator and
+fake upstreams share this process, so watch its CPU at high rates.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+import httpx
+from .fake_upstreams import FakeUpstreams, serve_in_thread
+from .ingest import make_products
+from .load_chat import chat_sender, run_load
+from .report import print_rows
+
+QUERIES = ["wireless headphones", "gaming laptop", "4k tv", "cheap phone", "bluetooth speaker", "smartwatch"]
+
+def search_sender():
+    async def send(client: httpx.AsyncClient, index: int) -> httpx.Response:
+        # Vary the text so the query-embedding cache doesn't turn this into a cache benchmark
+        return await client.get("/api/knowledge/products/search", params={"query": f"{QUERIES[index % len(QUERIES)]} {index}", "limit": 5})
+    return send
+
+def start_fleet(workers: int, port: int, env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "main.py"],
+        env={**os.environ, **env, "WORKERS": str(workers), "PORT": str(port), "RELOAD": "false"},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True
+    )
+
+def stop_fleet(process: subprocess.Popen):
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+async def wait_ready(url: str, process: subprocess.Popen, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"main.py exited with code {process.returncode}")
+            try:
+                if (await client.get("/ready")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError(f"{url}/ready did not answer 200 within {timeout}s")
+
+async def measure(url: str, args) -> Dict:
+    send = search_sender() if args.target == "search" else chat_sender("/api/chatbot", "Do you have wireless headphones", False)
+    limits = httpx.Limits(max_connections=args.concurrency + 10, max_keepalive_connections=args.concurrency + 10)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120.0) as client:
+        # Warm each worker's connections and caches before timing
+        await run_load(client, send, min(args.requests, args.concurrency * 2), args.concurrency, probe_path=None)
+        return await run_load(client, send, args.requests, args.concurrency)
+
+def run(args, store: str) -> List[Dict]:
+    upstreams = FakeUpstreams(latency=args.latency, embedding_latency=args.embedding_latency, stock_latency=args.embedding_latency)
+    base_url = serve_in_thread(upstreams)
+    env = {
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{base_url}/v1",
+        "PRODUCT_API_BASE_URL": f"{base_url}/products",
+        "CHROMA_MODE": "persistent",
+        "CHROMA_PERSIST_DIRECTORY": store,
+        "CHROMA_COLLECTION": "bench_products"
+    }
+    os.environ.update(env)
+    from app.utils.knowledge.knowledge import knowledge_manager
+
+    report = knowledge_manager.add_products_batch(make_products(args.products, "bench"))
+    print(f"Seeded {report['succeeded']} products")
+
+    # Query-only fleet; nothing writes while it runs
+    env["KNOWLEDGE_WRITER"] = "false"
+    env["PROMETHEUS_MULTIPROC_DIR"] = os.path.join(store, "metrics")
+    url = f"http://127.0.0.1:{args.port}"
+    rows = []
+    for workers in args.workers:
+        process = start_fleet(workers, args.port, env)
+        try:
+            asyncio.run(wait_ready(url, process))
+            rows.append({"workers": workers, **asyncio.run(measure(url, args))})
+        finally:
+            stop_fleet(process)
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Requests per second at several uvicorn worker counts")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--target", choices=["search", "chat"], default="search")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--products", type=int, default=2000, help="Synthetic products seeded into the scratch store")
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds each fake chat completion takes")
+    parser.add_argument("--embedding-latency", type=float, default=0.02)
+    parser.add_argument("--port", type=int, default=8095)
+    parser.add_argument("--output", help="Also write the rows to this JSON file")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory(prefix="bench-chroma-", ignore_cleanup_errors=True) as store:
+        rows = run(args, store)
+    print_rows(rows, args.output)
+
+if __name__ == "__main__":
+    main()
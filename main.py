@@ -1,22 +1,75 @@
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+import asyncio
 import os
+import sys
+from contextlib import asynccontextmanager, suppress
 from dotenv import load_dotenv
+from app.core.clients import clients
+from app.core.config import settings
+from app.core.metrics import MetricsMiddleware, mark_process_dead, scrape_registry
+from app.core.readiness import readiness
+from app.core.tracing import TracingMiddleware
+from app.services.chat.history_compactor import history_compactor
+from app.utils.cache_manager import cache_manager
+from app.utils.knowledge.catalog_sync import catalog_sync
+from app.utils.knowledge.knowledge import knowledge_manager
 from app.services.ai_suggestions.ai_suggestions_route import router as suggestion_router
 from app.services.chat.chatbot_route import router as chat_router
 from app.utils.knowledge.knowledge_route import router as knowledge_router
 
 load_dotenv()
 
+readiness.register("knowledge")
+readiness.register("openai")
+# If Redis is down, history degrades to in-process, so it doesn't gate readiness
+readiness.register("redis", required=False, probe=lambda: "ready" if cache_manager.available else "degraded")
+# tiktoken fetches its tables on first use; if that fails counts are estimates
+readiness.register("tokenizer", required=False, probe=history_compactor.tokenizer_status)
+
+async def warm_up():
+    """Bring every backend up in parallel; /ready turns 200 once the required ones are"""
+    await asyncio.gather(
+        readiness.run("knowledge", knowledge_manager.warm_up_async),
+        readiness.run("openai", clients.warm_up),
+        readiness.run("redis", cache_manager.connect),
+        readiness.run("tokenizer", lambda: asyncio.to_thread(history_compactor.count_tokens, ""))
+    )
+    # Picks up knowledge writes made by other workers or replicas
+    await catalog_sync.start()
+    readiness.finish()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared HTTP pool lives for the whole process
+    await clients.startup()
+    # Serve right away; nothing below blocks startup
+    readiness.start()
+    warm_up_task = asyncio.create_task(warm_up())
+    yield
+    # Let warm-up unwind before the clients it may be using are closed
+    warm_up_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await warm_up_task
+    await catalog_sync.stop()
+    await cache_manager.close()
+    await clients.shutdown()
+    mark_process_dead()
+
 app = FastAPI(
     title="AdrianaBrill AI Service",
     description="AI-powered e-commerce assistant with product suggestions and chat",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  
@@ -44,11 +97,25 @@ async def root():
 
 @app.get("/health")
 async def health_check():
+    """Liveness: the process is up and serving, whatever its backends are doing"""
     return JSONResponse(
         status_code=200,
         content={"status": "healthy", "service": "adrianabrill-ai"}
     )
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: 503 until the required backends have warmed up, with per-component status"""
+    report = readiness.report()
+    return JSONResponse(
+        status_code=200 if report["ready"] else 503,
+        content={"service": "adrianabrill-ai", **report}
+    )
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(generate_latest(scrape_registry()), media_type=CONTENT_TYPE_LATEST)
+
 # Error handlers
 @app.exception_handler(404)
 async def not_found(request, exc):
@@ -65,9 +132,26 @@ async def internal_error(request, exc):
     )
 
 if __name__ == "__main__":
+    if settings.WORKERS > 1 and settings.CHROMA_MODE == "persistent" and settings.KNOWLEDGE_WRITER:
+        # Every worker would write the same SQLite files through its own HNSW index
+        sys.exit(
+            "WORKERS > 1 with a persistent Chroma store needs KNOWLEDGE_WRITER=false "
+            "(writes go to a separate single-worker writer) or CHROMA_MODE=http"
+        )
+    multiproc_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if multiproc_dir:
+        # Files left by a previous run would be added to this run's metrics
+        os.makedirs(multiproc_dir, exist_ok=True)
+        for name in os.listdir(multiproc_dir):
+            os.remove(os.path.join(multiproc_dir, name))
+    elif settings.WORKERS > 1:
+        print("WORKERS > 1 without PROMETHEUS_MULTIPROC_DIR: /metrics will show one worker per scrape")
     uvicorn.run(
-        "main:app", 
-        host="0.0.0.0", 
-        port=8085, 
-        reload=True
+        "main:app",
+        host=settings.HOST,
+        port=settings.PORT,
+        workers=None if settings.RELOAD else settings.WORKERS,
+        reload=settings.RELOAD,
+        proxy_headers=True,
+        forwarded_allow_ips="*"
     )
\ No newline at end of file
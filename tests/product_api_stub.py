@@ -0,0 +1,58 @@
+"""Local stand-in for the product API: GET /products/{id} and /products/batch?ids=a,b"""
+import asyncio
+from typing import Dict, List, Optional
+from aiohttp import web
+
+class StubProductAPI:
+    """Serves stock from a dict, with latency, scripted failures and request counters"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.stock: Dict[str, int] = {}
+        # Statuses returned, in order, by the next calls (either endpoint)
+        self.failures: List[int] = []
+        self.batch_status: Optional[int] = None
+        self.calls = {"single": 0, "batch": 0}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+        self.app = web.Application()
+        self.app.router.add_get("/products/batch", self.batch)
+        self.app.router.add_get("/products/{product_id}", self.single)
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _serve(self, kind: str, body) -> web.Response:
+        self.calls[kind] += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            if self.failures:
+                return web.json_response({"error": "scripted"}, status=self.failures.pop(0))
+            if kind == "batch" and self.batch_status is not None:
+                return web.json_response({"error": "batch"}, status=self.batch_status)
+            return web.json_response(body())
+        finally:
+            self.in_flight -= 1
+
+    def _item(self, product_id: str):
+        return {"id": product_id, "totalStock": self.stock.get(product_id, 0)}
+
+    async def single(self, request: web.Request) -> web.Response:
+        return await self._serve("single", lambda: self._item(request.match_info["product_id"]))
+
+    async def batch(self, request: web.Request) -> web.Response:
+        ids = [product_id for product_id in request.query.get("ids", "").split(",") if product_id]
+        return await self._serve("batch", lambda: {"data": [self._item(product_id) for product_id in ids]})
+
+    async def start(self) -> str:
+        """Serve on a free local port in the running loop; returns the products URL"""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", 0).start()
+        return f"http://127.0.0.1:{self._runner.addresses[0][1]}/products"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,101 @@
+"""Conversation history in Redis, against fakeredis."""
+import asyncio
+import fakeredis
+import pytest
+from app.core.config import settings
+from app.utils.cache_manager import HISTORY_CONTEXT_TURNS, HISTORY_MAX_ITEMS, SessionCacheManager
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+def make_manager(server) -> SessionCacheManager:
+    return SessionCacheManager(redis_client=fakeredis.FakeAsyncRedis(server=server))
+
+def test_concurrent_appends_lose_no_turns(server):
+    async def scenario():
+        manager = make_manager(server)
+        # Same user from several tabs at once
+        await asyncio.gather(*(manager.update_history("u1", f"message {i}", f"response {i}") for i in range(10)))
+        stored = await manager.redis_client.lrange("chat_history:u1", 0, -1)
+        await manager.close()
+        return stored
+
+    stored = asyncio.run(scenario())
+    assert len(stored) == 10
+    assert {item.decode() for item in stored} == {
+        f'{{"message":"message {i}","response":"response {i}"}}' for i in range(10)
+    }
+
+def test_history_is_trimmed_and_read_back_in_order(server):
+    async def scenario():
+        manager = make_manager(server)
+        for i in range(HISTORY_MAX_ITEMS + 5):
+            await manager.update_history("u1", f"message {i}", f"response {i}")
+        stored = await manager.redis_client.llen("chat_history:u1")
+        history = await manager.get_history("u1")
+        ttl = await manager.redis_client.ttl("chat_history:u1")
+        await manager.close()
+        return stored, history, ttl
+
+    stored, history, ttl = asyncio.run(scenario())
+    assert stored == HISTORY_MAX_ITEMS
+    assert [item.message for item in history] == [
+        f"message {i}" for i in range(HISTORY_MAX_ITEMS + 5 - HISTORY_CONTEXT_TURNS, HISTORY_MAX_ITEMS + 5)
+    ]
+    assert ttl > 0
+
+async def wait_until(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not met in time"
+        await asyncio.sleep(0.01)
+
+def test_degraded_mode_keeps_history_and_replays_it(server, monkeypatch):
+    monkeypatch.setattr(settings, "REDIS_RECONNECT_INTERVAL_SECONDS", 0.02)
+
+    async def scenario():
+        manager = make_manager(server)
+        await manager.update_history("u1", "before outage", "ok")
+
+        server.connected = False
+        await manager.update_history("u1", "during outage 1", "ok")
+        degraded = manager.available
+        await manager.update_history("u1", "during outage 2", "ok")
+        during = await manager.get_history("u1")
+
+        server.connected = True
+        await wait_until(lambda: manager.available)
+        after = await manager.get_history("u1")
+        stats = manager.stats()
+        await manager.close()
+        return degraded, during, after, stats
+
+    degraded, during, after, stats = asyncio.run(scenario())
+    assert degraded is False
+    # Only turns written while degraded are in-process
+    assert [item.message for item in during] == ["during outage 1", "during outage 2"]
+    assert [item.message for item in after] == ["before outage", "during outage 1", "during outage 2"]
+    assert stats["fallback_writes"] == 2
+    assert stats["reconnects"] == 1
+    assert stats["available"] == 1
+
+def test_startup_without_redis_recovers(server, monkeypatch):
+    monkeypatch.setattr(settings, "REDIS_RECONNECT_INTERVAL_SECONDS", 0.02)
+
+    async def scenario():
+        server.connected = False
+        manager = make_manager(server)
+        await manager.connect()
+        down = manager.client()
+        await manager.update_history("u1", "hello", "hi")
+
+        server.connected = True
+        await wait_until(lambda: manager.available)
+        stored = await manager.redis_client.lrange("chat_history:u1", 0, -1)
+        await manager.close()
+        return down, stored
+
+    down, stored = asyncio.run(scenario())
+    assert down is None
+    assert [item.decode() for item in stored] == ['{"message":"hello","response":"hi"}']
@@ -0,0 +1,35 @@
+"""The embedding cache normalizes its keys, never the text sent to the model."""
+from app.vectordb.embedding_cache import CachedEmbeddingFunction
+
+class RecordingEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, input):
+        self.calls.append(list(input))
+        return [[float(len(text)), 1.0] for text in input]
+
+def make_cache(max_text_chars=512):
+    backend = RecordingEmbeddings()
+    return CachedEmbeddingFunction(backend, model_name="test", max_text_chars=max_text_chars), backend
+
+def test_model_receives_the_original_text():
+    cache, backend = make_cache()
+    cache(["  Galaxy   S24 Ultra "])
+    assert backend.calls == [["  Galaxy   S24 Ultra "]]
+
+def test_spelling_variants_share_one_entry():
+    cache, backend = make_cache()
+    first = cache(["Galaxy S24"])
+    again = cache(["galaxy  s24", "GALAXY S24"])
+    assert backend.calls == [["Galaxy S24"]]
+    assert [list(vector) for vector in again] == [list(first[0])] * 2
+    assert cache.hits == 2
+
+def test_long_documents_skip_the_cache_and_keep_their_text():
+    cache, backend = make_cache(max_text_chars=10)
+    document = "Samsung  Galaxy S24 Ultra, 512 GB"
+    cache([document])
+    cache([document])
+    assert backend.calls == [[document], [document]]
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,35 @@
+"""Batch ingestion reports failures per item and keeps going past a bad chunk."""
+from chromadb.errors import InternalError
+from app.core.config import settings
+from app.utils.knowledge.knowledge import knowledge_manager
+from app.utils.knowledge.knowledge_schema import ProductKnowledge
+
+def make_products(count: int):
+    return [
+        ProductKnowledge(productId=f"p{i}", productName=f"Phone {i}", brand="Samsung", type="phone", color="black", price=100.0 + i)
+        for i in range(count)
+    ]
+
+def test_failed_lookup_only_fails_its_chunk(monkeypatch):
+    monkeypatch.setattr(settings, "KNOWLEDGE_UPSERT_CHUNK_SIZE", 2)
+    lookups = []
+
+    def get_existing_metadata(ids):
+        lookups.append(ids)
+        if len(lookups) == 1:
+            raise InternalError("compaction failed")
+        return {}
+
+    def upsert_chunk(chunk, items):
+        for i, _, _, _ in chunk:
+            items[i]["success"] = True
+
+    monkeypatch.setattr(knowledge_manager, "_get_existing_metadata", get_existing_metadata)
+    monkeypatch.setattr(knowledge_manager, "_upsert_chunk", upsert_chunk)
+    report = knowledge_manager.add_products_batch(make_products(5))
+
+    assert lookups == [["p0", "p1"], ["p2", "p3"], ["p4"]]
+    assert [item["success"] for item in report["items"]] == [False, False, True, True, True]
+    assert "compaction failed" in report["items"][0]["error"]
+    assert report["succeeded"] == 3
+    assert report["failed"] == 2
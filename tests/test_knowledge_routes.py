@@ -0,0 +1,62 @@
+"""Knowledge write routes map manager results to the right status codes."""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.utils.knowledge import knowledge_route
+from app.utils.knowledge.knowledge import knowledge_manager
+
+PRODUCT = {
+    "productId": "a1",
+    "productName": "Galaxy A15",
+    "brand": "Samsung",
+    "type": "phone",
+    "color": "black",
+    "price": 199.0,
+}
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(knowledge_route.router)
+    return TestClient(app)
+
+def test_duplicate_add_is_a_400(client, monkeypatch):
+    async def add_product_async(product):
+        return {"success": False, "error": "Product a1 already exists"}
+
+    monkeypatch.setattr(knowledge_manager, "add_product_async", add_product_async)
+    response = client.post("/api/knowledge/products", json=PRODUCT)
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Product a1 already exists"}
+
+def test_missing_update_is_a_404(client, monkeypatch):
+    async def update_product_async(product_id, product):
+        return {"success": False, "not_found": True, "error": f"Product {product_id} not found"}
+
+    monkeypatch.setattr(knowledge_manager, "update_product_async", update_product_async)
+    response = client.put("/api/knowledge/products/a1", json=PRODUCT)
+    assert response.status_code == 404
+
+def test_failed_delete_is_a_400(client, monkeypatch):
+    async def delete_product_async(product_id):
+        return {"success": False, "error": "boom"}
+
+    monkeypatch.setattr(knowledge_manager, "delete_product_async", delete_product_async)
+    response = client.delete("/api/knowledge/products/a1")
+    assert response.status_code == 400
+    assert response.json() == {"detail": "boom"}
+
+def test_failed_batch_still_announces_the_write(client, monkeypatch):
+    bumps = []
+
+    async def add_products_batch_async(products, force):
+        raise RuntimeError("Chroma went away")
+
+    async def bump():
+        bumps.append(True)
+
+    monkeypatch.setattr(knowledge_manager, "add_products_batch_async", add_products_batch_async)
+    monkeypatch.setattr(knowledge_route.catalog_sync, "bump", bump)
+    response = client.post("/api/knowledge/products/batch", json=[PRODUCT])
+    assert response.status_code == 500
+    assert bumps == [True]
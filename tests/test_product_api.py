@@ -0,0 +1,115 @@
+"""Product API client: batching, per-host limits, retries and the circuit breaker."""
+import asyncio
+import aiohttp
+from app.utils.product_api import CircuitBreaker, ProductAPIClient
+from product_api_stub import StubProductAPI
+
+def run_with_stub(scenario, latency: float = 0.0, **client_options):
+    """Run scenario(stub, client, session) against a stub API served in the same loop"""
+    async def main():
+        stub = StubProductAPI(latency=latency)
+        base_url = await stub.start()
+        options = {"backoff_base": 0.0, **client_options}
+        if options.pop("batch", False):
+            options["batch_url"] = f"{base_url}/batch"
+        client = ProductAPIClient(base_url, **options)
+        try:
+            async with aiohttp.ClientSession() as session:
+                return await scenario(stub, client, session)
+        finally:
+            await stub.stop()
+    return asyncio.run(main())
+
+def test_batch_endpoint_is_chunked():
+    async def scenario(stub, client, session):
+        stub.stock.update({f"p{i}": i for i in range(5)})
+        return await client.fetch_stock([f"p{i}" for i in range(5)], session=session), dict(stub.calls)
+
+    results, calls = run_with_stub(scenario, batch=True, batch_size=2)
+    assert {product_id: result["totalStock"] for product_id, result in results.items()} == {f"p{i}": i for i in range(5)}
+    assert calls == {"single": 0, "batch": 3}
+
+def test_failed_batch_falls_back_to_single_requests():
+    async def scenario(stub, client, session):
+        stub.stock.update({"p1": 1, "p2": 2})
+        stub.batch_status = 404
+        return await client.fetch_stock(["p1", "p2"], session=session), dict(stub.calls)
+
+    results, calls = run_with_stub(scenario, batch=True)
+    assert results["p1"]["totalStock"] == 1
+    assert results["p2"]["totalStock"] == 2
+    assert calls == {"single": 2, "batch": 1}
+
+def test_individual_requests_respect_the_host_limit():
+    async def scenario(stub, client, session):
+        results = await client.fetch_stock([f"p{i}" for i in range(12)], session=session)
+        return results, stub.max_in_flight
+
+    results, max_in_flight = run_with_stub(scenario, latency=0.05, max_concurrency=3)
+    assert len(results) == 12
+    assert all(result["totalStock"] == 0 for result in results.values())
+    assert max_in_flight == 3
+
+def test_transient_errors_are_retried():
+    async def scenario(stub, client, session):
+        stub.stock["p1"] = 5
+        stub.failures = [503, 429]
+        result = await client.fetch_single_product_stock(session, "p1")
+        return result, stub.calls["single"], client.breaker.state
+
+    result, calls, state = run_with_stub(scenario, max_retries=2)
+    assert result["totalStock"] == 5
+    assert calls == 3
+    assert state == "closed"
+
+def test_client_errors_are_not_retried():
+    async def scenario(stub, client, session):
+        stub.failures = [404]
+        result = await client.fetch_single_product_stock(session, "missing")
+        return result, stub.calls["single"], client.breaker.failures
+
+    result, calls, failures = run_with_stub(scenario, max_retries=2)
+    assert result["totalStock"] is None
+    assert calls == 1
+    # The service answered, so it counts as healthy
+    assert failures == 0
+
+def test_circuit_opens_fails_fast_and_recovers():
+    async def scenario(stub, client, session):
+        stub.stock["p1"] = 5
+        stub.failures = [500, 500]
+        first = [await client.fetch_single_product_stock(session, "p1") for _ in range(2)]
+        opened = client.breaker.state
+        blocked = await client.fetch_single_product_stock(session, "p1")
+        calls_while_open = stub.calls["single"]
+
+        await asyncio.sleep(0.15)
+        recovered = await client.fetch_single_product_stock(session, "p1")
+        return first, opened, blocked, calls_while_open, recovered, client.breaker.state
+
+    first, opened, blocked, calls_while_open, recovered, state = run_with_stub(
+        scenario,
+        max_retries=0,
+        breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+    )
+    assert all(result["totalStock"] is None for result in first)
+    assert opened == "open"
+    assert blocked["error"] == "Product API circuit open"
+    assert calls_while_open == 2
+    assert recovered["totalStock"] == 5
+    assert state == "closed"
+
+def test_open_circuit_skips_the_single_request_fallback():
+    async def scenario(stub, client, session):
+        stub.failures = [502]
+        results = await client.fetch_stock(["p1", "p2"], session=session)
+        return results, dict(stub.calls)
+
+    results, calls = run_with_stub(
+        scenario,
+        batch=True,
+        max_retries=0,
+        breaker=CircuitBreaker(failure_threshold=1, reset_timeout=30.0)
+    )
+    assert all(result["error"] == "Product API unavailable" for result in results.values())
+    assert calls == {"single": 0, "batch": 1}
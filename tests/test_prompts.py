@@ -0,0 +1,54 @@
+"""The system prefix of every prompt must not depend on the request.
+
+OpenAI only reuses its prompt cache for an identical prefix, so any
+per-request data leaking into the first message silently loses the
+cached-token discount (see llm_tokens_total{kind="cached_prompt"}).
+"""
+from app.services.chat.chatbot_schema import HistoryItem
+from app.services.chat.prompts import (
+    build_analysis_messages,
+    build_generation_messages,
+    build_summary_messages,
+    build_tool_messages,
+)
+
+HISTORY_A = [HistoryItem(message="Do you have Samsung phones?", response="Yes, several models.")]
+HISTORY_B = [
+    HistoryItem(message="¿Tienen laptops?", response="Sí, tenemos varias."),
+    HistoryItem(message="¿Y con 16 GB?", response="Claro, aquí tienes."),
+]
+
+def assert_same_prefix(first, second):
+    assert first[0]["role"] == "system"
+    assert first[0] == second[0]
+    assert first[0]["content"].encode("utf-8") == second[0]["content"].encode("utf-8")
+
+def test_analysis_prefix_is_stable():
+    assert_same_prefix(
+        build_analysis_messages("cheap phone", HISTORY_A),
+        build_analysis_messages("portátil gaming", HISTORY_B, summary="User wants a laptop"),
+    )
+
+def test_generation_prefix_is_stable():
+    assert_same_prefix(
+        build_generation_messages("cheap phone", "1. Galaxy A15 - $199", "English", HISTORY_A),
+        build_generation_messages("portátil gaming", "1. ROG Strix - $1499\n2. Legion 5 - $1299", "Spanish", HISTORY_B, "User wants a laptop"),
+    )
+
+def test_tool_prefix_is_stable():
+    assert_same_prefix(
+        build_tool_messages("cheap phone", HISTORY_A),
+        build_tool_messages("portátil gaming", HISTORY_B, summary="User wants a laptop"),
+    )
+
+def test_summary_prefix_is_stable():
+    assert_same_prefix(
+        build_summary_messages(None, HISTORY_A),
+        build_summary_messages("User wants a laptop", HISTORY_B),
+    )
+
+def test_request_data_comes_after_the_prefix():
+    messages = build_generation_messages("portátil gaming", "1. ROG Strix - $1499", "Spanish", HISTORY_B)
+    assert "ROG Strix" not in messages[0]["content"]
+    assert "Spanish" not in messages[0]["content"]
+    assert messages[-1] == {"role": "user", "content": "portátil gaming"}
@@ -0,0 +1,69 @@
+"""The similarity tier only pays for an embedding when it has something to compare."""
+import asyncio
+import pytest
+from app.services.chat.chatbot_schema import HistoryItem
+from app.utils.cache_manager import cache_manager
+from app.utils.semantic_cache import SemanticCache
+
+VECTORS = {
+    "hola": [1.0, 0.0],
+    "holaa": [0.99, 0.05],
+    "adios": [0.0, 1.0],
+}
+
+@pytest.fixture
+def cache(monkeypatch):
+    # L1 only; Redis is treated as down
+    monkeypatch.setattr(cache_manager, "available", False)
+    return SemanticCache(
+        namespace="test",
+        ttl_seconds=60,
+        max_entries=10,
+        similarity_threshold=0.95,
+        max_candidates=5,
+        semantic_max_chars=40
+    )
+
+@pytest.fixture
+def embed():
+    calls = []
+
+    async def embed(text):
+        calls.append(text)
+        return VECTORS.get(text)
+
+    embed.calls = calls
+    return embed
+
+def test_miss_without_candidates_skips_the_embedding(cache, embed):
+    lookup = asyncio.run(cache.lookup("Hola", None, embed=embed))
+    assert lookup.value is None
+    assert lookup.needs_vector
+    assert embed.calls == []
+
+def test_seeded_entry_is_matched_semantically(cache, embed):
+    async def scenario():
+        first = await cache.lookup("Hola", None, embed=embed)
+        await cache.embed_lookup(first, embed)
+        await cache.store(first, {"response": "¡Hola!"})
+        return await cache.lookup("holaa", None, embed=embed), await cache.lookup("adios", None, embed=embed)
+
+    similar, different = asyncio.run(scenario())
+    assert similar.source == "semantic"
+    assert similar.value == {"response": "¡Hola!"}
+    assert different.value is None
+    assert not different.needs_vector
+    assert embed.calls == ["hola", "holaa", "adios"]
+
+def test_new_history_fingerprint_skips_the_embedding(cache, embed):
+    async def scenario():
+        first = await cache.lookup("Hola", None, embed=embed)
+        await cache.embed_lookup(first, embed)
+        await cache.store(first, {"response": "¡Hola!"})
+        history = [HistoryItem(message="Hola", response="¡Hola!")]
+        return await cache.lookup("holaa", history, embed=embed)
+
+    lookup = asyncio.run(scenario())
+    assert lookup.value is None
+    assert lookup.needs_vector
+    assert embed.calls == ["hola"]
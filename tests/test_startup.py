@@ -0,0 +1,87 @@
+"""The service serves liveness before its backends are warm, and readiness only after."""
+import asyncio
+import threading
+import time
+import pytest
+from fastapi.testclient import TestClient
+import main
+from app.core.readiness import Readiness
+from app.services.chat import history_compactor as history_compactor_module
+
+@pytest.fixture
+def slow_knowledge(monkeypatch):
+    """Stub every warm-up; the knowledge one blocks until the event is set"""
+    release = threading.Event()
+
+    async def warm_up_knowledge():
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+
+    async def noop():
+        pass
+
+    readiness = Readiness()
+    readiness.register("knowledge")
+    readiness.register("openai")
+    readiness.register("redis", required=False)
+    readiness.register("tokenizer", required=False)
+    monkeypatch.setattr(main, "readiness", readiness)
+    monkeypatch.setattr(main.knowledge_manager, "warm_up_async", warm_up_knowledge)
+    monkeypatch.setattr(main.clients, "warm_up", noop)
+    monkeypatch.setattr(main.cache_manager, "connect", noop)
+    monkeypatch.setattr(main.catalog_sync, "start", noop)
+    monkeypatch.setattr(main.history_compactor, "count_tokens", lambda text: 0)
+    yield release
+    release.set()
+
+def wait_for_ready(client: TestClient, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = client.get("/ready")
+        if response.status_code == 200:
+            return response
+        time.sleep(0.02)
+    raise AssertionError(f"/ready still {response.status_code}: {response.json()}")
+
+def test_health_answers_while_warm_up_is_pending(slow_knowledge):
+    with TestClient(main.app) as client:
+        started = time.perf_counter()
+        health = client.get("/health")
+        assert health.status_code == 200
+        assert time.perf_counter() - started < 1.0
+
+        ready = client.get("/ready")
+        assert ready.status_code == 503
+        body = ready.json()
+        assert body["ready"] is False
+        assert body["components"]["knowledge"]["status"] == "starting"
+        assert body["startup_seconds"] is None
+
+        slow_knowledge.set()
+        body = wait_for_ready(client).json()
+        assert body["ready"] is True
+        assert body["components"]["knowledge"]["status"] == "ready"
+        assert body["startup_seconds"] is not None
+
+def test_shutdown_during_warm_up_cancels_it(slow_knowledge):
+    with TestClient(main.app) as client:
+        assert client.get("/ready").status_code == 503
+    # Leaving the block ran the lifespan shutdown with warm-up still pending
+    assert main.readiness.startup_seconds is None
+
+def test_tokenizer_fallback_is_reported_degraded(monkeypatch):
+    def unavailable(*args):
+        raise OSError("tables could not be downloaded")
+
+    compactor = main.history_compactor
+    monkeypatch.setattr(compactor, "_encoding", None)
+    monkeypatch.setattr(compactor, "_encoding_failed", False)
+    monkeypatch.setattr(history_compactor_module.tiktoken, "encoding_for_model", unavailable)
+    readiness = Readiness()
+    readiness.register("tokenizer", required=False, probe=compactor.tokenizer_status)
+
+    asyncio.run(readiness.run("tokenizer", lambda: asyncio.to_thread(compactor.count_tokens, "")))
+    report = readiness.report()
+    assert report["components"]["tokenizer"]["status"] == "degraded"
+    # Estimated counts are good enough to serve traffic
+    assert report["ready"] is True
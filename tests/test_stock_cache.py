@@ -0,0 +1,106 @@
+"""Stock cache against a local stub product API, with fakeredis as the shared tier."""
+import asyncio
+import aiohttp
+import fakeredis
+import pytest
+from app.utils import stock_cache as stock_cache_module
+from app.utils.cache_manager import SessionCacheManager
+from app.utils.product_api import ProductAPIClient
+from app.utils.stock_cache import StockCache
+from product_api_stub import StubProductAPI
+
+@pytest.fixture(autouse=True)
+def redis_manager(monkeypatch):
+    manager = SessionCacheManager(redis_client=fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer()))
+    monkeypatch.setattr(stock_cache_module, "cache_manager", manager)
+    return manager
+
+def run_with_stub(scenario, latency: float = 0.0):
+    """Run scenario(stub, loader) with the stub API served in the same loop"""
+    async def main():
+        stub = StubProductAPI(latency=latency)
+        base_url = await stub.start()
+        client = ProductAPIClient(base_url, max_retries=0)
+        try:
+            async with aiohttp.ClientSession() as session:
+                return await scenario(stub, lambda ids: client.fetch_stock(ids, session=session))
+        finally:
+            await stub.stop()
+    return asyncio.run(main())
+
+def test_corrupt_redis_entry_is_a_miss(redis_manager):
+    async def scenario(stub, loader):
+        stub.stock["p1"] = 7
+        await redis_manager.redis_client.set("stock:p1", "not json")
+        await redis_manager.redis_client.set("stock:p2", '{"totalStock": 3}')
+        cache = StockCache(ttl_seconds=60, stale_seconds=300, max_entries=100)
+        return await cache.get_many(["p1", "p2"], loader), stub.calls["single"]
+
+    results, calls = run_with_stub(scenario)
+    assert results["p1"]["totalStock"] == 7
+    assert results["p2"]["totalStock"] == 0
+    assert calls == 2
+
+def test_concurrent_lookups_share_one_fetch():
+    async def scenario(stub, loader):
+        stub.stock["p1"] = 4
+        cache = StockCache(ttl_seconds=60, stale_seconds=300, max_entries=100)
+        results = await asyncio.gather(*(cache.get_many(["p1"], loader) for _ in range(20)))
+        # Fresh within the TTL: no second upstream call
+        again = await cache.get_many(["p1"], loader)
+        return results, again, stub.calls["single"], cache.stats()
+
+    results, again, calls, stats = run_with_stub(scenario, latency=0.05)
+    assert all(result["p1"]["totalStock"] == 4 for result in results)
+    assert again["p1"]["totalStock"] == 4
+    assert calls == 1
+    assert stats["hits"] == 1
+
+def test_stale_entry_is_served_while_revalidating():
+    async def scenario(stub, loader):
+        stub.stock["p1"] = 4
+        cache = StockCache(ttl_seconds=0.05, stale_seconds=300, max_entries=100)
+        await cache.get_many(["p1"], loader)
+        await asyncio.sleep(0.1)
+
+        stub.stock["p1"] = 9
+        stub.latency = 0.3
+        started = asyncio.get_running_loop().time()
+        stale = await cache.get_many(["p1"], loader)
+        waited = asyncio.get_running_loop().time() - started
+        await asyncio.gather(*cache._background)
+        fresh = await cache.get_many(["p1"], loader)
+        return stale, waited, fresh, stub.calls["single"], cache.stats()
+
+    stale, waited, fresh, calls, stats = run_with_stub(scenario)
+    assert stale["p1"]["totalStock"] == 4
+    # The slow upstream was not on the request path
+    assert waited < 0.2
+    assert fresh["p1"]["totalStock"] == 9
+    assert calls == 2
+    assert stats["stale_hits"] == 1
+
+def test_failed_lookup_is_not_cached():
+    async def scenario(stub, loader):
+        stub.stock["p1"] = 4
+        stub.failures = [500]
+        cache = StockCache(ttl_seconds=60, stale_seconds=300, max_entries=100)
+        failed = await cache.get_many(["p1"], loader)
+        retried = await cache.get_many(["p1"], loader)
+        return failed, retried, stub.calls["single"]
+
+    failed, retried, calls = run_with_stub(scenario)
+    assert failed["p1"]["totalStock"] is None
+    assert retried["p1"]["totalStock"] == 4
+    assert calls == 2
+
+def test_other_workers_reuse_the_redis_copy():
+    async def scenario(stub, loader):
+        stub.stock["p1"] = 4
+        await StockCache(ttl_seconds=60, stale_seconds=300, max_entries=100).get_many(["p1"], loader)
+        other_worker = StockCache(ttl_seconds=60, stale_seconds=300, max_entries=100)
+        return await other_worker.get_many(["p1"], loader), stub.calls["single"]
+
+    results, calls = run_with_stub(scenario)
+    assert results["p1"]["totalStock"] == 4
+    assert calls == 1
@@ -0,0 +1,65 @@
+"""The streamed generation is traced and timed like the other LLM calls."""
+import asyncio
+from types import SimpleNamespace
+from prometheus_client import REGISTRY
+from app.core.tracing import InMemoryExporter, tracer
+from app.services.chat.chatbot import Chat
+
+class FakeStream:
+    def __init__(self, words):
+        self.chunks = [
+            SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=word))])
+            for word in words
+        ]
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.chunks:
+            raise StopAsyncIteration
+        await asyncio.sleep(0)
+        return self.chunks.pop(0)
+
+    async def close(self):
+        self.closed = True
+
+def fake_client(stream):
+    async def create(**kwargs):
+        assert kwargs["stream"] is True
+        return stream
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+def stream_count() -> float:
+    return REGISTRY.get_sample_value(
+        "chat_stage_duration_seconds_count",
+        {"stage": "generation_stream", "route": "none", "model": "gpt-4o-mini"}
+    ) or 0.0
+
+def test_streamed_generation_is_a_span(monkeypatch):
+    exporter = InMemoryExporter()
+    monkeypatch.setattr(tracer, "exporter", exporter)
+    monkeypatch.setattr(tracer, "sample_rate", 1.0)
+    stream = FakeStream(["Hello", " there"])
+    chat = Chat(client=fake_client(stream), http_session=object())
+    before = stream_count()
+
+    async def consume():
+        with tracer.start_trace("POST /api/chatbot/stream") as root:
+            pieces = []
+            generator = chat.stream_response_with_products("hi", [], "English")
+            try:
+                async for piece in generator:
+                    pieces.append(piece)
+            finally:
+                await generator.aclose()
+        return root, pieces
+
+    root, pieces = asyncio.run(consume())
+    assert pieces == ["Hello", " there"]
+    assert stream.closed
+    spans = {span.name: span for span in exporter.get_trace(root.trace_id)}
+    assert spans["generation_stream"].parent_id == root.span_id
+    assert spans["generation_stream"].attributes["model"] == "gpt-4o-mini"
+    assert stream_count() == before + 1
@@ -0,0 +1,31 @@
+"""upstream_errors_total only counts failures of the upstream it is labelled with."""
+import pytest
+from chromadb.errors import InternalError
+from prometheus_client import REGISTRY
+from app.core.config import settings
+from app.utils.knowledge.knowledge import knowledge_manager
+
+def chroma_errors() -> float:
+    return REGISTRY.get_sample_value("upstream_errors_total", {"upstream": "chroma"}) or 0.0
+
+@pytest.fixture(autouse=True)
+def vector_only(monkeypatch):
+    monkeypatch.setattr(settings, "HYBRID_SEARCH_ENABLED", False)
+
+def test_chroma_failure_is_counted(monkeypatch):
+    def vector_search(*args):
+        raise InternalError("compaction failed")
+
+    monkeypatch.setattr(knowledge_manager, "_vector_search", vector_search)
+    before = chroma_errors()
+    assert knowledge_manager.search_products("phone", query_embedding=[0.1, 0.2]) == []
+    assert chroma_errors() == before + 1
+
+def test_embedding_failure_is_not_a_chroma_error(monkeypatch):
+    def embed_query(query):
+        raise RuntimeError("embedding backend down")
+
+    monkeypatch.setattr(knowledge_manager, "embed_query", embed_query)
+    before = chroma_errors()
+    assert knowledge_manager.search_products("phone") == []
+    assert chroma_errors() == before